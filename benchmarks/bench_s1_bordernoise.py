@@ -0,0 +1,83 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+from pyroSAR.S1.auxil import removeGRDBorderNoise
+from pyroSAR.S1.bordernoise import crop
+from pyroSAR.S1.linesimplify import reduce
+from pyroSAR.S1.polysimplify import VWSimplifier
+
+from conftest import border_profile, build_thresholds_reference, dimensions, measure, restore
+
+# the maximum peak memory in MB allowed to be allocated per stage in addition to the tile memory;
+# exceeding it fails the benchmark and thus marks a memory regression
+MEMORY_MARGIN = 64
+
+
+@pytest.mark.parametrize('mode', ['IW', 'EW'])
+@pytest.mark.parametrize('ipf', [2.43, 2.82])
+def test_removeGRDBorderNoise(benchmark, scenes, tmp_path, mode, ipf):
+    scene = scenes(mode, ipf)
+    backup = str(tmp_path / 'backup')
+    maxmemory = 256
+
+    def setup():
+        restore(scene, backup)
+        return (scene,), {'maxmemory': maxmemory}
+
+    setup()
+    elapsed, peak = measure(removeGRDBorderNoise, scene, maxmemory=maxmemory)
+    benchmark.extra_info.update({'lines': scene.lines, 'samples': scene.samples,
+                                 'wall_time_s': elapsed, 'peak_memory_mb': peak})
+    benchmark.pedantic(removeGRDBorderNoise, setup=setup, rounds=3, iterations=1)
+    # the noise vectors interpolated to the full image width are held in memory in addition to the tiles
+    noise = (len(range(0, scene.lines - 1, 1000)) + 1) * scene.samples * 4 / 1024. ** 2
+    assert peak < maxmemory + noise + MEMORY_MARGIN
+
+
+@pytest.mark.parametrize('mode', ['IW', 'EW'])
+@pytest.mark.parametrize('edge', ['lines', 'samples'])
+def test_reduce(benchmark, mode, edge):
+    lines, samples = dimensions(mode)
+    seq = border_profile(lines if edge == 'lines' else samples)[:, 1].astype(int)
+    elapsed, peak = measure(reduce, seq)
+    benchmark.extra_info.update({'length': len(seq), 'wall_time_s': elapsed, 'peak_memory_mb': peak})
+    benchmark(reduce, seq)
+    assert peak < MEMORY_MARGIN
+
+
+@pytest.mark.parametrize('mode', ['IW', 'EW'])
+def test_crop(benchmark, mode):
+    seq = border_profile(dimensions(mode)[0])[:, 1]
+
+    def setup():
+        # crop replaces outliers of the sequence in place
+        return (seq.copy(),), {}
+
+    elapsed, peak = measure(crop, seq.copy())
+    benchmark.extra_info.update({'length': len(seq), 'wall_time_s': elapsed, 'peak_memory_mb': peak})
+    benchmark.pedantic(crop, setup=setup, rounds=3, iterations=1)
+    assert peak < MEMORY_MARGIN
+
+
+@pytest.mark.parametrize('n', [10000, 25000, 100000])
+def test_VWSimplifier(benchmark, n):
+    pts = border_profile(n)
+    elapsed, peak = measure(VWSimplifier, pts)
+    benchmark.extra_info.update({'wall_time_s': elapsed, 'peak_memory_mb': peak})
+    simplifier = benchmark(VWSimplifier, pts)
+    assert np.isinf(simplifier.thresholds[[0, -1]]).all()
+    assert peak < MEMORY_MARGIN
+
+
+@pytest.mark.parametrize('implementation', ['heap', 'reference'])
+@pytest.mark.parametrize('n', [1000, 10000])
+def test_build_thresholds(benchmark, implementation, n):
+    simplifier = VWSimplifier(border_profile(n))
+    function = {'heap': simplifier.build_thresholds,
+                'reference': partial(build_thresholds_reference, simplifier.pts)}[implementation]
+    elapsed, peak = measure(function)
+    benchmark.extra_info.update({'wall_time_s': elapsed, 'peak_memory_mb': peak})
+    thresholds = benchmark.pedantic(function, rounds=3, iterations=1)
+    assert np.array_equal(thresholds, simplifier.thresholds)
@@ -0,0 +1,78 @@
+##############################################################
+# synthetic Sentinel-1 GRD test data for the pyroSAR performance benchmarks
+# see README.md in this directory for usage
+##############################################################
+import os
+import re
+import sys
+import shutil
+import tracemalloc
+from time import time
+
+import pytest
+
+# the synthetic scenes and border profiles are created with the test data generator of the pyroSAR tests,
+# the original implementation of VWSimplifier.build_thresholds is taken from the tests as reference
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'pyroSAR', 'tests'))
+from synthetic import border_profile, create_scene
+from test_polysimplify import build_thresholds_reference
+
+# the approximate image dimensions (lines, samples) of full GRD products
+DIMENSIONS = {'IW': (16700, 25300),
+              'EW': (10400, 10600)}
+
+# the size of the synthetic images relative to full products; set via environment variable
+SCALE = float(os.environ.get('PYROSAR_BENCHMARK_SCALE', 0.25))
+
+
+def dimensions(mode):
+    """
+    the number of lines and samples of a synthetic scene in the defined scale;
+    each image dimension needs to be large enough for the 2000 pixel border blocks
+    """
+    return tuple(max(4500, int(x * SCALE)) for x in DIMENSIONS[mode])
+
+
+def measure(function, *args, **kwargs):
+    """
+    run a function once and return its wall time in seconds and the peak memory in MB
+    allocated by Python and NumPy during the call; memory allocated by GDAL is not included.
+    The wall time includes the overhead of the memory tracing and is thus slightly higher than the benchmark timings.
+    """
+    tracemalloc.start()
+    start = time()
+    function(*args, **kwargs)
+    elapsed = time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024. ** 2
+
+
+@pytest.fixture(scope='session')
+def scenes(tmp_path_factory):
+    """
+    the synthetic scenes per acquisition mode and IPF version; the images are created only once per session,
+    benchmarks modifying the images need to work on copies, see :func:`restore`
+    """
+    cache = {}
+
+    def get(mode, ipf):
+        if (mode, ipf) not in cache:
+            directory = str(tmp_path_factory.mktemp('{}_{}'.format(mode, ipf).replace('.', '')))
+            cache[(mode, ipf)] = create_scene(directory, mode, ipf, *dimensions(mode))
+        return cache[(mode, ipf)]
+
+    return get
+
+
+def restore(scene, backup):
+    """
+    restore the original measurement images of a scene after they were masked;
+    on first call the images are copied to the backup directory
+    """
+    measurement = os.path.join(scene.scene, 'measurement')
+    if not os.path.isdir(backup):
+        shutil.copytree(measurement, backup)
+    for name in os.listdir(backup):
+        if re.search(r'\.tiff$', name):
+            shutil.copyfile(os.path.join(backup, name), os.path.join(measurement, name))
@@ -1,3 +1,3 @@
 __author__ = 'john'
 
-from .auxil import OSV, removeGRDBorderNoise
+from .auxil import OSV, removeGRDBorderNoise, removeGRDBorderNoise_many
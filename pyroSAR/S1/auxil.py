@@ -14,13 +14,14 @@ import re
 import ssl
 import time
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 import xml.etree.ElementTree as ET
 import numpy as np
 from osgeo import gdal
-from osgeo.gdalconst import GA_Update
+from osgeo.gdalconst import GA_Update, GA_ReadOnly
 from . import linesimplify as ls
 
-from spatialist.ancillary import finder, urlQueryParser
+from spatialist.ancillary import finder, urlQueryParser, multicore
 
 try:
     import argparse
@@ -402,7 +403,232 @@ class OSV(object):
             self.clean_res()
 
 
-def removeGRDBorderNoise(scene):
+def _interp_noise(lines, noise, ymin, ymax):
+    """
+    linearly interpolate noise vectors, which have already been interpolated along range, in azimuth direction.
+    Like :func:`numpy.interp`, values outside the range of `lines` are set to those of the first/last noise vector.
+    All noise vectors are used, so that the noise of a line does not depend on the subset it is interpolated for.
+    Previously, only the vectors inside the 2000 line border block were used and the lines between the block edge and
+    the first/last vector inside the block were set to the values of that vector; these lines are now interpolated
+    between the vectors on both sides of the block edge, e.g. the first 500 lines of the bottom block of an image
+    with 4500 lines and vectors every 1000 lines.
+
+    Parameters
+    ----------
+    lines: numpy.ndarray
+        the ascending azimuth line indices of the noise vectors
+    noise: numpy.ndarray
+        the range-interpolated noise vectors with one row per entry in `lines`
+    ymin: int
+        the first image line to interpolate
+    ymax: int
+        the image line at which to stop interpolation (exclusive)
+
+    Returns
+    -------
+    numpy.ndarray
+        the interpolated noise of shape (ymax - ymin, number of noise vector columns) and data type of `noise`
+    """
+    if len(lines) == 1:
+        return np.repeat(noise, ymax - ymin, axis=0)
+    rows = np.arange(ymin, ymax)
+    # find the index of the bracketing noise vectors for each line and compute the interpolation weights
+    upper = np.clip(np.searchsorted(lines, rows, side='right'), 1, len(lines) - 1)
+    lower = upper - 1
+    weight = (rows - lines[lower]).astype(float) / (lines[upper] - lines[lower])
+    weight = np.clip(weight, 0, 1).astype(noise.dtype)[:, np.newaxis]
+    return noise[lower] * (1 - weight) + noise[upper] * weight
+
+
+def _edge_windows(edge, subset, tilesize):
+    """
+    split an image border subset into tiles along the image edge
+
+    Parameters
+    ----------
+    edge: {'left', 'top', 'right', 'bottom'}
+        the image edge
+    subset: tuple
+        the subset boundaries (xmin, ymin, xmax, ymax)
+    tilesize: int
+        the maximum number of lines (left and right edge) or samples (top and bottom edge) per tile
+
+    Returns
+    -------
+    list of tuple
+        the tile offsets along the edge (start, stop) and the corresponding reading windows (xoff, yoff, xsize, ysize)
+    """
+    xmin, ymin, xmax, ymax = subset
+    length = ymax - ymin if edge in ['left', 'right'] else xmax - xmin
+    windows = []
+    for start in range(0, length, tilesize):
+        stop = min(start + tilesize, length)
+        if edge in ['left', 'right']:
+            window = (xmin, ymin + start, xmax - xmin, stop - start)
+        else:
+            window = (xmin + start, ymin, stop - start, ymax - ymin)
+        windows.append(((start, stop), window))
+    return windows
+
+
+def _edge_mask(edge, border, width):
+    """
+    create the mask of an image border tile from the border position of each of its lines (left and right edge)
+    or samples (top and bottom edge)
+
+    Parameters
+    ----------
+    edge: {'left', 'top', 'right', 'bottom'}
+        the image edge
+    border: numpy.ndarray
+        the position of the first valid pixel seen from the image edge
+        (left and top edge) or the position after the last valid pixel (right and bottom edge)
+    width: int
+        the subset width perpendicular to the image edge
+
+    Returns
+    -------
+    numpy.ndarray
+        a boolean array in image orientation, which is True for all pixels to be masked
+    """
+    index = np.arange(width)[np.newaxis, :]
+    if edge in ['left', 'top']:
+        mask = index < border[:, np.newaxis]
+    else:
+        mask = index >= border[:, np.newaxis]
+    return mask if edge in ['left', 'right'] else mask.T
+
+
+def _edge_overlaps(edge, subset, previous):
+    """
+    find the lines (left and right edge) or samples (top and bottom edge) of an image border subset
+    which overlap with other subsets
+
+    Parameters
+    ----------
+    edge: {'left', 'top', 'right', 'bottom'}
+        the image edge
+    subset: tuple
+        the subset boundaries (xmin, ymin, xmax, ymax)
+    previous: list of tuple
+        the boundaries of the subsets to check for overlap
+
+    Returns
+    -------
+    list of tuple
+        the sorted and merged offsets along the edge (start, stop) of all overlapping lines/samples
+    """
+    xmin, ymin, xmax, ymax = subset
+    spans = []
+    for pxmin, pymin, pxmax, pymax in previous:
+        if max(xmin, pxmin) < min(xmax, pxmax) and max(ymin, pymin) < min(ymax, pymax):
+            if edge in ['left', 'right']:
+                spans.append((max(ymin, pymin) - ymin, min(ymax, pymax) - ymin))
+            else:
+                spans.append((max(xmin, pxmin) - xmin, min(xmax, pxmax) - xmin))
+    merged = []
+    for start, stop in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _edge_positions(band, edge, subset, lines, noise, scalingFactor, tilesize):
+    """
+    compute the border position of each line/sample of one image edge
+
+    Parameters
+    ----------
+    band: osgeo.gdal.Band
+        the band of the master polarization image
+    edge: {'left', 'top', 'right', 'bottom'}
+        the image edge
+    subset: tuple
+        the subset boundaries (xmin, ymin, xmax, ymax)
+    lines: numpy.ndarray
+        the azimuth line indices of the noise vectors
+    noise: numpy.ndarray
+        the noise vectors interpolated along range to the full image width
+    scalingFactor: float
+        the noise scaling factor
+    tilesize: int
+        the maximum number of lines (left and right edge) or samples (top and bottom edge) per tile
+
+    Returns
+    -------
+    numpy.ndarray
+        the distance of the first valid pixel to the inner subset boundary (left and top edge)
+        or the position after the last valid pixel (right and bottom edge) for each line/sample along the edge
+    """
+    xmin, ymin, xmax, ymax = subset
+    width = xmax - xmin if edge in ['left', 'right'] else ymax - ymin
+    # compute the border of each line (left and right edge) or sample (top and bottom edge) tile by tile
+    positions = []
+    for (start, stop), (xoff, yoff, xsize, ysize) in _edge_windows(edge, subset, tilesize):
+        # read tile of image to array and subtract interpolated noise (denoising)
+        mat = band.ReadAsArray(xoff, yoff, xsize, ysize)
+        denoised = mat.astype(np.float32)
+        np.square(denoised, out=denoised)
+        noise_interp = _interp_noise(lines, noise[:, xoff:xoff + xsize], yoff, yoff + ysize)
+        noise_interp *= scalingFactor
+        denoised -= noise_interp
+        del noise_interp
+        # valid pixels have a value of at least 0.5 in the denoised tile and 30 in the original tile
+        valid = (denoised >= 0.5) & (mat >= 30)
+        del denoised, mat
+        # orient the tile so that the lines/samples along the edge are in the first dimension
+        valid = valid if edge in ['left', 'right'] else valid.T
+        # compute the border from the position of the first valid pixel seen from the image edge;
+        # np.argmax returns the index of the first True value along an axis or 0 if there is none
+        if edge in ['left', 'top']:
+            positions.append(width - np.argmax(valid, axis=1))
+        else:
+            positions.append(width - np.argmax(valid[:, ::-1], axis=1))
+    return np.concatenate(positions)
+
+
+def _edge_border(filename, edge, subset, lines, noise, scalingFactor, tilesize):
+    """
+    compute the border position of each line/sample of one image edge from the unmasked image.
+    The image is opened in read-only mode so that the four image edges can be processed in separate threads.
+    See :func:`_edge_positions` for the parameters and return value.
+    """
+    ras = gdal.Open(filename, GA_ReadOnly)
+    band = ras.GetRasterBand(1)
+    positions = _edge_positions(band, edge, subset, lines, noise, scalingFactor, tilesize)
+    band = None
+    ras = None
+    return positions
+
+
+def _edge_simplify(edge, positions, width):
+    """
+    simplify the border line of one image edge
+
+    Parameters
+    ----------
+    edge: {'left', 'top', 'right', 'bottom'}
+        the image edge
+    positions: numpy.ndarray
+        the border positions as returned by :func:`_edge_positions`
+    width: int
+        the subset width perpendicular to the image edge
+
+    Returns
+    -------
+    numpy.ndarray
+        the position of the first valid pixel seen from the image edge (left and top edge)
+        or the position after the last valid pixel (right and bottom edge) for each line/sample along the edge
+    """
+    border = np.array(ls.reduce(positions))
+    if edge in ['left', 'top']:
+        border = width - border
+    return border
+
+
+def removeGRDBorderNoise(scene, maxmemory=256):
     """
     mask out Sentinel-1 image border noise
 
@@ -414,6 +640,9 @@ def removeGRDBorderNoise(scene):
     ----------
     scene: ~pyroSAR.drivers.SAFE
         the Sentinel-1 scene object
+    maxmemory: int
+        the approximate amount of memory in MB to be used for image tiles; the border subsets are read and
+        written tile by tile so that this limit is not exceeded
 
     Returns
     -------
@@ -448,96 +677,98 @@ def removeGRDBorderNoise(scene):
     noiseVectors = noisetree.findall('.//noiseVector')
 
     # define boundaries of image subsets to be masked (4x the first lines/samples of the image boundaries)
-    subsets = [(0, 0, blocksize, scene.lines),
-               (0, 0, scene.samples, blocksize),
-               (scene.samples - blocksize, 0, scene.samples, scene.lines),
-               (0, scene.lines - blocksize, scene.samples, scene.lines)]
+    subsets = [('left', (0, 0, blocksize, scene.lines)),
+               ('top', (0, 0, scene.samples, blocksize)),
+               ('right', (scene.samples - blocksize, 0, scene.samples, scene.lines)),
+               ('bottom', (0, scene.lines - blocksize, scene.samples, scene.lines))]
 
-    # extract column indices of noise vectors
+    # extract line indices of noise vectors and interpolate all vectors along range to the full image width;
+    # this way the annotation text is only parsed once and the interpolation per subset is reduced to azimuth
     yi = np.array([int(x.find('line').text) for x in noiseVectors])
+    noise_range = np.empty((len(noiseVectors), scene.samples), dtype=np.float32)
+    for i, noiseVector in enumerate(noiseVectors):
+        xi = np.array(noiseVector.find('pixel').text.split(), dtype=int)
+        noise = np.array(noiseVector.find('noiseLut').text.split(), dtype=float)
+        noise_range[i, :] = np.interp(np.arange(scene.samples), xi, noise)
 
-    # create links to the tif files for a master co-polarization and all other polarizations as slaves
+    # the master co-polarization image from which the border is computed
     master = scene.findfiles('s1.*(?:vv|hh).*tiff')[0]
+
+    # the number of lines/samples along the image edge per tile;
+    # about 16 bytes per pixel are needed for reading and denoising the master image tile of each of the four edges
+    tilesize = max(1, int(maxmemory * 1024 ** 2 / (16 * blocksize * len(subsets))))
+
+    # compute the border positions of the four image edges from the unmasked image in parallel threads;
+    # only the positions in the image corners depend on the masking of the other edges and are corrected below
+    pool = ThreadPool(len(subsets))
+    positions = pool.map(lambda x: _edge_border(master, x[0], x[1], yi, noise_range, scalingFactor, tilesize),
+                         subsets)
+    pool.close()
+    pool.join()
+
+    # create links to the tif files for the master and all other polarizations as slaves
     ras_master = gdal.Open(master, GA_Update)
     ras_slaves = [gdal.Open(x, GA_Update) for x in scene.findfiles('s1.*tiff') if x != master]
 
     outband_master = ras_master.GetRasterBand(1)
     outband_slaves = [x.GetRasterBand(1) for x in ras_slaves]
+    outbands = [outband_master] + outband_slaves
+
+    # a pool of threads for reading and writing the tiles of all polarizations at once
+    pool = ThreadPool(len(outbands))
 
-    # iterate over the four image subsets
-    for subset in subsets:
-        print(subset)
+    def apply_mask(band, window, mask):
+        mat = band.ReadAsArray(*window)
+        mat[mask] = 0
+        band.WriteArray(mat, window[0], window[1])
+
+    # mask the four image subsets one after the other as they overlap in the image corners;
+    # the border positions in the corners are computed again from the image already masked by the previous edges
+    for i, (edge, subset) in enumerate(subsets):
         xmin, ymin, xmax, ymax = subset
-        xdiff = xmax - xmin
-        ydiff = ymax - ymin
-        # linear interpolation of noise vectors to array
-        noise_interp = np.empty((ydiff, xdiff), dtype=float)
-        for i in range(0, len(noiseVectors)):
-            if ymin <= yi[i] <= ymax:
-                # extract row indices of noise vector
-                xi = map(int, noiseVectors[i].find('pixel').text.split())
-                # extract noise values
-                noise = map(float, noiseVectors[i].find('noiseLut').text.split())
-                # interpolate values along rows
-                noise_interp[yi[i] - ymin, :] = np.interp(range(0, xdiff), xi, noise)
-        for i in range(0, xdiff):
-            yi_t = yi[(ymin <= yi) & (yi <= ymax)] - ymin
-            # interpolate values along columns
-            noise_interp[:, i] = np.interp(range(0, ydiff), yi_t, noise_interp[:, i][yi_t])
-    
-        # read subset of image to array and subtract interpolated noise (denoising)
-        mat_master = outband_master.ReadAsArray(*[xmin, ymin, xdiff, ydiff])
-        denoisedBlock = mat_master.astype(float) ** 2 - noise_interp * scalingFactor
-        # mask out all pixels with a value below 0.5 in the denoised block or 30 in the original block
-        denoisedBlock[(denoisedBlock < 0.5) | (mat_master < 30)] = 0
-        denoisedBlock = np.sqrt(denoisedBlock)
-    
-        # mask out negative values
-        def helper1(x):
-            return len(x) - np.argmax(x > 0)
-    
-        def helper2(x):
-            return len(x) - np.argmax(x[::-1] > 0)
-    
-        if subset == (0, 0, blocksize, scene.lines):
-            border = np.apply_along_axis(helper1, 1, denoisedBlock)
-            border = blocksize - np.array(ls.reduce(border))
-            for j in range(0, ydiff):
-                denoisedBlock[j, :border[j]] = 0
-                denoisedBlock[j, border[j]:] = 1
-        elif subset == (0, scene.lines - blocksize, scene.samples, scene.lines):
-            border = np.apply_along_axis(helper2, 0, denoisedBlock)
-            border = ls.reduce(border)
-            for j in range(0, xdiff):
-                denoisedBlock[border[j]:, j] = 0
-                denoisedBlock[:border[j], j] = 1
-        elif subset == (scene.samples - blocksize, 0, scene.samples, scene.lines):
-            border = np.apply_along_axis(helper2, 1, denoisedBlock)
-            border = ls.reduce(border)
-            for j in range(0, ydiff):
-                denoisedBlock[j, border[j]:] = 0
-                denoisedBlock[j, :border[j]] = 1
-        elif subset == (0, 0, scene.samples, blocksize):
-            border = np.apply_along_axis(helper1, 0, denoisedBlock)
-            border = blocksize - np.array(ls.reduce(border))
-            for j in range(0, xdiff):
-                denoisedBlock[:border[j], j] = 0
-                denoisedBlock[border[j]:, j] = 1
-    
-        mat_master[denoisedBlock == 0] = 0
-        # write modified array back to original file
-        outband_master.WriteArray(mat_master, xmin, ymin)
-        outband_master.FlushCache()
-        # perform reading, masking and writing for all other polarizations
-        for outband in outband_slaves:
-            mat = outband.ReadAsArray(*[xmin, ymin, xdiff, ydiff])
-            mat[denoisedBlock == 0] = 0
-            outband.WriteArray(mat, xmin, ymin)
+        for start, stop in _edge_overlaps(edge, subset, [x[1] for x in subsets[:i]]):
+            if edge in ['left', 'right']:
+                corner = (xmin, ymin + start, xmax, ymin + stop)
+            else:
+                corner = (xmin + start, ymin, xmin + stop, ymax)
+            positions[i][start:stop] = _edge_positions(outband_master, edge, corner,
+                                                       yi, noise_range, scalingFactor, tilesize)
+        border = _edge_simplify(edge, positions[i], blocksize)
+        # create the mask once per tile and apply it to all polarizations
+        for (start, stop), window in _edge_windows(edge, subset, tilesize):
+            mask = _edge_mask(edge, border[start:stop], blocksize)
+            pool.map(lambda band: apply_mask(band, window, mask), outbands)
+        for outband in outbands:
             outband.FlushCache()
+    pool.close()
+    pool.join()
     # detach file links
     outband_master = None
+    outband_slaves = None
+    outbands = None
     ras_master = None
-    for outband in outband_slaves:
-        outband = None
-    for ras in ras_slaves:
-        ras = None
+    ras_slaves = None
+
+
+def removeGRDBorderNoise_many(scenes, workers=4, maxmemory=256):
+    """
+    mask out Sentinel-1 image border noise for multiple scenes in parallel processes.
+    See :func:`removeGRDBorderNoise`.
+
+    Parameters
+    ----------
+    scenes: list of ~pyroSAR.drivers.SAFE
+        the Sentinel-1 scene objects
+    workers: int
+        the number of scenes to be processed in parallel
+    maxmemory: int
+        the approximate amount of memory in MB to be used for image tiles per scene
+
+    Returns
+    -------
+
+    """
+    # multicore would start a pool without processes for an empty list of scenes
+    if len(scenes) == 0:
+        return
+    multicore(removeGRDBorderNoise, cores=workers, multiargs={'scene': scenes}, maxmemory=maxmemory)
@@ -12,9 +12,9 @@ from .polysimplify import VWSimplifier
 
 
 def simplify(x, y, maxpoints=20):
-    x = map(float, x)
-    y = map(float, y)
-    pts = np.array(zip(x, y))
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+    pts = np.column_stack((x, y))
     simplifier = VWSimplifier(pts)
     sqd = []
     iter_range = range(2, maxpoints + 1)
@@ -23,7 +23,7 @@ def simplify(x, y, maxpoints=20):
         xn, yn = zip(*VWpts)
         out = np.sum((y - np.interp(x, xn, yn)) ** 2)
         sqd.append(out)
-    sqd /= max(sqd)
+    sqd = np.array(sqd) / max(sqd)
     iter = (np.array(iter_range) - 2) / (maxpoints - 2.)
     # plt.plot(iter_range, sqd, label='residual')
     # plt.plot(iter_range, iter, color='r', label='iteration')
@@ -39,7 +39,7 @@ def createPoly(xn, yn, xmax, ymax):
     ring = ogr.Geometry(ogr.wkbLinearRing)
     ring.AddPoint(0, 0)
     for item in zip(xn, yn):
-        item = map(int, item)
+        item = list(map(int, item))
         if item != [0, 0] and item != [xmax, ymax]:
             ring.AddPoint(item[0], item[1])
     ring.AddPoint(xmax, ymax)
@@ -51,7 +51,7 @@ def createPoly(xn, yn, xmax, ymax):
 
 
 def crop(seq, maxpoints=20, proximity=100, straighten=False):
-    x = map(float, range(0, len(seq)))
+    x = np.arange(len(seq), dtype=float)
     VWpts = simplify(x, seq, maxpoints)
     xn, yn = map(list, zip(*VWpts))
     simple = np.interp(x, xn, yn)
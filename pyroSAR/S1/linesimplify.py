@@ -3,6 +3,8 @@
 # John Truckenbrodt 2017
 ##############################################################
 
+import bisect
+import math
 from osgeo import ogr
 import numpy as np
 from spatialist.ancillary import rescale
@@ -10,18 +12,57 @@ from .polysimplify import VWSimplifier
 # import matplotlib.pyplot as plt
 
 
+def residuals(x, y, simplifier, maxpoints=20):
+    """
+    compute the squared residuals between a line and its simplifications returned by
+    :meth:`VWSimplifier.from_number` for 2 to maxpoints points.
+    The point sets are nested, i.e. each simplification adds the points with the next-highest thresholds
+    to the previous one. Hence only the residuals of the line segments split by the new points need to be
+    recomputed instead of interpolating the whole line for each number of points.
+    """
+    n = len(x)
+    # the point indices in the order in which they are added and the respective negative sorted thresholds
+    order = np.argsort(-simplifier.thresholds, kind='mergesort')
+    thresholds = -simplifier.thresholds[order]
+
+    def segment(a, b):
+        # the squared residuals of all points between the vertices a and b
+        slope = (y[b] - y[a]) / (x[b] - x[a])
+        return np.sum((y[a + 1:b] - (slope * (x[a + 1:b] - x[a]) + y[a])) ** 2)
+
+    vertices = []
+    segments = {}
+    sqd = []
+    for i in range(2, maxpoints + 1):
+        if i >= n:
+            # all points are vertices of the line, all further simplifications are identical
+            sqd.extend([0.] * (maxpoints + 1 - i))
+            break
+        count = np.searchsorted(thresholds, -simplifier.ordered_thresholds[i], side='left')
+        for index in order[len(vertices):count]:
+            pos = bisect.bisect(vertices, index)
+            vertices.insert(pos, index)
+            if 0 < pos < len(vertices) - 1:
+                left, right = vertices[pos - 1], vertices[pos + 1]
+                segments[left] = segment(left, index)
+                segments[index] = segment(index, right)
+            elif len(vertices) > 1:
+                # a new first or last vertex; the residuals are recomputed from scratch
+                segments = dict((a, segment(a, b)) for a, b in zip(vertices[:-1], vertices[1:]))
+        if len(vertices) < 2:
+            xn, yn = zip(*simplifier.from_number(i))
+            sqd.append(np.sum((y - np.interp(x, xn, yn)) ** 2))
+        else:
+            sqd.append(math.fsum(segments.values()))
+    return sqd
+
+
 def simplify(x, y, maxpoints=20):
-    x = map(float, x)
-    y = map(float, y)
-    pts = np.array(zip(x, y))
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+    pts = np.column_stack((x, y))
     simplifier = VWSimplifier(pts)
-    sqd = []
-    iter_range = range(2, maxpoints + 1)
-    for i in iter_range:
-        VWpts = simplifier.from_number(i)
-        xn, yn = zip(*VWpts)
-        out = np.sum((y - np.interp(x, xn, yn)) ** 2)
-        sqd.append(out)
+    sqd = residuals(x, y, simplifier, maxpoints)
     # sqd /= max(sqd)
     if min(sqd) == max(sqd):
         VWpts = simplifier.from_number(2)
@@ -46,7 +87,7 @@ def createPoly(xn, yn, xmax, ymax):
     ring = ogr.Geometry(ogr.wkbLinearRing)
     ring.AddPoint(0, 0)
     for item in zip(xn, yn):
-        item = map(int, item)
+        item = list(map(int, item))
         if item != [0, 0] and item != [xmax, ymax]:
             ring.AddPoint(item[0], item[1])
     ring.AddPoint(xmax, ymax)
@@ -57,36 +98,71 @@ def createPoly(xn, yn, xmax, ymax):
     return poly
 
 
+def below(px, py, xn, yn):
+    """
+    check whether points are strictly inside the polygon created by :func:`createPoly`,
+    i.e. above zero and below the line defined by the polygon's truncated vertices xn and yn.
+    The vertices are expected to start at x=0 and end at the last x value of the points.
+    Instead of OGR geometries, the check is computed for all points at once from the
+    sign of the cross product between the points and the respective line segment.
+    """
+    xt = np.trunc(xn)
+    yt = np.trunc(yn)
+    # the index of the line segment for each point; points at a vertex are assigned to its left or right segment,
+    # which both give the same result
+    i = np.clip(np.searchsorted(xt, px, side='right') - 1, 0, len(xt) - 2)
+    x1, y1, x2, y2 = xt[i], yt[i], xt[i + 1], yt[i + 1]
+    cross = (x2 - x1) * (py - y1) - (y2 - y1) * (px - x1)
+    return (cross < 0) & (px > xt[0]) & (px <= xt[-1]) & (py > 0)
+
+
+def distance(px, py, xn, yn):
+    """
+    compute the distance of points to the line defined by vertices xn and yn.
+    The distance to each line segment is computed like GEOS does for OGR geometries
+    and the minimum over all segments is returned.
+    """
+    px = np.asarray(px, dtype=float)[:, np.newaxis]
+    py = np.asarray(py, dtype=float)[:, np.newaxis]
+    ax, ay = np.asarray(xn[:-1], dtype=float), np.asarray(yn[:-1], dtype=float)
+    bx, by = np.asarray(xn[1:], dtype=float), np.asarray(yn[1:], dtype=float)
+    dx = bx - ax
+    dy = by - ay
+    len2 = dx * dx + dy * dy
+    # the position of the point projected onto the segment relative to its start (0) and end (1)
+    r = ((px - ax) * dx + (py - ay) * dy) / len2
+    # the distance of the point to the infinite line through the segment
+    s = ((ay - py) * dx - (ax - px) * dy) / len2
+    dists = np.abs(s) * np.sqrt(len2)
+    dist_a = np.sqrt((px - ax) ** 2 + (py - ay) ** 2)
+    dist_b = np.sqrt((px - bx) ** 2 + (py - by) ** 2)
+    dists = np.where(r <= 0, dist_a, np.where(r >= 1, dist_b, dists))
+    return dists.min(axis=1)
+
+
 def reduce(seq, maxpoints=20, straighten=False):
     if min(seq) == max(seq):
         return np.array(seq)
-    x = map(float, range(0, len(seq)))
+    x = np.arange(len(seq), dtype=float)
     # plt.plot(seq)
     VWpts = simplify(x, seq, maxpoints)
     xn, yn = map(list, zip(*VWpts))
     # plt.plot(xn, yn, linewidth=2, color='r')
-    simple = np.interp(x, xn, yn)
-    seq2 = np.copy(seq)
-    points = []
-    for xi, yi in enumerate(seq2):
-        point = ogr.Geometry(ogr.wkbPoint)
-        point.AddPoint(xi, yi)
-        points.append(point)
-    points = np.array(points)
+    # iteratively add the point with the largest distance below the simplified line as new vertex
+    # until all points are located on or above the line
+    px = np.copy(x)
+    py = np.array(seq, dtype=float)
     while True:
-        poly = createPoly(xn, yn, len(seq2), max(seq2))
-        line = ogr.Geometry(ogr.wkbLineString)
-        for xi, yi in zip(xn, yn):
-            line.AddPoint(xi, yi)
-        dists = np.array([line.Distance(point) for point in points])
-        contain = np.array([point.Within(poly) for point in points])
-        dists[~contain] = 0
-        points = points[(dists > 0)]
+        dists = np.zeros(len(px))
+        contain = below(px, py, xn, yn)
+        dists[contain] = distance(px[contain], py[contain], xn, yn)
+        px = px[(dists > 0)]
+        py = py[(dists > 0)]
         dists = dists[(dists > 0)]
         if len(dists) == 0:
             break
-        candidate = points[np.argmax(dists)]
-        cp = candidate.GetPoint()
+        candidate = np.argmax(dists)
+        cp = (px[candidate], py[candidate])
         index = np.argmin(np.array(xn) < cp[0])
         xn.insert(index, cp[0])
         yn.insert(index, cp[1])
@@ -25,7 +25,8 @@ SOFTWARE.
 ================================
 """
 
-from numpy import array, argmin
+import heapq
+from numpy import array
 import numpy as np
 
 
@@ -92,93 +93,91 @@ class VWSimplifier(object):
         """
         self.pts = np.array(pts)
         self.thresholds = self.build_thresholds()
-        self.ordered_thresholds = sorted(self.thresholds, reverse=True)
+        # sorting with numpy is about 50 times faster than the built-in sorted
+        # for 100k vertices, which iterates over numpy scalars
+        self.ordered_thresholds = np.sort(self.thresholds)[::-1]
 
     def build_thresholds(self):
         """
         compute the area value of each vertex, which one would
         use to mask an array of points for any threshold value.
         returns a numpy.array (length of pts)  of the areas.
+
+        The points are managed in a doubly linked list and the
+        next point to be eliminated is taken from a binary heap.
+        Heap entries of eliminated points or outdated areas are
+        not removed but skipped when popped (lazy invalidation).
+        This makes the elimination O(n log n) instead of O(n^2)
+        while giving the same result as the original implementation,
+        which is kept as reference in the tests.
         """
         pts = self.pts
         nmax = len(pts)
         real_areas = triangle_areas_from_array(pts)
-        real_indices = range(nmax)
-
-        # destructable copies
-        # ARG! areas=real_areas[:] doesn't make a copy!
-        areas = np.copy(real_areas)
-        i = real_indices[:]
-
-        # pick first point and set up for loop
-        min_vert = argmin(areas)
-        this_area = areas[min_vert]
-        #  areas and i are modified for each point finished
-        remove(areas, min_vert)  # faster
-        # areas = np.delete(areas,min_vert) #slower
-        real_idx = i.pop(min_vert)
-
-        # cntr = 3
-        while this_area < np.inf:
-            '''min_vert was removed from areas and i.  Now,
-            adjust the adjacent areas and remove the new
-            min_vert.
-            Now that min_vert was filtered out, min_vert points
-            to the point after the deleted point.'''
-
-            skip = False  # modified area may be the next minvert
-
-            try:
-                right_area = triangle_area(pts[i[min_vert - 1]],
-                                           pts[i[min_vert]], pts[i[min_vert + 1]])
-            except IndexError:
-                # trying to update area of endpoint. Don't do it
-                pass
+        
+        # plain Python floats are much faster to compute with than numpy
+        # scalars and give identical results for double precision
+        coords = pts.tolist() if pts.dtype == np.float64 else pts
+        
+        # the doubly linked list of the remaining points
+        prev = list(range(-1, nmax - 1))
+        succ = list(range(1, nmax + 1))
+        removed = [False] * nmax
+        
+        heap = list(zip(real_areas.tolist(), range(nmax)))
+        heapq.heapify(heap)
+        
+        # the next point to be eliminated if it is already
+        # known without popping it from the heap
+        skip = None
+        while True:
+            if skip is None:
+                while True:
+                    this_area, min_vert = heapq.heappop(heap)
+                    # heap entries are ordered by area and then by index, which equals
+                    # picking the first minimum of the remaining points like argmin
+                    if not removed[min_vert] and this_area == real_areas[min_vert]:
+                        break
             else:
-                right_idx = i[min_vert]
+                min_vert = skip
+                this_area = real_areas[min_vert]
+            
+            removed[min_vert] = True
+            left = prev[min_vert]
+            right = succ[min_vert]
+            if left >= 0:
+                succ[left] = right
+            if right < nmax:
+                prev[right] = left
+            
+            if not this_area < np.inf:
+                break
+            
+            skip = None
+            
+            # the right point is only updated if it is not the endpoint
+            if succ[right] < nmax:
+                right_area = triangle_area(coords[left], coords[right], coords[succ[right]])
                 if right_area <= this_area:
                     # even if the point now has a smaller area,
                     # it ultimately is not more significant than
-                    # the last point, which needs to be removed
-                    # first to justify removing this point.
-                    # Though this point is the next most significant
+                    # the last point, so it is removed next
                     right_area = this_area
-
-                    # min_vert refers to the point to the right of
-                    # the previous min_vert, so we can leave it
-                    # unchanged if it is still the min_vert
-                    skip = min_vert
-
-                # update both collections of areas
-                real_areas[right_idx] = right_area
-                areas[min_vert] = right_area
-
-            if min_vert > 1:
-                # cant try/except because 0-1=-1 is a valid index
-                left_area = triangle_area(pts[i[min_vert - 2]],
-                                          pts[i[min_vert - 1]], pts[i[min_vert]])
+                    skip = right
+                real_areas[right] = right_area
+                heapq.heappush(heap, (float(right_area), right))
+            
+            # the left point is only updated if it is not the start point
+            if prev[left] >= 0:
+                left_area = triangle_area(coords[prev[left]], coords[left], coords[right])
                 if left_area <= this_area:
                     # same justification as above
                     left_area = this_area
-                    skip = min_vert - 1
-                real_areas[i[min_vert - 1]] = left_area
-                areas[min_vert - 1] = left_area
-
-            # only argmin if we have too.
-            min_vert = skip or argmin(areas)
-            real_idx = i.pop(min_vert)
-            this_area = areas[min_vert]
-            # areas = np.delete(areas,min_vert) #slower
-            remove(areas, min_vert)  # faster
-            '''if sum(np.where(areas==np.inf)[0]) != sum(list(reversed(range(len(areas))))[:cntr]):
-              print "broke:",np.where(areas==np.inf)[0],cntr
-              break
-            cntr+=1
-            #if real_areas[0]<np.inf or real_areas[-1]<np.inf:
-            #  print "NO!", real_areas[0], real_areas[-1]
-            '''
+                    skip = left
+                real_areas[left] = left_area
+                heapq.heappush(heap, (float(left_area), left))
         return real_areas
-
+    
     def from_threshold(self, threshold):
         return self.pts[self.thresholds >= threshold]
 
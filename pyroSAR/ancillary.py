@@ -105,6 +105,32 @@ def seconds(filename):
     return td.total_seconds()
 
 
+def replace_file(src, dst):
+    """
+    rename a file and replace the target file if it exists like :func:`os.replace`, which is only available
+    in Python 3. On POSIX systems the target is replaced atomically, so that it is never missing or incomplete.
+    On Windows, where renaming to an existing file fails, the target is removed first.
+
+    Parameters
+    ----------
+    src: str
+        the name of the file to be renamed
+    dst: str
+        the new name of the file
+
+    Returns
+    -------
+
+    """
+    try:
+        os.rename(src, dst)
+    except OSError:
+        if not os.path.isfile(dst):
+            raise
+        os.remove(dst)
+        os.rename(src, dst)
+
+
 def parse_datasetname(name, parse_date=False):
     """
     Parse the name of a pyroSAR processing product and extract its metadata components as dictionary
@@ -0,0 +1,249 @@
+"""
+This module provides a scheduler for processing many scenes with one of pyroSAR's processors,
+e.g. :func:`pyroSAR.gamma.geocode` or :func:`pyroSAR.snap.util.geocode`, on a single machine.
+The number of scenes processed at the same time is derived from the available CPU cores,
+memory and temporary disk space.
+
+>>> from pyroSAR.batch import process
+>>> from pyroSAR.gamma import geocode
+>>> scenes = ['S1A_IW_GRDH_1SDV_20150222T170750_20150222T170815_004739_005DD8_3768.zip', ...]
+>>> process(scenes, geocode, statefile='/path/to/progress.json', dem='/path/to/dem',
+>>>         tempdir='/path/to/temp', outdir='/path/to/out', targetres=20)
+"""
+from __future__ import division, print_function
+import os
+import json
+import socket
+import traceback
+from time import time, sleep
+from datetime import datetime
+from functools import partial
+
+import pathos.multiprocessing as mp
+
+from .ancillary import replace_file
+
+
+def resources(directory=None):
+    """
+    get the computing resources currently available on the machine
+
+    Parameters
+    ----------
+    directory: str or None
+        the directory, for which the free disk space is determined, e.g. the processing temp directory
+
+    Returns
+    -------
+    dict
+        a dictionary with keys `cores`, `memory` and `disk`; memory and disk space are given in MB
+        and are None if they cannot be determined on the current platform
+    """
+    out = {'cores': mp.cpu_count(), 'memory': None, 'disk': None}
+
+    # the available memory is read from /proc/meminfo on Linux, otherwise the free memory is queried via sysconf
+    if os.path.isfile('/proc/meminfo'):
+        with open('/proc/meminfo', 'r') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    out['memory'] = int(line.split()[1]) // 1024
+                    break
+    if out['memory'] is None:
+        try:
+            out['memory'] = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES') // 1024 ** 2
+        except (AttributeError, ValueError, OSError):
+            pass
+
+    if directory is not None and hasattr(os, 'statvfs'):
+        # the directory might not exist yet, so its closest existing parent is checked
+        directory = os.path.abspath(directory)
+        while not os.path.exists(directory):
+            directory = os.path.dirname(directory)
+        stat = os.statvfs(directory)
+        out['disk'] = stat.f_bavail * stat.f_frsize // 1024 ** 2
+    return out
+
+
+def schedule(nscenes, memory=4000, disk=20000, directory=None, maxworkers=None):
+    """
+    compute the number of scenes to be processed in parallel and the number of threads per scene
+
+    Parameters
+    ----------
+    nscenes: int
+        the number of scenes to be processed
+    memory: int
+        the approximate peak memory in MB needed for processing one scene
+    disk: int
+        the approximate temporary disk space in MB needed for processing one scene
+    directory: str or None
+        the directory in which temporary files are written
+    maxworkers: int or None
+        an upper limit for the number of scenes processed in parallel
+
+    Returns
+    -------
+    tuple of int
+        the number of parallel workers and the number of threads per worker
+    """
+    res = resources(directory)
+    limits = [nscenes, res['cores']]
+    if maxworkers is not None:
+        limits.append(maxworkers)
+    if res['memory'] is not None:
+        limits.append(res['memory'] // memory)
+    if res['disk'] is not None:
+        limits.append(res['disk'] // disk)
+    workers = max(1, min(limits))
+    threads = max(1, res['cores'] // workers)
+    return workers, threads
+
+
+def _init_worker(threads):
+    """
+    initialize a worker process by limiting the number of threads of OpenMP-parallelized commands, e.g. GAMMA
+    """
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+
+
+def _name(scene):
+    """
+    the name of a scene under which its record is stored
+    """
+    return scene.scene if hasattr(scene, 'scene') else str(scene)
+
+
+def _run(processor, scene, retries, check, kwargs):
+    """
+    process a single scene and retry it if it failed or if `check` does not find its outputs
+
+    Returns
+    -------
+    dict
+        the processing record of the scene
+    """
+    record = {'scene': _name(scene), 'host': socket.gethostname(), 'pid': os.getpid(),
+              'threads': int(os.environ.get('OMP_NUM_THREADS', 1)),
+              'start': datetime.now().strftime('%Y%m%dT%H%M%S'), 'attempts': 0}
+    start = time()
+    for attempt in range(retries + 1):
+        record['attempts'] = attempt + 1
+        try:
+            processor(scene, **kwargs)
+            if check is not None and not check(scene, **kwargs):
+                raise RuntimeError('no outputs found for scene {}'.format(_name(scene)))
+            record['status'] = 'done'
+            record.pop('error', None)
+            break
+        except Exception:
+            record['status'] = 'failed'
+            record['error'] = traceback.format_exc()
+            if attempt < retries:
+                # leave some time for transient problems like unavailable servers or file locks to resolve
+                sleep(min(60, 5 * 2 ** attempt))
+    record['seconds'] = round(time() - start, 1)
+    return record
+
+
+def _read_state(statefile):
+    if statefile is None or not os.path.isfile(statefile):
+        return {}
+    with open(statefile, 'r') as state:
+        return json.load(state)
+
+
+def _write_state(statefile, records):
+    if statefile is None:
+        return
+    # the file is first written to a temporary file, which then atomically replaces the state file,
+    # so that the state file is never missing or incomplete
+    tmp = statefile + '.tmp'
+    with open(tmp, 'w') as state:
+        json.dump(records, state, indent=2, sort_keys=True)
+    replace_file(tmp, statefile)
+
+
+def process(scenes, processor, statefile=None, retries=1, memory=4000, disk=20000, maxworkers=None,
+            threads=None, verbose=True, check=None, **kwargs):
+    """
+    process a list of scenes in parallel processes
+
+    The number of scenes processed at the same time is computed by :func:`schedule` from the CPU cores,
+    the currently available memory and the free disk space in the directory defined by keyword `tempdir`
+    (or `outdir` if no `tempdir` is defined). The remaining cores are distributed among the processes by
+    setting the environment variable `OMP_NUM_THREADS`, which is used by GAMMA.
+    Failed scenes are retried. The status and processing time of each scene are written to `statefile`
+    as soon as the scene is finished, so that an interrupted batch run can be resumed by calling the function again.
+
+    Parameters
+    ----------
+    scenes: list
+        the scenes to be processed; anything that can be passed as first argument to `processor`,
+        e.g. file names or :class:`~pyroSAR.drivers.ID` objects
+    processor: function
+        the function to process a single scene, e.g. :func:`pyroSAR.gamma.geocode` or
+        :func:`pyroSAR.snap.util.geocode`
+    statefile: str or None
+        a JSON file for storing the processing records of the scenes;
+        scenes already marked as done in this file are skipped, unless `check` does not find their outputs
+    retries: int
+        the number of times a failed scene is processed again
+    memory: int
+        the approximate peak memory in MB needed for processing one scene
+    disk: int
+        the approximate temporary disk space in MB needed for processing one scene
+    maxworkers: int or None
+        an upper limit for the number of scenes processed in parallel
+    threads: int or None
+        the number of threads per process; if None, all cores are distributed among the processes
+    verbose: bool
+        print the progress?
+    check: function or None
+        a function, which is called with a scene and the keyword arguments of `processor` and returns whether the
+        outputs of the scene exist. A scene is only recorded as done if its outputs exist after `processor` has
+        returned, and scenes marked as done in `statefile` are processed again if their outputs are missing.
+        If None, a scene is done if `processor` returns without raising an error.
+    **kwargs
+        further arguments passed to `processor`
+
+    Returns
+    -------
+    dict
+        the processing records of all scenes as stored in `statefile`, with the scene names as keys
+
+    See Also
+    --------
+    :func:`resources`
+    """
+    records = _read_state(statefile)
+
+    todo = [x for x in scenes if records.get(_name(x), {}).get('status') != 'done'
+            or (check is not None and not check(x, **kwargs))]
+    if len(todo) == 0:
+        if verbose:
+            print('all scenes have already been processed')
+        return records
+
+    directory = kwargs.get('tempdir', kwargs.get('outdir'))
+    workers, threads_auto = schedule(len(todo), memory=memory, disk=disk, directory=directory,
+                                     maxworkers=maxworkers)
+    threads = threads_auto if threads is None else threads
+    if verbose:
+        print('processing {} scenes with {} workers and {} threads each'.format(len(todo), workers, threads))
+
+    pool = mp.Pool(processes=workers, initializer=_init_worker, initargs=(threads,))
+    try:
+        # the records are stored in the order the scenes are finished,
+        # so that a finished scene is not lost if a scene submitted before it is still being processed
+        run = partial(_run, processor, retries=retries, check=check, kwargs=kwargs)
+        for i, record in enumerate(pool.imap_unordered(run, todo)):
+            records[record['scene']] = record
+            _write_state(statefile, records)
+            if verbose:
+                print('[{}/{}] {}: {} after {} attempt(s) in {} s'.format(i + 1, len(todo), record['scene'],
+                                                                          record['status'], record['attempts'],
+                                                                          record['seconds']))
+    finally:
+        pool.close()
+        pool.join()
+    return records
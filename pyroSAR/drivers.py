@@ -42,6 +42,7 @@ from osgeo import gdal, osr
 from osgeo.gdalconst import GA_ReadOnly
 
 from . import S1
+from .S1.polysimplify import WKTSimplifier
 from .ERS import passdb_query
 from .xml_util import getNamespaces
 
@@ -1198,11 +1199,19 @@ class SAFE(ID):
         
         self.gammafiles = {'slc': [], 'pri': [], 'grd': []}
     
-    def removeGRDBorderNoise(self):
+    def removeGRDBorderNoise(self, maxmemory=256):
         """
         mask out Sentinel-1 image border noise. See :func:`~pyroSAR.S1.auxil.removeGRDBorderNoise`
         """
-        S1.removeGRDBorderNoise(self)
+        S1.removeGRDBorderNoise(self, maxmemory=maxmemory)
+    
+    @staticmethod
+    def removeGRDBorderNoise_many(scenes, workers=4, maxmemory=256):
+        """
+        mask out Sentinel-1 image border noise for multiple scenes in parallel.
+        See :func:`~pyroSAR.S1.auxil.removeGRDBorderNoise_many`
+        """
+        S1.removeGRDBorderNoise_many(scenes, workers=workers, maxmemory=maxmemory)
     
     def getCorners(self):
         coordinates = self.meta['coordinates']
@@ -1410,6 +1419,16 @@ class Archive(object):
         a dictionary containing additional non-standard database column names and data types;
         the names must be attributes of the SAR scenes to be inserted (i.e. id.attr) or keys in their meta attribute
         (i.e. id.meta['attr'])
+    footprint: bool
+        add a column `footprint` to the database, which stores the true scene footprint polygon in addition to
+        the bounding box in column `bbox`? The footprint is read from the `gml:coordinates` of Sentinel-1 manifests
+        (:class:`SAFE` scenes); for all other scenes and for degenerate footprints, which do not form a valid polygon
+        before or after simplification to `footprint_vertices`, the bounding box is stored instead.
+        If the column exists, it is used by :meth:`select` for testing the intersection with a site.
+        Once created, the column is filled for all newly inserted scenes.
+    footprint_vertices: int
+        the maximum number of vertices of the footprint polygons including the closing vertex, at least 4;
+        footprints with more vertices are simplified with :class:`~pyroSAR.S1.polysimplify.WKTSimplifier`
 
     Examples
     ----------
@@ -1443,8 +1462,11 @@ class Archive(object):
     >>>     print(archive.is_registered(scene))
     """
     
-    def __init__(self, dbfile, custom_fields=None):
+    def __init__(self, dbfile, custom_fields=None, footprint=False, footprint_vertices=50):
+        if footprint_vertices < 4:
+            raise ValueError('footprint_vertices must be at least 4 for a valid polygon')
         self.dbfile = dbfile
+        self.footprint_vertices = footprint_vertices
         self.conn = sqlite_setup(dbfile, ['spatialite'])
         
         self.lookup = {'sensor': 'TEXT',
@@ -1475,6 +1497,8 @@ class Archive(object):
         cursor.execute(create_string)
         if 'bbox' not in self.get_colnames():
             cursor.execute('SELECT AddGeometryColumn("data","bbox" , 4326, "POLYGON", "XY", 0)')
+        if footprint and 'footprint' not in self.get_colnames():
+            cursor.execute('SELECT AddGeometryColumn("data","footprint" , 4326, "POLYGON", "XY", 0)')
         
         create_string = 'CREATE TABLE if not exists duplicates (outname_base TEXT, scene TEXT)'
         cursor.execute(create_string)
@@ -1497,6 +1521,8 @@ class Archive(object):
             if attribute == 'bbox':
                 geom = id.bbox().convert2wkt(set3D=False)[0]
                 insertion.append(geom)
+            elif attribute == 'footprint':
+                insertion.append(self.__footprint(id))
             elif attribute in ['hh', 'vv', 'hv', 'vh']:
                 insertion.append(int(attribute in pols))
             else:
@@ -1510,9 +1536,40 @@ class Archive(object):
                 insertion.append(value)
         insert_string = '''INSERT INTO data({0}) VALUES({1})''' \
             .format(', '.join(colnames),
-                    ', '.join(['GeomFromText(?, 4326)' if x == 'bbox' else '?' for x in colnames]))
+                    ', '.join(['GeomFromText(?, 4326)' if x in ['bbox', 'footprint'] else '?' for x in colnames]))
         return insert_string, tuple(insertion)
     
+    def __footprint(self, id):
+        """
+        create the footprint polygon of a scene
+
+        :param id: a pyroSAR ID object
+        :return: the footprint as WKT string; the bounding box if no valid footprint is available
+        """
+        bbox = id.bbox().convert2wkt(set3D=False)[0]
+        if not isinstance(id, SAFE) or 'coordinates' not in id.meta.keys():
+            return bbox
+        # the coordinates are stored as (lat, lon) tuples
+        pts = [(lon, lat) for lat, lon in id.meta['coordinates']]
+        if pts[0] != pts[-1]:
+            pts.append(pts[0])
+        if len(pts) < 4:
+            # at least four points are needed for a valid polygon
+            return bbox
+        simplifier = WKTSimplifier(pts)
+        if len(pts) > self.footprint_vertices:
+            # the smallest threshold with which at most footprint_vertices points remain;
+            # the first and last point have infinite thresholds and always remain, thus the closed ring is preserved
+            ordered = simplifier.ordered_thresholds
+            threshold = ordered[ordered > ordered[self.footprint_vertices]].min()
+            if (simplifier.thresholds >= threshold).sum() < 4:
+                # the points with the same threshold as the first removed point are removed as well,
+                # which may leave too few points for a valid polygon
+                return bbox
+        else:
+            threshold = 0
+        return 'POLYGON({})'.format(simplifier.wkt_from_threshold(threshold))
+    
     def insert(self, scene_in, verbose=False, test=False):
         """
         Insert one or many scenes into the database
@@ -1769,7 +1826,8 @@ class Archive(object):
         Parameters
         ----------
         vectorobject: :class:`~spatialist.vector.Vector`
-            a geometry with which the scenes need to overlap
+            a geometry with which the scenes need to overlap; the true scene footprint is used for testing
+            the overlap if the database contains a `footprint` column, the bounding box otherwise
         mindate:str
             the minimum acquisition date in format YYYYmmddTHHMMSS
         maxdate: str
@@ -1830,7 +1888,11 @@ class Archive(object):
             if isinstance(vectorobject, Vector):
                 vectorobject.reproject('+proj=longlat +datum=WGS84 +no_defs ')
                 site_geom = vectorobject.convert2wkt(set3D=False)[0]
-                arg_format.append('st_intersects(GeomFromText(?, 4326), bbox) = 1')
+                if 'footprint' in self.get_colnames():
+                    # scenes inserted before the footprint column was created are tested with their bounding box
+                    arg_format.append('st_intersects(GeomFromText(?, 4326), COALESCE(footprint, bbox)) = 1')
+                else:
+                    arg_format.append('st_intersects(GeomFromText(?, 4326), bbox) = 1')
                 vals.append(site_geom)
             else:
                 print('WARNING: argument vectorobject is ignored, must be of type spatialist.vector.Vector')
@@ -1,3 +1,9 @@
 from .auxil import process, ISPPar, UTM, Spacing, Namespace, slc_corners, ExamineGamma, par2hdr
+from .checkpoints import Checkpoints
+from .cache import GeometryCache
+from .workflow import Workflow
+from .tempspace import TempSpace
+from .intermediates import Intermediates
+from .execution import add_sink, remove_sink, JSONLinesSink, summarize, Backend
 from .util import geocode, multilook, ovs, convert2gamma, calibrate, correctOSV, S1_deburst
 from . import srtm
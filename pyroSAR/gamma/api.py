@@ -1,18 +1,87 @@
+"""
+Access to the Python wrappers of the Gamma commands, which are generated by :func:`pyroSAR.gamma.parser.autoparse`.
+
+The modules are only parsed and imported once they are first used, so that importing :mod:`pyroSAR.gamma`
+is fast and does not need a Gamma installation, e.g. in worker processes which do not use all modules.
+The modules `diff`, `disp`, `isp` and `lat` can be imported directly, all other modules of the Gamma installation
+are resolved via the module's `__getattr__` function (Python 3.7 and later).
+If no Gamma installation is found, accessing a command raises an AttributeError.
+
+>>> from pyroSAR.gamma.api import isp
+>>> isp.multi_look(...)  # the Gamma installation is parsed and module isp is imported here
+"""
 import os
 import sys
-import warnings
+import threading
+import importlib
 
 from .parser import autoparse
 
-try:
-    autoparse()
-    
-    sys.path.insert(0, os.path.join(os.path.expanduser('~'), '.pyrosar'))
-    
-    try:
-        from gammaparse import *
-    except ImportError:
-        warnings.warn('found a Gamma installation directory, but module parsing failed')
+_modules = {}
+_lock = threading.Lock()
+
+
+def _load(name):
+    """
+    parse the Gamma installation if necessary and import a module of the generated package `gammaparse`
+    """
+    with _lock:
+        if name not in _modules.keys():
+            try:
+                autoparse()
+            except RuntimeError:
+                raise ImportError('could not find Gamma installation directory; '
+                                  'please set the GAMMA_HOME environment variable')
+            path = os.path.join(os.path.expanduser('~'), '.pyrosar')
+            if path not in sys.path:
+                sys.path.insert(0, path)
+            try:
+                _modules[name] = importlib.import_module('gammaparse.{}'.format(name))
+            except ImportError:
+                raise ImportError('found a Gamma installation directory, but module {} could not be imported'
+                                  .format(name))
+        return _modules[name]
+
+
+class _LazyModule(object):
+    """
+    a placeholder for a module of package `gammaparse`, which is imported on first attribute access
+    """
+
+    def __init__(self, name):
+        self.__name = name
 
-except RuntimeError:
-    warnings.warn('could not find Gamma installation directory; please set the GAMMA_HOME environment variable')
+    def __getattr__(self, item):
+        if item.startswith('__'):
+            raise AttributeError(item)
+        try:
+            module = _load(self.__name)
+        except ImportError as e:
+            # attribute lookups like hasattr expect an AttributeError
+            raise AttributeError(str(e))
+        return getattr(module, item)
+
+    def __dir__(self):
+        try:
+            return dir(_load(self.__name))
+        except ImportError:
+            return []
+
+    def __repr__(self):
+        return "<lazily imported Gamma module '{}'>".format(self.__name)
+
+
+diff = _LazyModule('diff')
+disp = _LazyModule('disp')
+isp = _LazyModule('isp')
+lat = _LazyModule('lat')
+
+
+def __getattr__(name):
+    if name.startswith('__'):
+        raise AttributeError(name)
+    try:
+        return _load(name)
+    except ImportError as e:
+        # attribute lookups like hasattr expect an AttributeError
+        raise AttributeError(str(e))
@@ -0,0 +1,171 @@
+"""
+In-process NumPy replacements for the simple pixel-wise GAMMA LAT commands used by :func:`pyroSAR.gamma.geocode`.
+The images are read in GAMMA's big-endian FLOAT format via :func:`pyroSAR.gamma.io.memmap` and processed in blocks
+of lines, so that memory usage is independent of the image size. Several consecutive LAT commands can be fused into one pass
+(see :func:`normalize`), which avoids writing and reading the intermediate images.
+
+The functions do not need a GAMMA installation.
+"""
+import numpy as np
+
+from . import io
+
+
+def _blockwise(function, inputs, output, width, blocksize=64):
+    """
+    apply a function to blocks of lines of several FLOAT images of identical size and write the result to a new image
+
+    Parameters
+    ----------
+    function: function
+        the function receiving one block of each input image as float32 array and returning the output block
+    inputs: list of str
+        the input images
+    output: str
+        the output image
+    width: int
+        the number of samples per line
+    blocksize: int
+        the approximate size of each block in MB
+
+    Returns
+    -------
+
+    """
+    arrays = [io.memmap(x, width) for x in inputs]
+    for filename, array in zip(inputs[1:], arrays[1:]):
+        if array.shape != arrays[0].shape:
+            raise RuntimeError('images {} and {} differ in size'.format(inputs[0], filename))
+    out = io.create(output, arrays[0].shape[0], width)
+    for block, view in io.blocks(arrays[0], blocksize):
+        out[block] = function(*[view.astype(np.float32)] + [x[block].astype(np.float32) for x in arrays[1:]])
+    out.flush()
+    del out
+
+
+def product(data_1, data_2, product, width, blocksize=64):
+    """
+    multiply two images pixel by pixel; equivalent to GAMMA command `product` with an averaging window of 1x1
+
+    Parameters
+    ----------
+    data_1: str
+        the first input image
+    data_2: str
+        the second input image
+    product: str
+        the output image
+    width: int
+        the number of samples per line
+    blocksize: int
+        the approximate size of the processed blocks in MB
+
+    Returns
+    -------
+
+    """
+    _blockwise(lambda x, y: x * y, [data_1, data_2], product, width, blocksize)
+
+
+def ratio(d1, d2, ratio, width, blocksize=64):
+    """
+    divide two images pixel by pixel; pixels with a denominator of 0 are set to 0 like by GAMMA command `ratio`
+
+    Parameters
+    ----------
+    d1: str
+        the numerator image
+    d2: str
+        the denominator image
+    ratio: str
+        the output image
+    width: int
+        the number of samples per line
+    blocksize: int
+        the approximate size of the processed blocks in MB
+
+    Returns
+    -------
+
+    """
+    def divide(x, y):
+        out = np.zeros_like(x)
+        np.divide(x, y, out=out, where=y != 0)
+        return out
+
+    _blockwise(divide, [d1, d2], ratio, width, blocksize)
+
+
+def normalize(data_in, data_out, width, factor=1., inc=None, pix=None, blocksize=64):
+    """
+    fused topographic normalization of a backscatter image in one pass:
+
+    .. math::
+        out = data\\_in \\cdot pix \\cdot factor / \\cos(inc)
+
+    This replaces the chain of GAMMA commands `product` (multiplication with a pixel area normalization image),
+    `lin_comb` (multiplication with a constant factor) and `sigma2gamma` (conversion to gamma nought with a local
+    incidence angle image) without writing intermediate images.
+
+    Parameters
+    ----------
+    data_in: str
+        the input image
+    data_out: str
+        the output image
+    width: int
+        the number of samples per line
+    factor: float
+        a constant factor, e.g. the cosine of the scene center incidence angle
+    inc: str or None
+        a local incidence angle image in radians; if None, no conversion to gamma nought is performed
+    pix: str or None
+        a pixel area normalization image; if None, no pixel area normalization is performed
+    blocksize: int
+        the approximate size of the processed blocks in MB
+
+    Returns
+    -------
+
+    """
+    inputs = [data_in] + [x for x in [pix, inc] if x is not None]
+
+    def function(data, *args):
+        out = data * np.float32(factor)
+        if pix is not None:
+            out *= args[0]
+        if inc is not None:
+            out /= np.cos(args[-1])
+        return out
+
+    _blockwise(function, inputs, data_out, width, blocksize)
+
+
+def linear_to_dB(data_in, data_out, width, null_value=0., blocksize=64):
+    """
+    convert an image from linear to decibel scale; equivalent to GAMMA command `linear_to_dB`
+
+    Parameters
+    ----------
+    data_in: str
+        the input image in linear scale
+    data_out: str
+        the output image in decibel scale
+    width: int
+        the number of samples per line
+    null_value: float
+        the value of output pixels with input values <= 0
+    blocksize: int
+        the approximate size of the processed blocks in MB
+
+    Returns
+    -------
+
+    """
+    def convert(x):
+        out = np.full_like(x, null_value)
+        valid = x > 0
+        out[valid] = 10 * np.log10(x[valid])
+        return out
+
+    _blockwise(convert, [data_in], data_out, width, blocksize)
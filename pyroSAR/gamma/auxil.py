@@ -6,14 +6,17 @@ import math
 import os
 import re
 import json
+import threading
 import subprocess as sp
-from datetime import datetime
+from time import time
+from collections import OrderedDict
 
-from spatialist.ancillary import parse_literal, run, union, dissolve
+from spatialist.ancillary import union, dissolve
 from spatialist.envi import hdr
 
 from pyroSAR import ConfigHandler
 from .error import gammaErrorHandler
+from .execution import _current, _script, _execute, _emit
 
 
 class ISPPar(object):
@@ -57,48 +60,91 @@ class ISPPar(object):
             filename: The filename or file object representing the ISP parameter file.
         """
         if isinstance(filename, str):
-            par_file = open(filename, 'r')
+            pairs = _parse_cached(filename)
         else:
-            par_file = filename
+            pairs = ISPPar._parse(filename)
         
         self.keys = []
+        for key, value in pairs:
+            self.keys.append(key)
+            # the cached values are immutable; each object gets its own copy of list values
+            setattr(self, key, list(value) if isinstance(value, tuple) else value)
         
+        if hasattr(self, 'date'):
+            self.date = '{}-{:02d}-{:02d}T{:02d}:{:02d}:{:02f}'.format(*self.date)
+    
+    @staticmethod
+    def _literal(token):
+        """
+        convert a token to int, float or str like :func:`spatialist.ancillary.parse_literal`;
+        tokens which cannot be integers are directly converted to float to avoid raising exceptions
+        """
+        if '.' not in token and 'e' not in token and 'E' not in token:
+            try:
+                return int(token)
+            except ValueError:
+                pass
+        try:
+            return float(token)
+        except ValueError:
+            return token
+    
+    @staticmethod
+    def _number(token):
+        """
+        the value of the float literal at the start of a token as int or float, or None if there is none
+        """
+        # most tokens are plain numbers, which are converted directly without regular expression
+        first = token.lstrip('+-')[:1]
+        if first and first in '0123456789.' and '_' not in token:
+            value = ISPPar._literal(token)
+            if not isinstance(value, str):
+                return value
+        match = ISPPar._re_float_literal.match(token)
+        return ISPPar._literal(match.group()) if match else None
+    
+    @staticmethod
+    def _parse(par_file):
+        """
+        parse the key-value pairs of an open parameter file and close it
+        
+        Returns
+        -------
+        tuple
+            the (key, value) pairs; multiple values are stored as tuple
+        """
+        pairs = []
         try:
             par_file.readline()  # Skip header line
             for line in par_file:
                 match = ISPPar._re_kv_pair.match(line)
                 if not match:
                     continue  # Skip malformed lines with no key-value pairs
-                key = match.group(1)
                 items = match.group(2).split()
                 if len(items) == 0:
                     value = None
                 elif len(items) == 1:
-                    value = parse_literal(items[0])
+                    value = ISPPar._literal(items[0])
                 else:
-                    if not ISPPar._re_float_literal.match(items[0]):
+                    numbers = []
+                    for item in items:
+                        number = ISPPar._number(item)
+                        if number is None:
+                            break
+                        numbers.append(number)
+                    if len(numbers) == 0:
                         # Value is a string literal containing whitespace characters
                         value = match.group(2)
+                    elif len(numbers) == 1:
+                        # If the first float literal is immediately followed by a non-float literal handle the
+                        # first one as singular value, e.g. in '20.0970 dB'
+                        value = numbers[0]
                     else:
-                        # Evaluate each item and stop at the first non-float literal
-                        value = []
-                        for i in items:
-                            match = ISPPar._re_float_literal.match(i)
-                            if match:
-                                value.append(parse_literal(match.group()))
-                            else:
-                                # If the first float literal is immediately followed by a non-float literal handle the
-                                # first one as singular value, e.g. in '20.0970 dB'
-                                if len(value) == 1:
-                                    value = value[0]
-                                break
-                self.keys.append(key)
-                setattr(self, key, value)
+                        value = tuple(numbers)
+                pairs.append((match.group(1), value))
         finally:
             par_file.close()
-
-        if hasattr(self, 'date'):
-            self.date = '{}-{:02d}-{:02d}T{:02d}:{:02d}:{:02f}'.format(*self.date)
+        return tuple(pairs)
     
     def __enter__(self):
         return self
@@ -171,6 +217,62 @@ class ISPPar(object):
         return out
 
 
+# the parsed parameter files as returned by ISPPar._parse together with the signature of the parsed file
+# (see _signature) by absolute path
+_parcache = OrderedDict()
+_parcache_lock = threading.Lock()
+_parcache_size = 256
+
+
+def _signature(filename):
+    """
+    the state of a file by which a modification is detected; the modification time is used in nanoseconds where
+    available, and the change time and inode also reveal a file replaced or rewritten with the same size and
+    modification time. On file systems with a resolution of one second or coarser, a file rewritten within the
+    same second can still have the same signature, which is why :func:`process` additionally invalidates the
+    entries of all files passed to a command.
+    """
+    stat = os.stat(filename)
+    mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+    ctime = getattr(stat, 'st_ctime_ns', stat.st_ctime)
+    return mtime, ctime, stat.st_ino, stat.st_size
+
+
+def _parse_cached(filename):
+    """
+    parse a parameter file or get the result of an earlier parsing of the unmodified file
+    """
+    path = os.path.abspath(filename)
+    signature = _signature(filename)
+    with _parcache_lock:
+        if path in _parcache.keys() and _parcache[path][0] == signature:
+            # move the entry to the end so that the least recently used entries are removed first
+            entry = _parcache.pop(path)
+            _parcache[path] = entry
+            return entry[1]
+    pairs = ISPPar._parse(open(filename, 'r'))
+    with _parcache_lock:
+        _parcache.pop(path, None)
+        _parcache[path] = (signature, pairs)
+        while len(_parcache) > _parcache_size:
+            _parcache.popitem(last=False)
+    return pairs
+
+
+def _invalidate(cmd, outdir=None):
+    """
+    remove the cached parameter files passed to a command, which might have been modified by it, e.g. the
+    state vectors of a parameter file updated in place by S1_OPOD_vec
+    """
+    with _parcache_lock:
+        if len(_parcache) == 0:
+            return
+        for arg in dissolve(cmd[1:]):
+            arg = str(arg)
+            path = os.path.abspath(arg if outdir is None else os.path.join(outdir, arg))
+            _parcache.pop(path, None)
+
+
 def par2hdr(parfile, hdrfile, nodata=None):
     """
     Create an ENVI HDR file from a Gamma PAR file
@@ -221,6 +323,11 @@ def process(cmd, outdir=None, logfile=None, logpath=None, inlist=None, void=True
     """
     wrapper function to execute GAMMA commands via module :mod:`subprocess`
     
+    The execution time and resource usage of each command are passed to the sinks registered via
+    :func:`~pyroSAR.gamma.execution.add_sink`. If a :class:`~pyroSAR.gamma.execution.Backend` has been opened by
+    the current thread, the command is executed by it, otherwise the shell script and log file are opened for each
+    command.
+    
     Parameters
     ----------
     cmd: list
@@ -248,21 +355,26 @@ def process(cmd, outdir=None, logfile=None, logpath=None, inlist=None, void=True
         log = logfile
     else:
         log = os.path.join(logpath, os.path.basename(cmd[0]) + '.log') if logpath else None
+    backends = _current().backends
+    backend = backends[-1] if len(backends) > 0 else None
     if shellscript is not None:
-        line = ' '.join([str(x) for x in dissolve(cmd)])
-        if inlist is not None:
-            line += ' <<< $"{}"'.format('\n'.join([str(x) for x in inlist]) + '\n')
-        with open(shellscript, 'a+') as sh:
-            if outdir is not None:
-                first = sh.read(1)
-                if not first:
-                    ts = datetime.now().strftime('%a %b %d %H:%M:%S %Y')
-                    sh.write('# this script was created automatically by pyroSAR on {}\n\n'.format(ts))
-                    sh.write('export base={}\n\n'.format(outdir))
-                line = line.replace(outdir, '$base')
-            sh.write(line + '\n\n')
-    out, err = run(cmd, outdir=outdir, logfile=log, inlist=inlist, void=False, errorpass=True)
-    gammaErrorHandler(out, err)
+        if backend is not None:
+            backend.script(shellscript, cmd, outdir=outdir, inlist=inlist)
+        else:
+            with open(shellscript, 'a') as sh:
+                _script(sh, cmd, outdir, inlist)
+    start = time()
+    if backend is not None:
+        out, err, usage = backend.run(cmd, outdir=outdir, logfile=log, inlist=inlist)
+    else:
+        out, err, usage = _execute(cmd, outdir=outdir, logfile=log, inlist=inlist)
+    _invalidate(cmd, outdir)
+    try:
+        gammaErrorHandler(out, err)
+    except Exception:
+        _emit(cmd, outdir, start, usage, 'failed')
+        raise
+    _emit(cmd, outdir, start, usage, 'done')
     if not void:
         return out, err
 
@@ -0,0 +1,190 @@
+"""
+A cache for the geometry products of :func:`pyroSAR.gamma.geocode`, e.g. the DEM segment and lookup table, which are
+shared by the scenes of the same track.
+"""
+import os
+import json
+import shutil
+import hashlib
+
+
+class GeometryCache(object):
+    """
+    a size-bounded cache for sharing GAMMA products between the processing of different scenes,
+    e.g. DEM segments and geocoding lookup tables.
+    
+    Each entry is identified by a key computed from everything the products depend on (see :meth:`key`) and is
+    stored in a subdirectory of the cache directory named by the key. Next to the files, a file `entry.json`
+    stores their names, their total size and additional information, which can be used for searching entries
+    via :meth:`entries`. Once the total size of all entries exceeds `maxsize`, the least recently used entries are
+    deleted. Entries are written to a temporary directory and then renamed so that the cache can be shared by
+    several processes.
+    
+    Parameters
+    ----------
+    directory: str
+        the cache directory; it is created if it does not exist
+    maxsize: int
+        the maximum size of the cache in MB
+    
+    Examples
+    --------
+    >>> cache = GeometryCache('/path/to/cache', maxsize=50000)
+    >>> key = cache.key('gc_map', dem, open(mli + '.par').read(), targetres)
+    >>> files = {'lut': '/path/to/scene/lut', 'inc': '/path/to/scene/inc'}
+    >>> if not cache.get(key, files):
+    >>>     gc_map(...)
+    >>>     cache.put(key, files)
+    """
+    
+    def __init__(self, directory, maxsize=20000):
+        self.directory = directory
+        self.maxsize = maxsize
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    
+    @staticmethod
+    def key(*items):
+        """
+        compute a cache key as the SHA-1 hash of items, which must be serializable to JSON
+        
+        Parameters
+        ----------
+        items
+            the items identifying a cache entry, e.g. file names, parameter file contents and processing parameters
+        
+        Returns
+        -------
+        str
+        """
+        return hashlib.sha1(json.dumps(items, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def __entry(self, key):
+        return os.path.join(self.directory, key, 'entry.json')
+    
+    def entries(self, **info):
+        """
+        list the cache entries, optionally filtered by the information stored via :meth:`put`
+        
+        Parameters
+        ----------
+        info
+            key-value pairs, which must match the information of an entry
+        
+        Returns
+        -------
+        list of dict
+            the information of all matching entries, which also contains the keys `key`, `files`, `size` and
+            `used`, i.e. the time of last access in seconds since the epoch; the most recently used entries come first
+        """
+        out = []
+        for key in os.listdir(self.directory):
+            entry = self.__entry(key)
+            try:
+                with open(entry, 'r') as meta:
+                    record = json.load(meta)
+                record['used'] = os.path.getmtime(entry)
+            except (IOError, OSError, ValueError):
+                # temporary directories and entries deleted by other processes
+                continue
+            if all([record['info'].get(x) == y for x, y in info.items()]):
+                record.update(record.pop('info'))
+                out.append(record)
+        return sorted(out, key=lambda x: x['used'], reverse=True)
+    
+    def path(self, key, name):
+        """
+        the name of a file of a cache entry
+        
+        Parameters
+        ----------
+        key: str
+            the key of the entry
+        name: str
+            the name of the file as defined in :meth:`put`
+        
+        Returns
+        -------
+        str
+        """
+        return os.path.join(self.directory, key, name)
+    
+    def get(self, key, files):
+        """
+        copy the files of a cache entry to their target locations
+        
+        Parameters
+        ----------
+        key: str
+            the key of the entry
+        files: dict
+            the names of the files as defined in :meth:`put` as keys and the target file names as values
+        
+        Returns
+        -------
+        bool
+            True if the entry exists and all files were copied
+        """
+        entry = self.__entry(key)
+        if not os.path.isfile(entry):
+            return False
+        try:
+            for name, target in files.items():
+                shutil.copyfile(self.path(key, name), target)
+            # the modification time of the entry file marks its last use
+            os.utime(entry, None)
+        except (IOError, OSError):
+            # the entry is incomplete or was deleted by another process in the meantime
+            return False
+        return True
+    
+    def put(self, key, files, **info):
+        """
+        add files to the cache
+        
+        Parameters
+        ----------
+        key: str
+            the key of the entry
+        files: dict
+            names under which the files are stored as keys and the files to be stored as values
+        info
+            additional information to be stored with the entry; must be serializable to JSON
+        
+        Returns
+        -------
+        
+        """
+        target = os.path.join(self.directory, key)
+        if os.path.isdir(target):
+            return
+        tmp = os.path.join(self.directory, '.{}.{}.tmp'.format(key, os.getpid()))
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        for name, filename in files.items():
+            shutil.copyfile(filename, os.path.join(tmp, name))
+        size = sum([os.path.getsize(x) for x in files.values()]) / 1024. ** 2
+        with open(os.path.join(tmp, 'entry.json'), 'w') as meta:
+            json.dump({'key': key, 'files': sorted(files.keys()), 'size': size, 'info': info}, meta)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # the entry was added by another process in the meantime
+            shutil.rmtree(tmp)
+        self.evict()
+    
+    def evict(self):
+        """
+        delete the least recently used entries until the total size of the cache is below `maxsize`
+        
+        Returns
+        -------
+        
+        """
+        entries = self.entries()
+        total = sum([x['size'] for x in entries])
+        while total > self.maxsize and len(entries) > 0:
+            entry = entries.pop()
+            shutil.rmtree(os.path.join(self.directory, entry['key']), ignore_errors=True)
+            total -= entry['size']
@@ -0,0 +1,341 @@
+"""
+The manifest of the completed steps of a processing chain, by which an interrupted chain, e.g. a call of
+:func:`pyroSAR.gamma.geocode`, is resumed at the first step which has not been completed.
+"""
+import os
+import json
+from time import time
+from datetime import datetime
+from collections import OrderedDict
+
+from pyroSAR.ancillary import replace_file
+
+
+class Checkpoints(object):
+    """
+    a manifest of completed processing steps, which is stored in a JSON file so that an interrupted
+    processing chain can be resumed at its first incomplete step.
+    For each step the parameters and the fingerprints (size and modification time) of its input and output
+    files are recorded. A step is complete if it was registered with identical parameters and inputs and all
+    of its outputs still exist unchanged. Steps need to be checked in processing order; once a step is found
+    to be incomplete, it and all following steps are removed from the manifest and are thus also considered
+    incomplete.
+    Outputs which have been deleted after being read by all following steps (see :meth:`consume`) do not
+    invalidate a step unless one of these steps needs to be processed again. To find this out before the step
+    itself is checked, the steps can be declared in advance via :meth:`expect`.
+    
+    Parameters
+    ----------
+    filename: str
+        the JSON file to store the manifest in
+    
+    Examples
+    --------
+    >>> steps = Checkpoints('/path/to/steps.json')
+    >>> steps.expect('multilook', parameters={'targetres': 20})
+    >>> if not steps.done('multilook', parameters={'targetres': 20}):
+    >>>     start = steps.now()
+    >>>     multilook(...)
+    >>>     steps.register('multilook', steps.changed('/path/to/scene', start), parameters={'targetres': 20})
+    
+    Attributes
+    ----------
+    exists: bool
+        does the manifest file exist?
+    current: str or None
+        the name of the step currently processed, i.e. the last step found to be incomplete by :meth:`done`
+    """
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self.exists = os.path.isfile(filename)
+        if self.exists:
+            with open(filename, 'r') as manifest:
+                self.__steps = json.load(manifest, object_pairs_hook=OrderedDict)
+        else:
+            self.__steps = OrderedDict()
+        self.__resume = True
+        self.__completed = []
+        self.__expected = OrderedDict()
+        self.current = None
+    
+    @staticmethod
+    def fingerprint(filename):
+        """
+        the fingerprint of a file used to check whether it was modified: a list of its size and modification time,
+        'directory' for directories and None if the file does not exist
+        """
+        if os.path.isdir(filename):
+            return 'directory'
+        if not os.path.isfile(filename):
+            return None
+        stat = os.stat(filename)
+        return [stat.st_size, stat.st_mtime]
+    
+    @staticmethod
+    def now():
+        """
+        the start time of a step to be passed to :meth:`changed`;
+        one second is subtracted to account for the coarser time resolution of some file systems
+        """
+        return time() - 1
+    
+    @staticmethod
+    def changed(directory, since):
+        """
+        list the files in a directory (not recursively), which were created or modified since a given time
+        
+        Parameters
+        ----------
+        directory: str
+            the directory to be searched
+        since: float
+            the time in seconds since the epoch, see :meth:`now`
+        
+        Returns
+        -------
+        list of str
+            the names of the changed files
+        """
+        files = [os.path.join(directory, x) for x in sorted(os.listdir(directory))]
+        return [x for x in files if os.path.isfile(x) and os.path.getmtime(x) >= since]
+    
+    def __fingerprints(self, files):
+        return OrderedDict([(x, self.fingerprint(x)) for x in (files or [])])
+    
+    @staticmethod
+    def __normalize(parameters):
+        # the parameters are compared in the form they are stored, e.g. tuples are converted to lists
+        return json.loads(json.dumps(parameters or {}), object_pairs_hook=OrderedDict)
+    
+    def done(self, step, inputs=None, parameters=None):
+        """
+        check whether a step has already been completed
+        
+        Parameters
+        ----------
+        step: str
+            the name of the step
+        inputs: list of str or None
+            the input files of the step
+        parameters: dict or None
+            the parameters of the step; must be serializable to JSON
+        
+        Returns
+        -------
+        bool
+            True if the step and all steps before have been completed with the same parameters and inputs and
+            all outputs are unchanged, and no deleted output of the step is needed by a step to be processed again
+        
+        Raises
+        ------
+        RuntimeError
+            if the step needs to be processed again but the outputs of earlier completed steps needed for it
+            have been deleted, which can only happen if it has not been declared via :meth:`expect`
+        """
+        if self.__resume and self.valid(step, inputs, parameters) and not self.__needed(step):
+            self.__completed.append(step)
+            return True
+        if self.__resume:
+            # remove this step and all following steps from the manifest
+            self.__resume = False
+            restart = self.__restart(step)
+            if restart is not None:
+                self.__completed = self.__completed[:self.__completed.index(restart)]
+            obsolete = [x for x in self.__steps.keys() if x not in self.__completed]
+            for key in obsolete:
+                del self.__steps[key]
+            if len(obsolete) > 0:
+                self.__write()
+            if restart is not None:
+                raise RuntimeError('the intermediate files of step {0} needed for processing step {1} '
+                                   'have been deleted; processing is resumed at step {0} in the next run; '
+                                   'declare the steps via Checkpoints.expect to resume at step {0} directly'
+                                   .format(restart, step))
+        self.current = step
+        return False
+    
+    def expect(self, step, inputs=None, parameters=None):
+        """
+        declare the inputs and parameters with which a step is going to be checked via :meth:`done`.
+        If all steps are declared before the first one is checked, :meth:`done` already returns False for a
+        completed step whose deleted outputs (see :meth:`consume`) are read by a step that needs to be processed
+        again, e.g. because its parameters have changed, so that the whole chain can be processed in the same run.
+        Registered steps which are not declared are not going to be checked and are thus not processed again.
+        
+        Parameters
+        ----------
+        step: str
+            the name of the step
+        inputs: list of str or None
+            the input files of the step
+        parameters: dict or None
+            the parameters of the step; must be serializable to JSON
+        
+        Returns
+        -------
+        
+        """
+        self.__expected[step] = (inputs, parameters)
+    
+    def __needed(self, step):
+        # is the step to be processed again since its deleted outputs are read by a step to be processed again?
+        # The steps to be processed are the first registered step which is declared and found to be incomplete,
+        # all following steps and all declared steps which have not been registered yet. Without declared steps,
+        # the registered steps are checked with their registered parameters and inputs.
+        names = list(self.__steps.keys())
+        first = len(names)
+        for i, name in enumerate(names):
+            if len(self.__expected) == 0:
+                inputs, parameters = list(self.__steps[name]['inputs'].keys()), self.__steps[name]['parameters']
+            elif name in self.__expected.keys():
+                inputs, parameters = self.__expected[name]
+            else:
+                continue
+            if not self.valid(name, inputs, parameters):
+                first = i
+                break
+        pending = [x for x in self.__expected.keys() if x not in names]
+        found = True
+        while found:
+            found = False
+            for i, name in enumerate(names[:first]):
+                consumers = [y for x in self.__steps[name].get('consumed', {}).values() for y in x]
+                if any([x in names[first:] or x in pending for x in consumers]):
+                    first = i
+                    found = True
+                    break
+        return step in names[first:]
+    
+    def __restart(self, step):
+        # the first completed step, which needs to be processed again because its deleted outputs are read by
+        # the incomplete step, a registered step following it or another step to be processed again
+        processed = [step] + [x for x in self.__steps.keys() if x not in self.__completed]
+        first = len(self.__completed)
+        found = True
+        while found:
+            found = False
+            for i, name in enumerate(self.__completed[:first]):
+                consumers = [y for x in self.__steps[name].get('consumed', {}).values() for y in x]
+                if any([x in processed + self.__completed[first:] for x in consumers]):
+                    first = i
+                    found = True
+                    break
+        return self.__completed[first] if first < len(self.__completed) else None
+    
+    def valid(self, step, inputs=None, parameters=None):
+        """
+        check whether a step was registered with the same parameters and inputs and its outputs are unchanged.
+        Unlike :meth:`done`, the manifest is not modified and the steps before are not considered.
+        
+        Parameters
+        ----------
+        step: str
+            the name of the step
+        inputs: list of str or None
+            the input files of the step
+        parameters: dict or None
+            the parameters of the step; must be serializable to JSON
+        
+        Returns
+        -------
+        bool
+        """
+        if step not in self.__steps.keys():
+            return False
+        record = self.__steps[step]
+        return record['parameters'] == self.__normalize(parameters) \
+            and record['inputs'] == self.__normalize(self.__fingerprints(inputs)) \
+            and all([self.fingerprint(x) == y or x in record.get('consumed', {}).keys()
+                     for x, y in record['outputs'].items()])
+    
+    def register(self, step, outputs, inputs=None, parameters=None, **info):
+        """
+        register a step as completed
+        
+        Parameters
+        ----------
+        step: str
+            the name of the step
+        outputs: list of str
+            the files written by the step
+        inputs: list of str or None
+            the input files of the step
+        parameters: dict or None
+            the parameters of the step; must be serializable to JSON
+        info:
+            additional information to be stored with the step; see :meth:`info`
+        
+        Returns
+        -------
+        
+        """
+        outputs = self.__fingerprints(outputs)
+        # files of earlier steps, which were modified by this step, e.g. parameter files updated in place,
+        # are not considered to have changed for the earlier steps
+        for record in self.__steps.values():
+            for filename in record['outputs'].keys():
+                if filename in outputs.keys():
+                    record['outputs'][filename] = outputs[filename]
+                    record.get('consumed', {}).pop(filename, None)
+        self.__steps[step] = OrderedDict([('completed', datetime.now().strftime('%Y%m%dT%H%M%S')),
+                                          ('parameters', self.__normalize(parameters)),
+                                          ('inputs', self.__fingerprints(inputs)),
+                                          ('outputs', outputs),
+                                          ('consumed', OrderedDict()),
+                                          ('info', info)])
+        self.__write()
+    
+    def consume(self, files):
+        """
+        record that output files of completed steps have been deleted after being read by all steps needing them,
+        see :class:`~pyroSAR.gamma.intermediates.Intermediates`. If one of these steps needs to be processed again,
+        e.g. with other parameters, the steps writing the files need to be processed again as well;
+        see :meth:`expect` and :meth:`done`.
+        
+        Parameters
+        ----------
+        files: dict
+            the deleted files as keys and the names of the steps having read them as values
+        
+        Returns
+        -------
+        
+        """
+        for record in self.__steps.values():
+            for filename, consumers in files.items():
+                if filename in record['outputs'].keys():
+                    record.setdefault('consumed', OrderedDict())[filename] = list(consumers)
+        if len(files) > 0:
+            self.__write()
+    
+    def info(self, step):
+        """
+        get the additional information stored with a step by :meth:`register`
+        
+        Parameters
+        ----------
+        step: str
+            the name of the step
+        
+        Returns
+        -------
+        dict
+        """
+        return self.__steps[step]['info']
+    
+    def remove(self):
+        """
+        delete the manifest file
+        """
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+        self.exists = False
+    
+    def __write(self):
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as manifest:
+            json.dump(self.__steps, manifest, indent=2)
+        # replace the manifest atomically so that it is never missing if processing is interrupted
+        replace_file(tmp, self.filename)
+        self.exists = True
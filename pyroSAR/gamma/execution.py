@@ -0,0 +1,510 @@
+"""
+The execution of GAMMA commands by :func:`pyroSAR.gamma.auxil.process`: the execution context of each thread,
+the execution of a command in a subprocess together with the resources used by it, and the sinks receiving the
+execution events of the commands (see :func:`add_sink`). A :class:`Backend` keeps the shell scripts and log files
+of the commands open.
+"""
+import os
+import sys
+import json
+import errno
+import threading
+import subprocess as sp
+from time import time
+from datetime import datetime
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from spatialist.ancillary import dissolve
+
+# the functions receiving the execution events of the commands run via function process and the ids of the runs
+# they are limited to, see add_sink
+_sinks = []
+
+# the execution context of function process per thread, i.e. the active backends and the run id,
+# see functions _current, _inherit and _scope
+_context = threading.local()
+
+
+def _current():
+    """
+    get the execution context of the current thread; it contains the active backends of the thread (see class
+    Backend), of which the last one is used by function process, and the id of the run the commands executed
+    by the thread belong to (see function _scope)
+    """
+    if not hasattr(_context, 'backends'):
+        _context.backends = []
+        _context.run = None
+    return _context
+
+
+def _inherit(function, backends=None):
+    """
+    bind a function to the execution context of the current thread so that the GAMMA commands it runs in another
+    thread, e.g. of a thread pool, use the same backends and belong to the same run; the context of the executing
+    thread is restored afterwards
+    
+    Parameters
+    ----------
+    function: function
+        the function to be executed in another thread
+    backends: list of Backend or None
+        the backends to be used instead of those of the current thread
+    
+    Returns
+    -------
+    function
+        the bound function
+    """
+    backends = list(_current().backends if backends is None else backends)
+    run = _current().run
+    
+    def bound(*args, **kwargs):
+        context = _current()
+        previous = context.backends, context.run
+        context.backends, context.run = list(backends), run
+        try:
+            return function(*args, **kwargs)
+        finally:
+            context.backends, context.run = previous
+    
+    return bound
+
+
+def _scope(run):
+    """
+    set the id of the run, e.g. a call of geocode, to which the commands executed by the current thread and the
+    threads it starts via function _inherit belong, so that the execution events of concurrent runs can be told
+    apart (see function add_sink)
+    
+    Parameters
+    ----------
+    run: str or None
+        the id of the run
+    
+    Returns
+    -------
+    str or None
+        the id of the previous run, which is to be restored once the run is finished
+    """
+    context = _current()
+    previous, context.run = context.run, run
+    return previous
+
+
+def _script(sh, cmd, outdir=None, inlist=None):
+    """
+    write a command to an open shell script file
+    """
+    line = ' '.join([str(x) for x in dissolve(cmd)])
+    if inlist is not None:
+        line += ' <<< $"{}"'.format('\n'.join([str(x) for x in inlist]) + '\n')
+    if outdir is not None:
+        sh.seek(0, os.SEEK_END)
+        if sh.tell() == 0:
+            ts = datetime.now().strftime('%a %b %d %H:%M:%S %Y')
+            sh.write('# this script was created automatically by pyroSAR on {}\n\n'.format(ts))
+            sh.write('export base={}\n\n'.format(outdir))
+        line = line.replace(outdir, '$base')
+    sh.write(line + '\n\n')
+
+
+def _execute(cmd, outdir=None, logfile=None, inlist=None):
+    """
+    execute a command in a subprocess like :func:`spatialist.ancillary.run` and collect the resources used by it.
+    Instead of waiting for the process via :meth:`subprocess.Popen.communicate`, it is reaped via :func:`os.wait4`,
+    which returns the resource usage of this process alone and not of all child processes terminated so far,
+    so that the usage can be attributed to the command even if other commands are executed in parallel threads.
+    
+    Parameters
+    ----------
+    cmd: list
+        the command line arguments
+    outdir: str or None
+        the directory to execute the command in
+    logfile: str or None
+        a file to write the standard output to
+    inlist: list or None
+        a list of values, which is passed as interactive inputs via stdin
+    
+    Returns
+    -------
+    tuple
+        the standard output (None if a log file is defined), the standard error and the resource usage of the
+        process as returned by :func:`os.wait4`; the latter is None on platforms where this is not available
+    """
+    cmd = [str(x) for x in dissolve(cmd)]
+    log = sp.PIPE if logfile is None else open(logfile, 'a')
+    proc = sp.Popen(cmd, stdin=sp.PIPE, stdout=log, stderr=sp.PIPE, cwd=outdir, universal_newlines=True)
+    instream = None if inlist is None else ''.join([str(x) + '\n' for x in inlist])
+    if not hasattr(os, 'wait4'):
+        out, err = proc.communicate(instream)
+        usage = None
+    else:
+        # read the output streams in separate threads so that the process cannot block on a full pipe
+        streams = {}
+        
+        def read(name, stream):
+            streams[name] = stream.read()
+            stream.close()
+        
+        pipes = [('err', proc.stderr)] + ([('out', proc.stdout)] if logfile is None else [])
+        readers = [threading.Thread(target=read, args=x) for x in pipes]
+        for reader in readers:
+            reader.start()
+        try:
+            if instream is not None:
+                proc.stdin.write(instream)
+            proc.stdin.close()
+        except (IOError, OSError) as e:
+            # the command terminated without reading all inputs;
+            # BrokenPipeError is only available in Python 3
+            if e.errno != errno.EPIPE:
+                raise
+        for reader in readers:
+            reader.join()
+        pid, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        out, err = streams.get('out'), streams['err']
+    # add line for separating log entries of repeated function calls
+    if logfile is not None:
+        log.write('#####################################################################\n')
+        log.close()
+    return out, err, usage
+
+
+def _emit(cmd, outdir, start, usage, status):
+    """
+    pass the execution event of a command to all registered sinks
+    """
+    if len(_sinks) == 0:
+        return
+    event = OrderedDict([('command', os.path.basename(str(cmd[0]))),
+                         ('args', [str(x) for x in dissolve(cmd[1:])]),
+                         ('outdir', outdir),
+                         ('run', _current().run),
+                         ('status', status),
+                         ('start', datetime.fromtimestamp(start).strftime('%Y-%m-%dT%H:%M:%S.%f')),
+                         ('wall', round(time() - start, 3)),
+                         ('user', None),
+                         ('sys', None),
+                         ('maxrss', None)])
+    if usage is not None:
+        event['user'] = round(usage.ru_utime, 3)
+        event['sys'] = round(usage.ru_stime, 3)
+        # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+        factor = 1024 ** 2 if sys.platform == 'darwin' else 1024
+        event['maxrss'] = round(usage.ru_maxrss / float(factor), 1)
+    for sink, run in list(_sinks):
+        if run is None or run == event['run']:
+            sink(event)
+
+
+def add_sink(sink, run=None):
+    """
+    register a sink for the execution events of the GAMMA commands run via :func:`~pyroSAR.gamma.auxil.process`.
+    
+    A sink is any callable accepting a single dictionary, e.g. a :class:`JSONLinesSink` or the `append`
+    method of a list. Each event contains the following keys:
+    
+     * command: the name of the GAMMA command
+     * args: the command line arguments
+     * outdir: the directory the command was executed in
+     * run: the id of the run the command belongs to, e.g. `<outname_base>_<random hex>` for the commands of a
+       call of :func:`~pyroSAR.gamma.util.geocode`, or None if the command was not executed within a run
+     * status: 'done' or 'failed'
+     * start: the start time in ISO format
+     * wall: the elapsed wall time in seconds
+     * user: the CPU time in seconds spent in user mode
+     * sys: the CPU time in seconds spent in system mode
+     * maxrss: the peak resident memory in MB
+    
+    CPU times and memory are those of the command's process alone as returned by :func:`os.wait4`, also if
+    commands are executed in parallel threads; they are None on platforms where this is not available.
+    
+    Parameters
+    ----------
+    sink: function
+        the function to receive the events
+    run: str or None
+        only pass the events of this run to the sink, so that it does not receive the events of runs executed
+        concurrently in other threads; if None, the events of all commands are passed
+    
+    Returns
+    -------
+    
+    Examples
+    --------
+    >>> from pyroSAR.gamma import add_sink, remove_sink, JSONLinesSink
+    >>> sink = JSONLinesSink('/path/to/commands.jsonl')
+    >>> add_sink(sink)
+    >>> geocode(...)
+    >>> remove_sink(sink)
+    """
+    if not callable(sink):
+        raise TypeError('sink must be callable')
+    _sinks.append((sink, run))
+
+
+def remove_sink(sink):
+    """
+    remove a sink registered by :func:`add_sink`
+    
+    Parameters
+    ----------
+    sink: function
+        the sink to be removed
+    
+    Returns
+    -------
+    
+    """
+    # sinks are compared by identity since e.g. the append methods of two empty lists are equal
+    _sinks[:] = [x for x in _sinks if x[0] is not sink]
+
+
+class JSONLinesSink(object):
+    """
+    a sink for :func:`add_sink`, which appends each event as a line in JSON format to a file
+    
+    Parameters
+    ----------
+    filename: str
+        the file to write to
+    """
+    
+    def __init__(self, filename):
+        self.filename = filename
+    
+    def __call__(self, event):
+        with open(self.filename, 'a') as out:
+            out.write(json.dumps(event) + '\n')
+
+
+def summarize(events, keys=('command',)):
+    """
+    aggregate the command execution events collected by a sink registered via :func:`add_sink`
+    
+    Parameters
+    ----------
+    events: list of dict
+        the events
+    keys: tuple of str
+        the event keys by which the events are grouped
+    
+    Returns
+    -------
+    list of collections.OrderedDict
+        one entry per group in order of first occurrence, containing the group keys, the number of calls,
+        the summed times `wall`, `user` and `sys` and the maximum of `maxrss`
+    """
+    groups = OrderedDict()
+    for event in events:
+        group = tuple(event.get(key) for key in keys)
+        if group not in groups.keys():
+            groups[group] = OrderedDict(list(zip(keys, group)) + [('calls', 0), ('wall', 0.), ('user', None),
+                                                                   ('sys', None), ('maxrss', None)])
+        entry = groups[group]
+        entry['calls'] += 1
+        entry['wall'] = round(entry['wall'] + event['wall'], 3)
+        for key in ['user', 'sys']:
+            if event.get(key) is not None:
+                entry[key] = round((entry[key] or 0) + event[key], 3)
+        if event.get('maxrss') is not None:
+            entry['maxrss'] = max(entry['maxrss'] or 0, event['maxrss'])
+    return list(groups.values())
+
+
+class Backend(object):
+    """
+    an execution backend for :func:`~pyroSAR.gamma.auxil.process`, which is used by all commands executed while the
+    backend is open, e.g. within a `with` statement or between calls of :meth:`open` and :meth:`close`.
+    A backend is only active in the thread which opened it and in the threads executing the commands submitted via
+    :meth:`submit` and the nodes of a :class:`~pyroSAR.gamma.workflow.Workflow` run by this thread, so that e.g. scenes
+    processed concurrently in separate threads each use their own backend. It needs to be closed by the thread which
+    opened it.
+    
+    Without backend, each command reopens the shell script and its log file. The backend instead keeps the shell
+    scripts and log files open until it is closed. The standard output of the commands is collected in memory and
+    written to the log file once `bufsize` characters have accumulated. Each log entry is separated by a line of
+    hashes like without backend.
+    
+    Independent commands can be submitted via :meth:`submit` to be executed concurrently with a limited
+    number of threads.
+    
+    Parameters
+    ----------
+    workers: int or None
+        the maximum number of commands executed concurrently via :meth:`submit`; if None, the number of CPUs is used
+    bufsize: int
+        the number of characters of command output buffered per log file before it is written
+    
+    Examples
+    --------
+    >>> from pyroSAR.gamma import Backend
+    >>> from pyroSAR.gamma.api import isp
+    >>> with Backend(workers=4) as backend:
+    >>>     futures = [backend.submit(['multi_look', slc, slc + '.par', mli, mli + '.par', 5, 1],
+    >>>                               logpath='/path/to/logs', shellscript='/path/to/commands.sh')
+    >>>                for slc, mli in zip(slcs, mlis)]
+    >>>     for future in futures:
+    >>>         future.get()  # raises the error of the command if it failed
+    >>>     isp.multi_look(...)  # the functions of the API use the backend as well
+    """
+    
+    def __init__(self, workers=None, bufsize=65536):
+        self.workers = workers
+        self.bufsize = bufsize
+        self.__lock = threading.Lock()
+        self.__scripts = {}
+        self.__logs = {}
+        self.__pool = None
+    
+    def __enter__(self):
+        return self.open()
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def open(self):
+        """
+        activate the backend in the current thread so that it is used by :func:`~pyroSAR.gamma.auxil.process`
+        
+        Returns
+        -------
+        Backend
+            the backend itself
+        """
+        backends = _current().backends
+        if self not in backends:
+            backends.append(self)
+        return self
+    
+    def close(self):
+        """
+        wait for all submitted commands to finish, write the buffered log output, close all files
+        and deactivate the backend in the current thread
+        
+        Returns
+        -------
+        
+        """
+        with self.__lock:
+            pool, self.__pool = self.__pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _current().backends[:] = [x for x in _current().backends if x is not self]
+        with self.__lock:
+            for handle in self.__scripts.values():
+                handle.close()
+            for filename in list(self.__logs.keys()):
+                self.__write(filename)
+                self.__logs[filename][0].close()
+            self.__scripts = {}
+            self.__logs = {}
+    
+    def flush(self):
+        """
+        write the buffered log output and the shell scripts to disk
+        
+        Returns
+        -------
+        
+        """
+        with self.__lock:
+            for filename in self.__logs.keys():
+                self.__write(filename)
+                self.__logs[filename][0].flush()
+            for handle in self.__scripts.values():
+                handle.flush()
+    
+    def script(self, shellscript, cmd, outdir=None, inlist=None):
+        """
+        write a command to a shell script, which is kept open
+        
+        Parameters
+        ----------
+        shellscript: str
+            the shell script file
+        cmd: list
+            the command line arguments
+        outdir: str or None
+            the directory the command is executed in
+        inlist: list or None
+            a list of values, which is passed as interactive inputs via stdin
+        
+        Returns
+        -------
+        
+        """
+        with self.__lock:
+            if shellscript not in self.__scripts.keys():
+                self.__scripts[shellscript] = open(shellscript, 'a')
+            _script(self.__scripts[shellscript], cmd, outdir, inlist)
+    
+    def run(self, cmd, outdir=None, logfile=None, inlist=None):
+        """
+        execute a command in a subprocess like :func:`spatialist.ancillary.run`; the standard output is buffered
+        and written to the log file if defined. See :func:`_execute` for the collection
+        of the resource usage.
+        
+        Parameters
+        ----------
+        cmd: list
+            the command line arguments
+        outdir: str or None
+            the directory to execute the command in
+        logfile: str or None
+            a file to write the standard output to
+        inlist: list or None
+            a list of values, which is passed as interactive inputs via stdin
+        
+        Returns
+        -------
+        tuple
+            the standard output (None if a log file is defined), the standard error and the resource usage
+            of the command's process or None if it is not available
+        """
+        out, err, usage = _execute(cmd, outdir=outdir, inlist=inlist)
+        if logfile is None:
+            return out, err, usage
+        with self.__lock:
+            if logfile not in self.__logs.keys():
+                self.__logs[logfile] = (open(logfile, 'a'), [], [0])
+            handle, chunks, size = self.__logs[logfile]
+            chunks.append(out + '#####################################################################\n')
+            size[0] += len(chunks[-1])
+            if size[0] >= self.bufsize:
+                self.__write(logfile)
+        return None, err, usage
+    
+    def __write(self, logfile):
+        handle, chunks, size = self.__logs[logfile]
+        handle.write(''.join(chunks))
+        del chunks[:]
+        size[0] = 0
+    
+    def submit(self, cmd, **kwargs):
+        """
+        execute a command via :func:`~pyroSAR.gamma.auxil.process` with this backend in a separate thread
+        
+        Parameters
+        ----------
+        cmd: list
+            the command line arguments
+        kwargs
+            further arguments passed to :func:`~pyroSAR.gamma.auxil.process`
+        
+        Returns
+        -------
+        multiprocessing.pool.AsyncResult
+            the future of the command; its method `get` returns the result of :func:`~pyroSAR.gamma.auxil.process`
+            and raises the error of the command if it failed
+        """
+        # process uses the backends of this module and is thus imported on use
+        from .auxil import process
+        with self.__lock:
+            if self.__pool is None:
+                self.__pool = ThreadPool(self.workers)
+            return self.__pool.apply_async(_inherit(process, backends=[self]), (cmd,), kwargs)
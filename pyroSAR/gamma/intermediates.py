@@ -0,0 +1,140 @@
+"""
+The reference counting of the intermediate files of a processing chain, e.g. a call of :func:`pyroSAR.gamma.geocode`,
+by which each file is deleted as soon as all steps reading it are complete.
+"""
+import os
+import shutil
+import threading
+from fnmatch import fnmatch
+from collections import OrderedDict
+
+
+class Intermediates(object):
+    """
+    reference-counted intermediate files of a processing chain, which are deleted as soon as all steps reading
+    them have been completed, so that not all intermediate files of a scene occupy disk space at the same time.
+    Each file is registered with the names of the steps reading it; once each of these steps has been reported
+    as completed via :meth:`consume`, the file is deleted. Only the registered files themselves are deleted,
+    accompanying files like parameter and header files are kept.
+    
+    Parameters
+    ----------
+    keep: list of str or None
+        patterns of files which are never deleted, e.g. for debugging; the patterns are matched with
+        :func:`fnmatch.fnmatch` against the file names with and without directory, e.g. `*_mli` or `*.tiff`
+    callback: function or None
+        a function called with a dictionary of the deleted files and the steps having read them,
+        e.g. :meth:`~pyroSAR.gamma.checkpoints.Checkpoints.consume`
+    
+    Examples
+    --------
+    >>> files = Intermediates(keep=['*_VV_grd'], callback=steps.consume)
+    >>> files.add(['/path/to/S1A_VV_grd', '/path/to/S1A_VH_grd'], consumers=['multilook'])
+    >>> multilook(...)
+    >>> files.consume('multilook')  # deletes S1A_VH_grd
+    """
+    
+    def __init__(self, keep=None, callback=None):
+        self.keep = list(keep or [])
+        self.callback = callback
+        self.__lock = threading.Lock()
+        self.__files = OrderedDict()
+        self.__finished = []
+    
+    @property
+    def pending(self):
+        """
+        list of str: the registered files, which have not been deleted yet
+        """
+        with self.__lock:
+            return list(self.__files.keys())
+    
+    def kept(self, filename):
+        """
+        check whether a file matches one of the patterns of files to be kept
+        
+        Parameters
+        ----------
+        filename: str
+            the name of the file
+        
+        Returns
+        -------
+        bool
+        """
+        return any([fnmatch(filename, x) or fnmatch(os.path.basename(filename), x) for x in self.keep])
+    
+    def add(self, filenames, consumers):
+        """
+        register intermediate files; files to be kept are ignored and files whose consumers have all been
+        completed already are deleted immediately
+        
+        Parameters
+        ----------
+        filenames: list of str
+            the intermediate files
+        consumers: list of str
+            the names of the steps reading the files
+        
+        Returns
+        -------
+        
+        """
+        with self.__lock:
+            for filename in filenames:
+                if not self.kept(filename):
+                    registered = self.__files.get(filename, [])
+                    self.__files[filename] = registered + [x for x in consumers if x not in registered]
+        self.__delete()
+    
+    def consume(self, step):
+        """
+        report a step as completed and delete all files which are not read by any further step
+        
+        Parameters
+        ----------
+        step: str
+            the name of the step
+        
+        Returns
+        -------
+        
+        """
+        with self.__lock:
+            if step not in self.__finished:
+                self.__finished.append(step)
+        self.__delete()
+    
+    def __delete(self):
+        with self.__lock:
+            deleted = OrderedDict()
+            for filename, consumers in list(self.__files.items()):
+                if all([x in self.__finished for x in consumers]):
+                    if os.path.isfile(filename):
+                        os.remove(filename)
+                    deleted[filename] = consumers
+                    del self.__files[filename]
+        if self.callback is not None and len(deleted) > 0:
+            self.callback(deleted)
+    
+    def cleanup(self, directory):
+        """
+        delete a directory, e.g. the temporary directory of a scene at the end of processing;
+        if files are to be kept, only the other files are deleted
+        
+        Parameters
+        ----------
+        directory: str
+            the directory to be deleted
+        
+        Returns
+        -------
+        
+        """
+        if len(self.keep) == 0:
+            shutil.rmtree(directory)
+            return
+        for root, dirs, files in os.walk(directory):
+            for filename in [os.path.join(root, x) for x in files]:
+                if not self.kept(filename):
+                    os.remove(filename)
@@ -0,0 +1,222 @@
+"""
+Direct access to the binary raster files of GAMMA without conversion via GDAL or GAMMA commands.
+GAMMA stores images line by line without header in big-endian byte order; the dimensions and data type are
+defined in the accompanying parameter file. The images are exposed as :class:`numpy.memmap` arrays, so that
+only the accessed parts are read from disk and arrays can be processed in blocks of lines without copies.
+
+>>> from pyroSAR.gamma import io
+>>> mli = io.read('S1A__IW___A_20180829T170656_VV_grd_mli')  # parameter file S1A__..._mli.par
+>>> for block, view in io.blocks(mli):
+...     print(block, view.mean())
+"""
+import os
+import numpy as np
+from spatialist.ancillary import union
+
+from .auxil import ISPPar
+
+# the numpy data types of the GAMMA data formats as defined by parameters image_format and data_format
+DTYPES = {'FLOAT': np.dtype('>f4'),
+          'REAL*4': np.dtype('>f4'),
+          'FCOMPLEX': np.dtype('>c8'),
+          'SCOMPLEX': np.dtype([('real', '>i2'), ('imag', '>i2')]),
+          'SHORT': np.dtype('>i2'),
+          'INTEGER*2': np.dtype('>i2'),
+          'BYTE': np.dtype('u1')}
+
+
+def dtype(data_format):
+    """
+    get the numpy data type of a GAMMA data format
+
+    Parameters
+    ----------
+    data_format: str
+        the GAMMA data format, e.g. FLOAT or FCOMPLEX
+
+    Returns
+    -------
+    numpy.dtype
+    """
+    if data_format not in DTYPES.keys():
+        raise TypeError('unsupported data type: {}'.format(data_format))
+    return DTYPES[data_format]
+
+
+def describe(par):
+    """
+    read the dimensions and data format of an image from a GAMMA parameter file
+
+    Parameters
+    ----------
+    par: str or ISPPar
+        the parameter file
+
+    Returns
+    -------
+    tuple
+        the number of lines, the number of samples and the data format
+    """
+    par = par if isinstance(par, ISPPar) else ISPPar(par)
+    samples = getattr(par, union(['width', 'range_samples', 'samples'], par.keys)[0])
+    lines = getattr(par, union(['nlines', 'azimuth_lines', 'lines'], par.keys)[0])
+    data_format = getattr(par, union(['data_format', 'image_format'], par.keys)[0])
+    return lines, samples, data_format
+
+
+def nbytes(par, data_format=None):
+    """
+    compute the size in bytes of an image from its parameter file, e.g. for estimating the disk space of
+    an intermediate image before it is written
+
+    Parameters
+    ----------
+    par: str or ISPPar
+        the parameter file
+    data_format: str or None
+        the GAMMA data format of the image; if None, the format defined in the parameter file is used
+
+    Returns
+    -------
+    int
+    """
+    lines, samples, fmt = describe(par)
+    return lines * samples * dtype(data_format or fmt).itemsize
+
+
+def memmap(filename, samples, data_format='FLOAT', lines=None, mode='r'):
+    """
+    open a GAMMA image as memory-mapped array with defined dimensions
+
+    Parameters
+    ----------
+    filename: str
+        the image file
+    samples: int
+        the number of samples per line
+    data_format: str
+        the GAMMA data format
+    lines: int or None
+        the number of lines; if None, it is derived from the file size
+    mode: {'r', 'r+', 'c'}
+        the access mode, see :class:`numpy.memmap`
+
+    Returns
+    -------
+    numpy.memmap
+        an array with shape (lines, samples)
+    """
+    dt = dtype(data_format)
+    size = os.path.getsize(filename)
+    if lines is None:
+        if size % (samples * dt.itemsize) != 0:
+            raise RuntimeError('the size of file {} does not match {} samples'.format(filename, samples))
+        lines = size // (samples * dt.itemsize)
+    elif size != lines * samples * dt.itemsize:
+        raise RuntimeError('the size of file {} does not match {} lines and {} samples'
+                           .format(filename, lines, samples))
+    return np.memmap(filename, dtype=dt, mode=mode, shape=(lines, samples))
+
+
+def read(filename, par=None, mode='r'):
+    """
+    open a GAMMA image as memory-mapped array with dimensions and data type read from its parameter file
+
+    Parameters
+    ----------
+    filename: str
+        the image file
+    par: str, ISPPar or None
+        the parameter file; if None, the file `filename + '.par'` is used
+    mode: {'r', 'r+', 'c'}
+        the access mode, see :class:`numpy.memmap`
+
+    Returns
+    -------
+    numpy.memmap
+        an array with shape (lines, samples)
+    """
+    lines, samples, data_format = describe(filename + '.par' if par is None else par)
+    return memmap(filename, samples, data_format, lines, mode)
+
+
+def create(filename, lines, samples, data_format='FLOAT'):
+    """
+    create a new GAMMA image as writable memory-mapped array; an existing file is overwritten
+
+    Parameters
+    ----------
+    filename: str
+        the image file
+    lines: int
+        the number of lines
+    samples: int
+        the number of samples per line
+    data_format: str
+        the GAMMA data format
+
+    Returns
+    -------
+    numpy.memmap
+        an array with shape (lines, samples); the data is written to disk once the array is flushed or deleted
+    """
+    return np.memmap(filename, dtype=dtype(data_format), mode='w+', shape=(lines, samples))
+
+
+def write(filename, array, data_format=None, blocksize=64):
+    """
+    write an array to a GAMMA image
+
+    Parameters
+    ----------
+    filename: str
+        the image file
+    array: numpy.ndarray
+        the two-dimensional array to be written
+    data_format: str or None
+        the GAMMA data format; if None, it is derived from the data type of the array:
+        float32: FLOAT, complex64: FCOMPLEX, int16: SHORT, uint8: BYTE
+    blocksize: int
+        the approximate size in MB of the blocks in which the array is converted and written
+
+    Returns
+    -------
+
+    """
+    if data_format is None:
+        formats = {'f4': 'FLOAT', 'c8': 'FCOMPLEX', 'i2': 'SHORT', 'u1': 'BYTE'}
+        key = array.dtype.kind + str(array.dtype.itemsize)
+        if key not in formats.keys():
+            raise TypeError('cannot derive the GAMMA data format of data type {}'.format(array.dtype))
+        data_format = formats[key]
+    out = create(filename, array.shape[0], array.shape[1], data_format)
+    for block, view in blocks(array, blocksize):
+        out[block] = view
+    out.flush()
+    del out
+
+
+def blocks(array, blocksize=64, lines=None):
+    """
+    iterate over blocks of lines of an array; the blocks are views, i.e. no data is copied
+
+    Parameters
+    ----------
+    array: numpy.ndarray
+        the array, e.g. as returned by :func:`read`
+    blocksize: int
+        the approximate size of each block in MB; ignored if `lines` is defined
+    lines: int or None
+        the number of lines per block
+
+    Yields
+    ------
+    tuple
+        the slice of the lines of the block and the view of the block
+    """
+    if lines is None:
+        linesize = array.dtype.itemsize * int(np.prod(array.shape[1:]))
+        lines = max(1, int(blocksize * 1024 ** 2 // linesize))
+    for start in range(0, array.shape[0], lines):
+        block = slice(start, min(start + lines, array.shape[0]))
+        yield block, array[block]
@@ -1,7 +1,11 @@
 import os
 import re
+import json
+import shutil
+import hashlib
 import subprocess as sp
 from collections import Counter
+from multiprocessing.pool import ThreadPool
 from spatialist.ancillary import finder, which, dissolve
 
 from .auxil import ExamineGamma
@@ -493,9 +497,30 @@ def parse_command(command, indent='    '):
     return fun
 
 
-def parse_module(bindir, outfile):
+def _digest(command):
+    """
+    compute the hash of a Gamma command from its name and the content of its executable
+    """
+    sha = hashlib.sha1(os.path.basename(command).encode('utf-8'))
+    with open(command, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1024 ** 2), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _parser_digest():
+    """
+    compute the hash of this module; parsed functions are only reused if the parser itself has not changed
+    """
+    with open(os.path.splitext(__file__)[0] + '.py', 'rb') as infile:
+        return hashlib.sha1(infile.read()).hexdigest()
+
+
+def parse_module(bindir, outfile, workers=None, cache=None):
     """
     parse all Gamma commands of a module to functions and save them to a Python script.
+    The commands are executed concurrently to capture their usage descriptions, and the functions
+    are written in alphabetical order of the command names independent of the order in which they are parsed.
 
     Parameters
     ----------
@@ -503,6 +528,12 @@ def parse_module(bindir, outfile):
         the `bin` directory of a module containing the commands
     outfile: str
         the name of the Python file to write
+    workers: int or None
+        the number of commands parsed concurrently; if None, the number of CPUs is used
+    cache: str or None
+        a JSON file storing the parsed functions together with a hash of the command's executable.
+        Commands whose executable has not changed, e.g. after an upgrade of the Gamma installation,
+        are not executed and parsed again but read from this file. The file is created if it does not exist.
 
     Returns
     -------
@@ -530,39 +561,80 @@ def parse_module(bindir, outfile):
                 'mk_diff_2d',  # takes option flags
                 'gamma_doc'  # opens the Gamma documentation
                 ]
+    
+    commands = [x for x in sorted(finder(bindir, ['^\w+$'], regex=True), key=lambda s: s.lower())
+                if os.path.basename(x) not in excludes]
+    
+    parser = _parser_digest()
+    parsed = {}
+    if cache is not None and os.path.isfile(cache):
+        with open(cache, 'r') as infile:
+            content = json.load(infile)
+        if content['parser'] == parser:
+            parsed = content['commands']
+    
+    def parse(cmd):
+        basename = os.path.basename(cmd)
+        digest = _digest(cmd)
+        if basename in parsed.keys() and parsed[basename]['hash'] == digest:
+            # the function calls the command by its full path, which differs between Gamma installations
+            entry = parsed[basename]
+            fun = entry['function'].replace("'{}'".format(entry['command']), "'{}'".format(cmd))
+            return digest, fun, None
+        # print(basename)
+        try:
+            return digest, parse_command(cmd), None
+        except RuntimeError as e:
+            return digest, None, '{0}: {1}'.format(basename, str(e))
+        except:
+            return digest, None, '{0}: {1}'.format(basename, 'error yet to be assessed')
+    
+    # the commands are run as subprocesses, so threads are sufficient to parse them concurrently
+    pool = ThreadPool(workers)
+    try:
+        results = pool.map(parse, commands)
+    finally:
+        pool.close()
+        pool.join()
+    
     failed = []
     outstring = ''
-    for cmd in sorted(finder(bindir, ['^\w+$'], regex=True), key=lambda s: s.lower()):
-        basename = os.path.basename(cmd)
-        if basename not in excludes:
-            # print(basename)
-            try:
-                fun = parse_command(cmd)
-            except RuntimeError as e:
-                failed.append('{0}: {1}'.format(basename, str(e)))
-                continue
-            except:
-                failed.append('{0}: {1}'.format(basename, 'error yet to be assessed'))
-                continue
-            outstring += fun + '\n\n'
+    for cmd, (digest, fun, error) in zip(commands, results):
+        if fun is None:
+            failed.append(error)
+            continue
+        parsed[os.path.basename(cmd)] = {'hash': digest, 'command': cmd, 'function': fun}
+        outstring += fun + '\n\n'
     if len(outstring) > 0:
         if not os.path.isfile(outfile):
             with open(outfile, 'w') as out:
                 out.write('from pyroSAR.gamma.auxil import process\n\n\n')
         with open(outfile, 'a') as out:
             out.write(outstring)
+    if cache is not None:
+        with open(cache, 'w') as out:
+            json.dump({'parser': parser, 'commands': parsed}, out, indent=1, sort_keys=True)
     if len(failed) > 0:
         print('the following functions could not be parsed:\n{0}\n({1} total)'.format('\n'.join(failed), len(failed)))
 
 
+# the file names of the modules of package gammaparse, e.g. isp.py, and their compiled versions
+_module_pattern = r'^[a-z_0-9]+\.pyc?$'
+
+
 def autoparse():
     """
     automatic parsing of Gamma commands.
     This function will detect the Gamma installation via environment variable `GAMMA_HOME`, detect all available
     modules (e.g. ISP, DIFF) and parse all of the module's commands via function :func:`parse_module`.
     A new Python module will be created called `gammaparse`, which is stored under `$HOME/.pyrosar`.
-    Upon importing the `pyroSAR.gamma` submodule, this function is run automatically and module `gammaparse`
-    is imported as `api`.
+    The modules of `gammaparse` are accessible via :mod:`pyroSAR.gamma.api`, which runs this function
+    once a module is accessed for the first time.
+    
+    The home directory and version of the parsed Gamma installation are stored in a file `gammaparse/version`.
+    If they match the current installation, the parsing is skipped without scanning the installation directory.
+    If another installation was parsed before, the existing modules are replaced. In this case only those commands
+    are parsed again whose executables have changed; the others are read from file `gammaparse/parsecache.json`.
     
     Returns
     -------
@@ -573,22 +645,43 @@ def autoparse():
     >>> print('create_dem_par' in dir(diff))
     True
     """
-    home = ExamineGamma().home
+    gamma = ExamineGamma()
     target = os.path.join(os.path.expanduser('~'), '.pyrosar', 'gammaparse')
+    stamp = os.path.join(target, 'version')
+    current = '{}\n{}\n'.format(gamma.home, gamma.version)
+    if os.path.isfile(stamp):
+        with open(stamp, 'r') as infile:
+            parsed = infile.read()
+        if parsed == current:
+            return
+        # the modules of another Gamma installation are removed to be parsed again;
+        # the package init is kept and rewritten once the new modules have been parsed
+        for item in finder(target, [_module_pattern], regex=True, recursive=False):
+            if os.path.basename(item) != '__init__.py':
+                os.remove(item)
+        if os.path.isdir(os.path.join(target, '__pycache__')):
+            shutil.rmtree(os.path.join(target, '__pycache__'))
     if not os.path.isdir(target):
         os.makedirs(target)
-    for module in finder(home, ['[A-Z]*'], foldermode=2):
+    # the parsed functions are kept across Gamma versions so that unchanged commands are not parsed again
+    cache = os.path.join(target, 'parsecache.json')
+    for module in finder(gamma.home, ['[A-Z]*'], foldermode=2):
         outfile = os.path.join(target, os.path.basename(module).lower() + '.py')
         if not os.path.isfile(outfile):
             print('parsing module {} to {}'.format(os.path.basename(module), outfile))
             for submodule in ['bin', 'scripts']:
                 print('-' * 10 + '\n{}'.format(submodule))
                 try:
-                    parse_module(os.path.join(module, submodule), outfile)
+                    parse_module(os.path.join(module, submodule), outfile, cache=cache)
                 except OSError:
                     print('..does not exist')
             print('=' * 20)
-    modules = [re.sub('\.py', '', os.path.basename(x)) for x in finder(target, ['[a-z]+\.py$'], regex=True)]
+    modules = [re.sub('\.py$', '', os.path.basename(x))
+               for x in finder(target, [r'^[a-z_0-9]+\.py$'], regex=True, recursive=False)]
+    modules = [x for x in modules if x != '__init__']
     if len(modules) > 0:
+        # the modules are not imported by the package itself so that they can be imported individually
         with open(os.path.join(target, '__init__.py'), 'w') as init:
-            init.write('from . import {}'.format(', '.join(modules)))
+            init.write('__all__ = {}\n'.format(sorted(modules)))
+        with open(stamp, 'w') as outfile:
+            outfile.write(current)
@@ -0,0 +1,116 @@
+"""
+The placement of intermediate files of :func:`pyroSAR.gamma.geocode` on fast local storage, e.g. a RAM disk,
+within a size budget.
+"""
+import os
+import shutil
+import tempfile
+import threading
+
+
+class TempSpace(object):
+    """
+    placement of intermediate files on fast local storage, e.g. the RAM disk /dev/shm or a local SSD, within a budget.
+    A file is placed in a subdirectory of the fast directory, which is unique to the object, as long as the sizes
+    of all placed files do not exceed the budget; otherwise it remains at its original location, e.g. in a temporary
+    directory on network storage. Once a placed file has been consumed, it is deleted via :meth:`release`,
+    which returns its size to the budget.
+    
+    Parameters
+    ----------
+    directory: str
+        the directory on fast storage
+    budget: int or None
+        the maximum size in bytes of all files placed at the same time; if None, half of the free space
+        of the directory is used
+    
+    Examples
+    --------
+    >>> space = TempSpace('/dev/shm', budget=4 * 1024 ** 3)
+    >>> filename = space.path('/tmp/scene/image_pan', 800 * 1024 ** 2)  # e.g. /dev/shm/pyrosar_xyz/image_pan
+    >>> ...  # write and read the file
+    >>> space.release(filename)
+    >>> space.cleanup()
+    """
+    
+    def __init__(self, directory, budget=None):
+        if not os.path.isdir(directory):
+            raise OSError('directory does not exist: {}'.format(directory))
+        if budget is None:
+            stat = os.statvfs(directory)
+            budget = stat.f_bavail * stat.f_frsize // 2
+        self.directory = directory
+        self.budget = budget
+        self.__lock = threading.Lock()
+        self.__placed = {}
+        self.__subdir = None
+    
+    @property
+    def used(self):
+        """
+        int: the size in bytes of all currently placed files
+        """
+        with self.__lock:
+            return sum(self.__placed.values())
+    
+    def path(self, filename, size):
+        """
+        get the location of an intermediate file
+        
+        Parameters
+        ----------
+        filename: str
+            the original name of the file
+        size: int
+            the estimated size of the file in bytes, e.g. computed via :func:`pyroSAR.gamma.io.nbytes`
+        
+        Returns
+        -------
+        str
+            the name of the file in the fast directory if it fits into the budget, otherwise the original name
+        """
+        with self.__lock:
+            if sum(self.__placed.values()) + size > self.budget:
+                return filename
+            if self.__subdir is None:
+                self.__subdir = tempfile.mkdtemp(prefix='pyrosar_', dir=self.directory)
+            target = os.path.join(self.__subdir, os.path.basename(filename))
+            self.__placed[target] = size
+            return target
+    
+    def release(self, filename):
+        """
+        delete a placed file together with its accompanying files, e.g. `<filename>.hdr`;
+        files which have not been placed are not deleted
+        
+        Parameters
+        ----------
+        filename: str
+            the name of the file as returned by :meth:`path`
+        
+        Returns
+        -------
+        
+        """
+        with self.__lock:
+            if filename not in self.__placed.keys():
+                return
+            del self.__placed[filename]
+        base = os.path.basename(filename)
+        for item in os.listdir(os.path.dirname(filename)):
+            if item == base or item.startswith(base + '.'):
+                os.remove(os.path.join(os.path.dirname(filename), item))
+    
+    def cleanup(self):
+        """
+        delete the subdirectory with all placed files
+        
+        Returns
+        -------
+        
+        """
+        with self.__lock:
+            if self.__subdir is not None and os.path.isdir(self.__subdir):
+                shutil.rmtree(self.__subdir)
+            self.__subdir = None
+            self.__placed = {}
@@ -15,23 +15,34 @@ Testing and suggestions on improvements are very welcome.
 import os
 import re
 import sys
+import json
 import math
 import shutil
+import uuid
 from datetime import datetime
+from functools import partial
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 if sys.version_info >= (3, 0):
     from urllib.error import URLError
 else:
     from urllib2 import URLError
 
-from osgeo import ogr
+from osgeo import ogr, osr
 
 from spatialist import haversine
 from spatialist.ancillary import union, finder
 
 from ..S1 import OSV
 from ..drivers import ID, CEOS_ERS, CEOS_PSR, ESA, SAFE, TSX, identify
-from . import ISPPar, Namespace, par2hdr
+from . import ISPPar, Namespace, par2hdr, Checkpoints
+from .cache import GeometryCache
+from .workflow import Workflow
+from .tempspace import TempSpace
+from .intermediates import Intermediates
+from .execution import add_sink, remove_sink, summarize, Backend, _inherit, _scope
+from . import arithmetic, io
 
 try:
     from .api import diff, disp, isp, lat
@@ -376,9 +387,875 @@ def correctOSV(id, osvdir=None, osvType='POE', logpath=None, outdir=None, shells
                         shellscript=shellscript)
 
 
+def _read(filename):
+    """
+    read the content of a text file or return None if it does not exist
+    """
+    if not os.path.isfile(filename):
+        return None
+    with open(filename, 'r') as infile:
+        return infile.read()
+
+
+def _covers(parfile, corners, frame=0):
+    """
+    check whether a DEM segment covers the corner coordinates of a SAR scene
+    
+    Parameters
+    ----------
+    parfile: str
+        the GAMMA DEM parameter file of the segment
+    corners: dict
+        the corner coordinates as returned by :meth:`pyroSAR.drivers.ID.getCorners`
+    frame: int
+        the number of DEM pixels at the segment border, which must not be covered by the scene
+    
+    Returns
+    -------
+    bool
+    """
+    par = ISPPar(parfile)
+    points = [(corners[x], corners[y]) for x in ['xmin', 'xmax'] for y in ['ymin', 'ymax']]
+    if par.DEM_projection == 'EQA':
+        origin = (par.corner_lon, par.corner_lat)
+        posting = (par.post_lon, par.post_lat)
+    elif par.DEM_projection == 'UTM':
+        geo = osr.SpatialReference()
+        geo.SetWellKnownGeogCS('WGS84')
+        utm = osr.SpatialReference()
+        utm.SetWellKnownGeogCS('WGS84')
+        utm.SetUTM(par.projection_zone, float(par.false_northing) == 0)
+        if hasattr(geo, 'SetAxisMappingStrategy'):
+            geo.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transform = osr.CoordinateTransformation(geo, utm)
+        points = [transform.TransformPoint(x, y)[:2] for x, y in points]
+        origin = (par.corner_east, par.corner_north)
+        posting = (par.post_east, par.post_north)
+    else:
+        return False
+    for x, y in points:
+        col = (x - origin[0]) / posting[0]
+        row = (y - origin[1]) / posting[1]
+        if not (frame <= col <= par.width - frame and frame <= row <= par.nlines - frame):
+            return False
+    return True
+
+
+def _fanout(function, images, workers=None):
+    """
+    apply a function to each image in parallel threads; the GAMMA commands are executed in subprocesses,
+    so that threads suffice for running them concurrently
+    
+    Parameters
+    ----------
+    function: function
+        the function to be applied, accepting an image name as single argument
+    images: list of str
+        the images
+    workers: int or None
+        the maximum number of images processed in parallel; if None, all images are processed in parallel
+    
+    Returns
+    -------
+    list
+        the return values of the function for each image
+    """
+    workers = len(images) if workers is None else min(workers, len(images))
+    if workers < 2:
+        return [function(image) for image in images]
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(_inherit(function), images)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _stream(functions, fifos=None):
+    """
+    execute a chain of functions, e.g. GAMMA commands each reading the output of the previous one.
+    If named pipes are defined, they are created in place of the intermediate files and the functions are executed
+    concurrently so that the data is passed between them without being written to disk. All functions reading from
+    or writing to the pipes need to access them strictly sequentially.
+    
+    Parameters
+    ----------
+    functions: list of function
+        the functions to be executed without arguments
+    fifos: list of str or None
+        the names of the intermediate files to be replaced by named pipes;
+        if None, the functions are executed one after another
+    
+    Returns
+    -------
+    
+    """
+    if fifos is None:
+        for function in functions:
+            function()
+        return
+    for fifo in fifos:
+        if os.path.exists(fifo):
+            os.remove(fifo)
+        os.mkfifo(fifo)
+    pool = ThreadPool(len(functions))
+    try:
+        results = [pool.apply_async(_inherit(x)) for x in functions]
+        pending = list(results)
+        while len(pending) > 0:
+            if any([x.ready() and not x.successful() for x in results]):
+                # the functions waiting for a failed counterpart to open a pipe are released
+                for fifo in fifos:
+                    _release(fifo)
+            pending[0].wait(0.1)
+            pending = [x for x in results if not x.ready()]
+        for result in results:
+            result.get()
+    finally:
+        pool.close()
+        pool.join()
+        for fifo in fifos:
+            if os.path.exists(fifo):
+                os.remove(fifo)
+
+
+def _release(fifo):
+    """
+    open and close a named pipe at both ends without blocking; a reader waiting for a writer then reads the end of
+    the file and a writer waiting for a reader fails with a broken pipe
+    """
+    for flags in [os.O_WRONLY | os.O_NONBLOCK, os.O_RDONLY | os.O_NONBLOCK]:
+        try:
+            os.close(os.open(fifo, flags))
+        except OSError:
+            # there is no process waiting at the other end
+            pass
+
+
+def _logpath(path_log, image):
+    """
+    the log directory for the commands processing a single image; each image gets its own directory so that
+    logs of commands executed in parallel for different images do not overwrite each other
+    """
+    logpath = os.path.join(path_log, os.path.basename(image))
+    if not os.path.isdir(logpath):
+        os.makedirs(logpath)
+    return logpath
+
+
+def _profile(events, filename):
+    """
+    write the summary of the GAMMA command events collected during :func:`geocode` to a JSON file
+    and print the time spent per processing step
+    """
+    steps = summarize(events, keys=('step',))
+    with open(filename, 'w') as out:
+        json.dump({'steps': steps, 'commands': summarize(events, keys=('step', 'command'))}, out, indent=2)
+    print('processing time per step (wall/user/sys seconds, peak memory MB):')
+    for entry in steps:
+        values = [entry[key] if entry[key] is not None else '-' for key in ['wall', 'user', 'sys', 'maxrss']]
+        print('  {:<13}'.format(str(entry['step'])) + ''.join(['{:>9}'.format(x) for x in values]))
+
+
+def _files(step, image, n, method_suffix, scaling, outdir):
+    """
+    the input and output files of the image-wise steps geocode_back, db and geotiff of :func:`geocode`
+    for a single multilooked image
+    """
+    product = image + '_' + method_suffix
+    if step == 'geocode_back':
+        if method_suffix == 'geo_norm':
+            inputs = [image, n.lut_coarse, n.pix, n.inc]
+        else:
+            inputs = [image, n.ratio_sigma0, n.lut_coarse, n.inc]
+        return inputs, [product, product + '.hdr']
+    elif step == 'db':
+        return [product], [product + '_db', product + '_db.hdr']
+    elif step == 'geotiff':
+        suffixes = [{'linear': '', 'db': '_db'}[x] for x in scaling]
+        outputs = [os.path.join(outdir, os.path.basename(product) + x + '.tif') for x in suffixes]
+        return [product + x for x in suffixes], outputs
+    raise ValueError('unknown step: {}'.format(step))
+
+
+def _intermediates(images, n, method_suffix, scaling):
+    """
+    the intermediate files of :func:`geocode` written after multilooking and the steps reading them, by which
+    they are reference-counted for being deleted during processing (see :class:`~pyroSAR.gamma.intermediates.Intermediates`)
+    """
+    master = images[0]
+    if method_suffix == 'geo_norm':
+        entries = [(images + [n.lut_coarse, n.pix, n.inc], ['geocode_back']),
+                   ([n.dem_seg, n.ls_map], ['gc_map'])]
+    else:
+        entries = [([master, n.lut_coarse, n.inc], ['pixel_area', 'geocode_back']),
+                   (images[1:] + [n.ratio_sigma0], ['geocode_back']),
+                   ([n.dem_seg, n.ls_map, n.pixel_area_fine, n.ellipse_pixel_area, master + '_cal'], ['pixel_area']),
+                   ([n.pix], ['gc_map'])]
+    products = [x + '_' + method_suffix for x in images]
+    if 'db' in scaling:
+        entries.extend([(products, ['db', 'geotiff']),
+                        ([x + '_db' for x in products], ['geotiff'])])
+    else:
+        entries.append((products, ['geotiff']))
+    return entries
+
+
+def _plan(scene, dem, tempdir, outdir, steps, scaling, normalization_method, parameters):
+    """
+    the processing workflow of :func:`geocode` for a dry run.
+    The nodes are only planned, not executed. Whether the scene-wise steps are complete is read from the manifest
+    of completed steps without modifying it; the nodes of the image-wise steps are further checked via the
+    modification times of their files. If the scene has not been converted yet, the image names are
+    derived from its polarizations.
+    """
+    directory = os.path.join(tempdir, os.path.basename(scene.file))
+    images = []
+    if os.path.isdir(directory):
+        images = [x for x in scene.getGammaImages(directory) if x.endswith('_grd') or x.endswith('_slc_cal')]
+    if len(images) == 0:
+        suffix = 'grd' if scene.product == 'GRD' else 'slc_cal'
+        images = [os.path.join(directory, '_'.join([scene.outname_base(), x, suffix])) for x in scene.polarizations]
+    
+    n = Namespace(directory, scene.outname_base())
+    n.appreciate(['dem_seg', 'lut_coarse', 'lut_fine', 'pix', 'ccp', 'inc', 'ls_map'])
+    n.depreciate(['sim_map', 'u', 'v', 'psi'])
+    method_suffix = {1: 'geo_norm', 2: 'norm_geo'}[normalization_method]
+    
+    def complete(step, inputs=None):
+        # nodes of incomplete steps are executed, those of complete steps if their files are outdated
+        return None if steps.valid(step, inputs=inputs, parameters=parameters.get(step)) else False
+    
+    flow = Workflow()
+    previous = []
+    for step in ['unpack', 'border_noise', 'convert', 'osv', 'calibrate']:
+        if step == 'unpack' and scene.compression is None:
+            continue
+        inputs = [scene.scene] if step == 'unpack' else None
+        flow.add(step, after=previous, complete=complete(step, inputs) is None)
+        previous = [step]
+    images = [x + '_mli' for x in images]
+    for image in images:
+        flow.add('multilook ' + os.path.basename(image), inputs=[image[:-4]], outputs=[image], label='multilook',
+                 after=previous, complete=complete('multilook'))
+    flow.add('gc_map', inputs=[images[0] + '.par', dem, dem + '.par'],
+             outputs=[n.dem_seg, n.dem_seg + '.par', n.lut_coarse, n.inc, n.pix, n.ls_map],
+             after=['multilook ' + os.path.basename(images[0])], complete=complete('gc_map', [dem, dem + '.par']))
+    if normalization_method == 2:
+        n.appreciate(['pixel_area_fine', 'ellipse_pixel_area', 'ratio_sigma0'])
+        flow.add('pixel_area', inputs=[images[0], n.dem_seg, n.lut_coarse, n.ls_map, n.inc],
+                 outputs=[n.pixel_area_fine, n.ellipse_pixel_area, n.ratio_sigma0], complete=complete('pixel_area'))
+    for step in ['geocode_back', 'db', 'geotiff']:
+        if step == 'db' and 'db' not in scaling:
+            continue
+        for image in images:
+            inputs, outputs = _files(step, image, n, method_suffix, scaling, outdir)
+            flow.add('{} {}'.format(step, os.path.basename(image)), inputs=inputs, outputs=outputs, label=step,
+                     complete=complete(step))
+    return flow
+
+
+def _costs(profile):
+    """
+    read the wall time per processing step from the profile of an earlier run of :func:`geocode`
+    """
+    if not os.path.isfile(profile):
+        return {}
+    with open(profile, 'r') as infile:
+        steps = json.load(infile)['steps']
+    return {x['step']: x['wall'] for x in steps if x['step'] is not None}
+
+
+def _parameters(targetres, func_geoback, func_interp, nodata, osvdir, allow_RES_OSV, normalization_method, engine,
+                scaling):
+    """
+    the parameters of the processing steps of :func:`geocode`, with which the steps are recorded as completed
+    """
+    return {'osv': {'osvdir': osvdir, 'allow_RES_OSV': allow_RES_OSV},
+            'multilook': {'targetres': targetres},
+            'gc_map': {'targetres': targetres, 'func_interp': func_interp},
+            'geocode_back': {'func_geoback': func_geoback, 'normalization_method': normalization_method,
+                             'engine': engine},
+            'db': {'nodata': nodata},
+            'geotiff': {'scaling': sorted(scaling), 'nodata': nodata}}
+
+
+def _expect(steps, scene, dem, scaling, normalization_method, parameters):
+    """
+    declare the steps of :func:`geocode` in processing order with the inputs and parameters they are checked with,
+    so that completed steps whose deleted intermediate files are needed by a step to be processed again are
+    processed again (see :meth:`~pyroSAR.gamma.checkpoints.Checkpoints.expect`)
+    """
+    inputs = {'unpack': [scene.scene], 'gc_map': [dem, dem + '.par']}
+    for step in ['unpack', 'border_noise', 'convert', 'osv', 'calibrate', 'multilook', 'gc_map', 'pixel_area',
+                 'geocode_back', 'db', 'geotiff']:
+        if (step == 'unpack' and scene.compression is None) or (step == 'pixel_area' and normalization_method != 2) \
+                or (step == 'db' and 'db' not in scaling):
+            continue
+        steps.expect(step, inputs=inputs.get(step), parameters=parameters.get(step))
+
+
+def _step(steps, step, directory, function, message=None, inputs=None, parameters=None):
+    """
+    execute a scene-wise step of :func:`geocode` unless it has been completed in an earlier run and register
+    the files written to the scene directory as its outputs
+    
+    Parameters
+    ----------
+    steps: ~pyroSAR.gamma.checkpoints.Checkpoints
+        the manifest of completed steps
+    step: str
+        the name of the step
+    directory: str
+        the directory in which the step writes its outputs
+    function: function
+        the function executing the step without arguments
+    message: str or None
+        a message printed before the step is executed
+    inputs: list of str or None
+        the input files the step is checked with
+    parameters: dict or None
+        the parameters the step is checked with
+    
+    Returns
+    -------
+    
+    """
+    if steps.done(step, inputs=inputs, parameters=parameters):
+        return
+    if message is not None:
+        print(message)
+    start = steps.now()
+    function()
+    steps.register(step, steps.changed(directory, start), inputs=inputs, parameters=parameters)
+
+
+def _processed(scene, outdir):
+    """
+    check whether the GeoTIFFs of a scene processed by :func:`geocode` exist in the output directory
+    """
+    return len(finder(outdir, [scene.outname_base() + r'.*\.tif$'], regex=True, recursive=False)) > 0
+
+
+def _unpack(scene, tempdir, steps, resume):
+    """
+    unpack a scene for :func:`geocode` or continue with the scene unpacked by an earlier run
+
+    Raises
+    ------
+    RuntimeError
+        if the scene has already been unpacked by a run without manifest, which might still be processing it
+    """
+    archive = scene.scene
+    if steps.done('unpack', inputs=[archive]):
+        print('resuming processing of unpacked scene..')
+        scene.scene = steps.info('unpack')['scene']
+        scene.file = steps.info('unpack')['file']
+        return
+    print('unpacking scene..')
+    try:
+        # a scene directory of an incomplete earlier run is replaced;
+        # without manifest the scene might currently be processed by another process
+        scene.unpack(tempdir, overwrite=resume)
+    except RuntimeError:
+        raise RuntimeError('scene {} was attempted to be processed before'.format(scene.outname_base()))
+    # the TIFFs are listed so that they can be deleted as intermediate files after conversion
+    tiffs = finder(os.path.join(scene.scene, 'measurement'), ['*.tiff'])
+    steps.register('unpack', [scene.scene] + tiffs, inputs=[archive], scene=scene.scene, file=scene.file)
+
+
+class _Run(object):
+    """
+    the state of a single call of :func:`geocode`, which is set up on creation and released by :meth:`close`:
+    the events of the executed GAMMA commands summarized in a profile, the :class:`~pyroSAR.gamma.execution.Backend`
+    executing the commands, the intermediate files deleted during processing and the temp space for intermediate
+    images.
+    
+    Parameters
+    ----------
+    scene: ~pyroSAR.drivers.ID
+        the SAR scene
+    steps: ~pyroSAR.gamma.checkpoints.Checkpoints
+        the manifest of completed steps
+    outdir: str
+        the directory to write the profile to
+    cleanup: bool
+        delete intermediate files once all steps reading them are complete?
+    keep: list of str or None
+        patterns of intermediate files not to be deleted
+    tempspace: str or ~pyroSAR.gamma.tempspace.TempSpace or None
+        a directory or temp space object for placing intermediate images
+    """
+    
+    def __init__(self, scene, steps, outdir, cleanup, keep, tempspace):
+        self.steps = steps
+        self.cleanup = cleanup
+        self.profile = os.path.join(outdir, scene.outname_base() + '_profile.json')
+        # a temp space created here is removed after processing, one passed as object might be shared with other scenes
+        self.tempspace = tempspace
+        self.space = tempspace if tempspace is None or isinstance(tempspace, TempSpace) else TempSpace(tempspace)
+        # with cleanup, intermediate files are deleted as soon as all steps reading them are complete
+        self.files = Intermediates(keep=keep, callback=steps.consume)
+        # the commands of this run are told apart from those of scenes processed concurrently in other threads
+        self.events = []
+        self.id = '{}_{}'.format(scene.outname_base(), uuid.uuid4().hex[:8])
+        # sinks are removed by identity, so the bound method is kept
+        self.__sink = self.collect
+        add_sink(self.__sink, run=self.id)
+        self.__previous = _scope(self.id)
+        # the shell script and log files are kept open by the backend for the whole run
+        self.backend = Backend().open()
+    
+    def collect(self, event):
+        """
+        collect a command event; commands executed by the nodes of a workflow are attributed to the node's step
+        """
+        self.events.append(dict(event, step=Workflow.current() or self.steps.current))
+    
+    def intermediate(self, filenames, consumers):
+        """
+        register intermediate files to be deleted once the steps reading them are complete, if cleanup is enabled
+        """
+        if self.cleanup:
+            self.files.add(filenames, consumers)
+    
+    def close(self):
+        """
+        release the temp space and the backend, stop collecting events and write the profile
+        """
+        if self.space is not None and self.space is not self.tempspace:
+            self.space.cleanup()
+        self.backend.close()
+        remove_sink(self.__sink)
+        _scope(self.__previous)
+        if len(self.events) > 0:
+            _profile(self.events, self.profile)
+
+
+def _multilook(image, targetres, path_log, directory, shellscript):
+    """
+    multilook a single image in :func:`geocode`
+    """
+    multilook(infile=image, outfile=image + '_mli', targetres=targetres,
+              logpath=_logpath(path_log, image), outdir=directory, shellscript=shellscript)
+
+
+class _SceneGeometry(object):
+    """
+    the geometry products of a scene in a :class:`~pyroSAR.gamma.cache.GeometryCache`, which are identified by
+    the DEM, the parameters defining the products and the MLI parameter file of the scene.
+    Without cache, no products are found or stored, so that they are always computed.
+    
+    Parameters
+    ----------
+    cache: str or ~pyroSAR.gamma.cache.GeometryCache or None
+        the cache directory or object
+    scene: ~pyroSAR.drivers.ID
+        the SAR scene
+    dem: str
+        the reference DEM in GAMMA format
+    master: str
+        the master MLI image
+    parameters: list
+        the parameters defining the geometry products
+    """
+    
+    def __init__(self, cache, scene, dem, master, parameters):
+        self.cache = cache if cache is None or isinstance(cache, GeometryCache) else GeometryCache(cache)
+        if self.cache is not None:
+            self.dem = [os.path.abspath(dem), Checkpoints.fingerprint(dem), Checkpoints.fingerprint(dem + '.par')] \
+                       + parameters
+            self.track = self.cache.key('track', self.dem, scene.orbitNumber_rel, scene.orbit)
+            self.master = _read(master + '.par')
+    
+    def segment(self, parfile, corners, frame):
+        """
+        copy the DEM segment definition of an earlier scene of the same track, which covers the scene
+        
+        Returns
+        -------
+        bool
+            was a DEM segment definition copied?
+        """
+        if self.cache is not None:
+            for entry in self.cache.entries(track=self.track):
+                if _covers(self.cache.path(entry['key'], 'dem_seg.par'), corners, frame) \
+                        and self.cache.get(entry['key'], {'dem_seg.par': parfile}):
+                    return True
+        return False
+    
+    def key(self, step, parfile):
+        """
+        the cache key of the products of a step derived from the DEM segment defined by a parameter file
+        """
+        return None if self.cache is None else self.cache.key(step, self.dem, self.master, _read(parfile))
+    
+    def get(self, key, products):
+        """
+        copy cached products, see :meth:`~pyroSAR.gamma.cache.GeometryCache.get`
+        """
+        return key is not None and self.cache.get(key, products)
+    
+    def put(self, key, products):
+        """
+        store products in the cache, see :meth:`~pyroSAR.gamma.cache.GeometryCache.put`
+        """
+        if key is not None:
+            self.cache.put(key, products)
+    
+    def put_segment(self, parfile):
+        """
+        store the DEM segment definition of the scene for the following scenes of the track
+        """
+        if self.cache is not None:
+            self.cache.put(self.cache.key('dem_seg', _read(parfile)), {'dem_seg.par': parfile}, track=self.track)
+
+
+def _gc_map(geometry, n, master, gc_map_args, corners):
+    """
+    compute the DEM segment and lookup table of :func:`geocode` or copy them from the cache
+    """
+    products = {'dem_seg': n.dem_seg, 'dem_seg.par': n.dem_seg + '.par', 'lut': n.lut_coarse,
+                'inc': n.inc, 'pix': n.pix, 'ls_map': n.ls_map}
+    # the DEM segment of an earlier scene of the same track covering this scene is passed to gc_map,
+    # which then computes the new segment and lookup table on the same map grid
+    if geometry.segment(n.dem_seg + '.par', corners, gc_map_args['frame']):
+        print('using cached DEM segment definition..')
+    key = geometry.key('gc_map', n.dem_seg + '.par')
+    if geometry.get(key, products):
+        print('using cached DEM segment and lookup table..')
+    else:
+        print('SAR image simulation from DEM..')
+        if ISPPar(master + '.par').image_geometry == 'GROUND_RANGE':
+            gc_map_args.update({'GRD_par': master + '.par'})
+            diff.gc_map_grd(**gc_map_args)
+        else:
+            gc_map_args.update({'MLI_par': master + '.par',
+                                'OFF_par': '-'})
+            diff.gc_map(**gc_map_args)
+        geometry.put(key, products)
+        geometry.put_segment(n.dem_seg + '.par')
+    
+    for item in ['dem_seg', 'sim_map', 'u', 'v', 'psi', 'pix', 'inc']:
+        if n.isappreciated(item):
+            par2hdr(n.dem_seg + '.par', n.get(item) + '.hdr')
+
+
+def _pixel_area(geometry, n, master, lut, engine, path_log, directory, shellscript):
+    """
+    compute the pixel area normalization of :func:`geocode` or copy it from the cache
+    """
+    products = {'pixel_area_fine': n.pixel_area_fine, 'ellipse_pixel_area': n.ellipse_pixel_area,
+                'ratio_sigma0': n.ratio_sigma0}
+    key = geometry.key('pixel_area', n.dem_seg + '.par')
+    if geometry.get(key, products):
+        print('using cached pixel area normalization..')
+        return
+    diff.pixel_area(MLI_par=master + '.par',
+                    DEM_par=n.dem_seg + '.par',
+                    DEM=n.dem_seg,
+                    lookup_table=lut,
+                    ls_map=n.ls_map,
+                    inc_map=n.inc,
+                    pix_sigma0=n.pixel_area_fine,
+                    logpath=path_log,
+                    outdir=directory,
+                    shellscript=shellscript)
+    isp.radcal_MLI(MLI=master,
+                   MLI_par=master + '.par',
+                   OFF_par='-',
+                   CMLI=master + '_cal',
+                   refarea_flag=1,
+                   pix_area=n.ellipse_pixel_area,
+                   logpath=path_log,
+                   outdir=directory,
+                   shellscript=shellscript)
+    width = ISPPar(master + '.par').range_samples
+    if engine == 'numpy':
+        arithmetic.ratio(d1=n.ellipse_pixel_area,
+                         d2=n.pixel_area_fine,
+                         ratio=n.ratio_sigma0,
+                         width=width)
+    else:
+        lat.ratio(d1=n.ellipse_pixel_area,
+                  d2=n.pixel_area_fine,
+                  ratio=n.ratio_sigma0,
+                  width=width,
+                  bx=1,
+                  by=1,
+                  logpath=path_log,
+                  outdir=directory,
+                  shellscript=shellscript)
+    geometry.put(key, products)
+
+
+class _ImageSteps(object):
+    """
+    the image-wise steps geocode_back, db and geotiff of :func:`geocode`, each processing a single multilooked
+    image so that the images can be processed independently as the nodes of a :class:`~pyroSAR.gamma.workflow.Workflow`.
+    The images are processed with the engine, streaming and temp space defined by the arguments of :func:`geocode`.
+    """
+    
+    def __init__(self, n, master, lut, method_suffix, func_geoback, nodata, scaling, engine, stream, space,
+                 path_log, directory, outdir, shellscript):
+        self.n = n
+        self.lut = lut
+        self.method_suffix = method_suffix
+        self.func_geoback = func_geoback
+        self.nodata = nodata
+        self.scaling = scaling
+        self.engine = engine
+        self.stream = stream
+        self.space = space
+        self.path_log = path_log
+        self.directory = directory
+        self.outdir = outdir
+        self.shellscript = shellscript
+        master_par = ISPPar(master + '.par')
+        self.width_in = master_par.range_samples
+        self.factor = math.cos(math.radians(master_par.incidence_angle))
+        self.width = ISPPar(n.dem_seg + '.par').width
+        self.lines = ISPPar(n.dem_seg + '.par').nlines
+        # the sizes of the intermediate images in MLI and DEM segment geometry for placing them via tempspace
+        self.mli_size = io.nbytes(master + '.par')
+        self.geo_size = io.nbytes(n.dem_seg + '.par', data_format='FLOAT')
+    
+    def __place(self, placed, filename, size):
+        placed.append(filename if self.space is None else self.space.path(filename, size))
+        return placed[-1]
+    
+    def geocode_back(self, image):
+        """
+        normalize and geocode an image
+        """
+        logpath = _logpath(self.path_log, image)
+        # the intermediate images are placed on fast storage if possible and removed once consumed or if
+        # processing fails, also if the temp space is shared with other scenes
+        placed = []
+        try:
+            if self.method_suffix == 'geo_norm':
+                self.__geo_norm(image, logpath, placed)
+            else:
+                self.__norm_geo(image, logpath, placed)
+            par2hdr(self.n.dem_seg + '.par', image + '_{}.hdr'.format(self.method_suffix))
+        finally:
+            if self.space is not None:
+                for filename in placed:
+                    self.space.release(filename)
+    
+    def __geo_norm(self, image, logpath, placed):
+        # normalization and backward geocoding approach 1: first geocoding, then terrain flattening
+        geo = self.__place(placed, image + '_geo', self.geo_size)
+        diff.geocode_back(data_in=image,
+                          width_in=self.width_in,
+                          gc_map=self.lut,
+                          data_out=geo,
+                          width_out=self.width,
+                          interp_mode=self.func_geoback,
+                          logpath=logpath,
+                          outdir=self.directory,
+                          shellscript=self.shellscript)
+        if self.engine == 'numpy':
+            arithmetic.normalize(data_in=geo,
+                                 data_out=image + '_{}'.format(self.method_suffix),
+                                 width=self.width,
+                                 factor=self.factor,
+                                 inc=self.n.inc,
+                                 pix=self.n.pix)
+            return
+        # a named pipe does not occupy space and is thus not placed on fast storage
+        geo_pan = image + '_geo_pan' if self.stream else self.__place(placed, image + '_geo_pan', self.geo_size)
+        # the first input of product is a file since the number of lines is derived from its size
+        product = partial(lat.product,
+                          data_1=geo,
+                          data_2=self.n.pix,
+                          product=geo_pan,
+                          width=self.width,
+                          bx=1,
+                          by=1,
+                          logpath=logpath,
+                          outdir=self.directory,
+                          shellscript=self.shellscript)
+        self.__flatten(image, product, geo_pan, image + '_geo_pan_flat', logpath, placed)
+    
+    def __norm_geo(self, image, logpath, placed):
+        # normalization and backward geocoding approach 2: first terrain flattening, then geocoding
+        pan = self.__place(placed, image + '_pan', self.mli_size)
+        if self.engine == 'numpy':
+            arithmetic.product(data_1=image,
+                               data_2=self.n.ratio_sigma0,
+                               product=pan,
+                               width=self.width_in)
+        else:
+            lat.product(data_1=image,
+                        data_2=self.n.ratio_sigma0,
+                        product=pan,
+                        width=self.width_in,
+                        bx=1,
+                        by=1,
+                        logpath=logpath,
+                        outdir=self.directory,
+                        shellscript=self.shellscript)
+        # a named pipe does not occupy space and is thus not placed on fast storage
+        streamed = self.stream and self.engine == 'gamma'
+        pan_geo = image + '_pan_geo' if streamed else self.__place(placed, image + '_pan_geo', self.geo_size)
+        geocode_back = partial(diff.geocode_back,
+                               data_in=pan,
+                               width_in=self.width_in,
+                               gc_map=self.lut,
+                               data_out=pan_geo,
+                               width_out=self.width,
+                               interp_mode=self.func_geoback,
+                               logpath=logpath,
+                               outdir=self.directory,
+                               shellscript=self.shellscript)
+        if self.engine == 'numpy':
+            geocode_back()
+            arithmetic.normalize(data_in=pan_geo,
+                                 data_out=image + '_{}'.format(self.method_suffix),
+                                 width=self.width,
+                                 factor=self.factor,
+                                 inc=self.n.inc)
+            return
+        # the input of geocode_back is accessed randomly and thus always a file
+        self.__flatten(image, geocode_back, pan_geo, image + '_pan_geo_flat', logpath, placed)
+    
+    def __flatten(self, image, command, data, flat, logpath, placed):
+        # the output of a command is flattened with the incidence angle of the scene center and converted
+        # to gamma nought; with streaming, the command writes to a named pipe read by lin_comb
+        flat = self.__place(placed, flat, self.geo_size)
+        # the number of lines cannot be derived from the size of a named pipe and is thus passed explicitly
+        lines = {'nlines': self.lines} if self.stream else {}
+        commands = [command,
+                    partial(lat.lin_comb,
+                            files=[data],
+                            constant=0,
+                            factors=[self.factor],
+                            f_out=flat,
+                            width=self.width,
+                            logpath=logpath,
+                            outdir=self.directory,
+                            shellscript=self.shellscript,
+                            **lines)]
+        _stream(commands, [data] if self.stream else None)
+        if self.stream:
+            # fails if a command wrote an incomplete image since it could not determine its size
+            io.memmap(flat, self.width, lines=self.lines)
+        # the input of sigma2gamma is a file since the number of lines is derived from its size
+        lat.sigma2gamma(pwr1=flat,
+                        inc=self.n.inc,
+                        gamma=image + '_{}'.format(self.method_suffix),
+                        width=self.width,
+                        logpath=logpath,
+                        outdir=self.directory,
+                        shellscript=self.shellscript)
+    
+    def db(self, image):
+        """
+        convert a normalized and geocoded image to dB
+        """
+        logpath = _logpath(self.path_log, image)
+        if self.engine == 'numpy':
+            arithmetic.linear_to_dB(data_in=image + '_{}'.format(self.method_suffix),
+                                    data_out=image + '_{}_db'.format(self.method_suffix),
+                                    width=self.width,
+                                    null_value=self.nodata[1])
+        else:
+            lat.linear_to_dB(data_in=image + '_{}'.format(self.method_suffix),
+                             data_out=image + '_{}_db'.format(self.method_suffix),
+                             width=self.width,
+                             inverse_flag=0,
+                             null_value=self.nodata[1],
+                             logpath=logpath,
+                             outdir=self.directory,
+                             shellscript=self.shellscript)
+        par2hdr(self.n.dem_seg + '.par', image + '_{}_db.hdr'.format(self.method_suffix))
+    
+    def geotiff(self, image):
+        """
+        export the normalized and geocoded image in each scaling to GeoTiff
+        """
+        logpath = _logpath(self.path_log, image)
+        for scale in self.scaling:
+            nodata_out = {'linear': self.nodata[0], 'db': self.nodata[1]}[scale]
+            suffix = {'linear': '', 'db': '_db'}[scale]
+            infile = image + '_{0}{1}'.format(self.method_suffix, suffix)
+            outfile = os.path.join(self.outdir,
+                                   os.path.basename(image) + '_{0}{1}.tif'.format(self.method_suffix, suffix))
+            disp.data2geotiff(DEM_par=self.n.dem_seg + '.par',
+                              data=infile,
+                              type=2,
+                              GeoTIFF=outfile,
+                              nodata=nodata_out,
+                              logpath=logpath,
+                              outdir=self.directory,
+                              shellscript=self.shellscript)
+
+
+def _image_workflow(tasks, images, steps, files, workers, n, method_suffix, scaling, outdir):
+    """
+    execute the image-wise steps of :func:`geocode` as a :class:`~pyroSAR.gamma.workflow.Workflow` with one node per
+    step and image, so that e.g. the dB conversion of one image already runs while another image is still being
+    geocoded. A step is registered as completed once all of its nodes and all steps before have been executed.
+    
+    Parameters
+    ----------
+    tasks: collections.OrderedDict
+        the incomplete steps in processing order with the function processing a single image
+        and the parameters of each step
+    images: list of str
+        the multilooked images
+    steps: ~pyroSAR.gamma.checkpoints.Checkpoints
+        the manifest of completed steps
+    files: ~pyroSAR.gamma.intermediates.Intermediates
+        the intermediate files, which are deleted once the steps reading them are complete
+    workers: int or None
+        the maximum number of nodes executed in parallel; if None, one per image
+    n: ~pyroSAR.gamma.auxil.Namespace
+        the names of the geometry products
+    method_suffix: {'geo_norm', 'norm_geo'}
+        the suffix of the normalized and geocoded images
+    scaling: list of str
+        the value scalings of the GeoTiff files
+    outdir: str
+        the directory for the final GeoTiff files
+    
+    Returns
+    -------
+    
+    """
+    flow = Workflow()
+    nodes = OrderedDict()
+    for step, (function, parameters) in tasks.items():
+        nodes[step] = []
+        for image in images:
+            inputs, outputs = _files(step, image, n, method_suffix, scaling, outdir)
+            nodes[step].append('{} {}'.format(step, os.path.basename(image)))
+            flow.add(nodes[step][-1], partial(function, image), inputs=inputs, outputs=outputs, label=step)
+    
+    finished = []
+    
+    def register(name):
+        finished.append(name)
+        for step, (function, parameters) in tasks.items():
+            if not steps.valid(step, parameters=parameters):
+                if not all([x in finished for x in nodes[step]]):
+                    break
+                outputs = [y for x in images for y in _files(step, x, n, method_suffix, scaling, outdir)[1]]
+                steps.register(step, outputs, parameters=parameters)
+                files.consume(step)
+    
+    # the files read by steps, which have been completed in an earlier run, are deleted before processing
+    for step in [x for x in ['geocode_back', 'db', 'geotiff'] if x not in tasks.keys()]:
+        files.consume(step)
+    
+    flow.run(workers=max(1, len(images)) if workers is None else workers, force=True, callback=register)
+
+
 def geocode(scene, dem, tempdir, outdir, targetres, scaling='linear', func_geoback=2,
             func_interp=0, nodata=(0, -99), sarSimCC=False, osvdir=None, allow_RES_OSV=False,
-            cleanup=True, normalization_method=2):
+            cleanup=True, normalization_method=2, cache=None,
+            workers=None, engine='gamma', dryrun=False, stream=False, tempspace=None, keep=None):
     """
     general function for geocoding SAR images with GAMMA
     
@@ -425,16 +1302,91 @@ def geocode(scene, dem, tempdir, outdir, targetres, scaling='linear', func_geoba
         Otherwise the function will raise an error if no POE file exists
     cleanup: bool
         should all files written to the temporary directory during function execution be deleted after processing?
+        If processing fails, the files are kept so that the next call can resume processing; see below.
+        If True, intermediate files are already deleted during processing once all steps reading them are complete.
     normalization_method: {1, 2}
         the topographic normalization approach to be used
          * 1: first geocoding, then terrain flattening
          * 2: first terrain flattening, then geocoding; see `Small 2011 <https://doi.org/10.1109/Tgrs.2011.2120616>`_
+    cache: str or ~pyroSAR.gamma.cache.GeometryCache or None
+        a directory or cache object for sharing DEM segments and geometry products between scenes; see below.
+    workers: int or None
+        the number of polarization images processed in parallel by the image-wise steps (multilooking,
+        normalization and geocoding, dB conversion and GeoTiff export); if None, all images are processed in parallel.
+        The log files of these steps are written to a subdirectory of the log directory per image.
+    engine: {'gamma', 'numpy'}
+        the engine for the pixel-wise raster arithmetic (GAMMA LAT commands product, ratio, lin_comb, sigma2gamma
+        and linear_to_dB)
+         * gamma: execute the GAMMA commands
+         * numpy: compute in-process with the functions of module :mod:`pyroSAR.gamma.arithmetic`; the consecutive
+           multiplications and the gamma nought conversion are fused into one pass so that the intermediate files
+           (e.g. <image>_pan_geo_flat) are not written. These steps are not written to the shell script.
+    dryrun: bool
+        only print the processing plan instead of processing the scene? See below.
+    stream: bool
+        only for engine 'gamma': pass the intermediate image of the normalization chain, which is written and read
+        sequentially (<image>_geo_pan or <image>_pan_geo), between the GAMMA commands via a named pipe instead of
+        writing it to the temporary directory? The commands writing and reading the pipe are then executed
+        concurrently. Images which are read with random access, e.g. the input of geocode_back, or whose number of
+        lines is derived from their file size, e.g. the input of sigma2gamma, are still written to files.
+        The streamed images are not kept, so that processing cannot be resumed within the chain; the shell script
+        still contains the commands with files.
+    tempspace: str or ~pyroSAR.gamma.tempspace.TempSpace or None
+        a directory on fast local storage, e.g. the RAM disk /dev/shm or a local SSD, or a temp space object defining
+        such a directory and a size budget. The intermediate images of the normalization chain (e.g. <image>_pan,
+        <image>_pan_geo and <image>_pan_geo_flat) are written there as long as they fit into the budget and are
+        deleted as soon as the final image of the chain has been written or its processing has failed. Only the
+        images actually written by the chosen engine occupy the budget; those streamed via `stream` are not placed.
+        Images exceeding the budget are written to the temporary directory as before.
+    keep: list of str or None
+        patterns of intermediate files, which are not deleted with `cleanup=True`, e.g. ['*_mli', '*_inc'] for
+        debugging; see :class:`~pyroSAR.gamma.intermediates.Intermediates`.
     
     Returns
     -------
+    list or None
+        the plan as returned by :meth:`~pyroSAR.gamma.workflow.Workflow.plan` if `dryrun` is True
     
     Note
     ----
+    The completed processing steps (unpack, border_noise, convert, osv, calibrate, multilook, gc_map, pixel_area,
+    geocode_back, db, geotiff) are recorded together with their parameters and the fingerprints of their input and
+    output files in a manifest `<tempdir>/<outname_base>_steps.json`
+    (see :class:`~pyroSAR.gamma.checkpoints.Checkpoints`). If processing is interrupted, calling the function again
+    with the same arguments resumes at the first step which has not been completed or whose parameters, inputs or
+    outputs have changed.
+    A scene is skipped if GeoTIFFs named after it exist in `outdir` and it has no manifest. If the scene directory
+    already exists in `tempdir` without manifest, i.e. the scene might currently be processed by another process,
+    or if the orbit state vectors cannot be updated, a RuntimeError is raised instead of returning without output,
+    so that :func:`pyroSAR.batch.process` records the scene as failed.
+    
+    With `cleanup=True`, the unpacked measurement TIFFs, the converted and multilooked images, the products of
+    gc_map and pixel_area and the normalized and dB images are reference-counted by the steps reading them and
+    deleted once the last of these steps has been registered as completed, so that the peak disk usage of a scene
+    is only a fraction of the total size of its intermediate files. If a step needs to be processed again after
+    its inputs have been deleted, e.g. because its parameters have changed, processing is resumed at the step
+    writing these inputs.
+    
+    The wall time, CPU time and peak memory of each executed GAMMA command are summarized per step and command in a
+    file `<outdir>/<outname_base>_profile.json` (see :func:`~pyroSAR.gamma.execution.add_sink`). The events passed to
+    other sinks carry the id `<outname_base>_<random hex>` of the call as key `run`.
+    The resource usage is measured per command process and is thus also exact if the images are processed in parallel.
+    All commands are executed via a :class:`~pyroSAR.gamma.execution.Backend`, so that the shell script and log files
+    are only opened once; the log files are complete once the function returns.
+    
+    If a cache is defined, the DEM segment definition of an earlier scene of the same relative orbit is passed
+    to gc_map if it covers the scene, so that all scenes of a track are geocoded to the same map grid.
+    The products of gc_map and pixel_area are copied from the cache instead of being computed if the DEM, the
+    geometry parameters and the MLI parameter file of the scene are identical to those of a cached entry, e.g. when
+    a scene is processed again with different scaling or other polarizations.
+    Lookup tables are not shared between different acquisitions since they depend on the exact orbit.
+    
+    The steps geocode_back, db and geotiff are executed as a :class:`~pyroSAR.gamma.workflow.Workflow` with one node
+    per step and image, so that the images are processed independently of each other through these steps.
+    With `dryrun=True` the whole processing chain is expressed as such a workflow and its plan is printed instead
+    of processing the scene: which nodes are executed, i.e. which steps are incomplete or whose files are outdated,
+    their estimated wall time from the profile of an earlier run of the scene and the critical path.
+    
     intermediate output files (named <master_MLI>_<suffix>):
      * dem_seg: dem subsetted to the extent of the SAR image
      * lut: rough geocoding lookup table
@@ -469,262 +1421,174 @@ def geocode(scene, dem, tempdir, outdir, targetres, scaling='linear', func_geoba
         if not os.path.isdir(dir):
             os.makedirs(dir)
     
-    if scene.is_processed(outdir):
+    # the manifest of completed processing steps; if processing is interrupted, e.g. by a failing command,
+    # the next call resumes at the first step which has not been completed
+    steps = Checkpoints(os.path.join(tempdir, scene.outname_base() + '_steps.json'))
+    resume = steps.exists
+    
+    # only the GeoTIFFs mark the scene as processed, not the shell script and the profile written to the output
+    # directory by an interrupted run
+    if _processed(scene, outdir) and not resume:
         print('scene {} already processed'.format(scene.outname_base()))
         return
     
+    if engine not in ['gamma', 'numpy']:
+        raise IOError("engine must be either 'gamma' or 'numpy'")
+    
+    if stream and not hasattr(os, 'mkfifo'):
+        raise IOError('streaming via named pipes is not supported on this platform')
+    
     scaling = [scaling] if isinstance(scaling, str) else scaling if isinstance(scaling, list) else []
     scaling = union(scaling, ['db', 'linear'])
     if len(scaling) == 0:
         raise IOError('wrong input type for parameter scaling')
     
-    if scene.compression is not None:
-        print('unpacking scene..')
-        try:
-            scene.unpack(tempdir)
-        except RuntimeError:
-            print('scene was attempted to be processed before, exiting')
-            return
-    else:
-        scene.scene = os.path.join(tempdir, os.path.basename(scene.file))
-        os.makedirs(scene.scene)
+    parameters = _parameters(targetres, func_geoback, func_interp, nodata, osvdir, allow_RES_OSV,
+                             normalization_method, engine, scaling)
+    _expect(steps, scene, dem, scaling, normalization_method, parameters)
     
-    path_log = os.path.join(scene.scene, 'logfiles')
-    if not os.path.isdir(path_log):
-        os.makedirs(path_log)
+    if dryrun:
+        flow = _plan(scene, dem, tempdir, outdir, steps, scaling, normalization_method, parameters)
+        return flow.run(dryrun=True, costs=_costs(os.path.join(outdir, scene.outname_base() + '_profile.json')))
     
-    if scene.sensor in ['S1A', 'S1B']:
-        print('removing border noise..')
-        scene.removeGRDBorderNoise()
-    
-    print('converting scene to GAMMA format..')
-    convert2gamma(scene, scene.scene, logpath=path_log, outdir=scene.scene, shellscript=shellscript)
-    
-    if scene.sensor in ['S1A', 'S1B']:
-        print('updating orbit state vectors..')
-        if allow_RES_OSV:
-            osvtype = ['POE', 'RES']
+    # the profile, the backend, the intermediate files and the temp space of this run
+    run = _Run(scene, steps, outdir, cleanup, keep, tempspace)
+    try:
+        if scene.compression is not None:
+            _unpack(scene, tempdir, steps, resume)
+            # only the TIFFs of the unpacked copy of the scene are deleted
+            run.intermediate(finder(os.path.join(scene.scene, 'measurement'), ['*.tiff']), ['convert'])
         else:
-            osvtype = 'POE'
-        try:
-            correctOSV(id=scene, osvdir=osvdir, osvType=osvtype,
-                       logpath=path_log, outdir=scene.scene, shellscript=shellscript)
-        except RuntimeError:
-            return
-    
-    calibrate(scene, scene.scene, logpath=path_log, outdir=scene.scene, shellscript=shellscript)
-    
-    images = [x for x in scene.getGammaImages(scene.scene) if x.endswith('_grd') or x.endswith('_slc_cal')]
-    
-    print('multilooking..')
-    for image in images:
-        multilook(infile=image, outfile=image + '_mli', targetres=targetres,
-                  logpath=path_log, outdir=scene.scene, shellscript=shellscript)
-    
-    images = [x + '_mli' for x in images]
-    
-    master = images[0]
-    
-    # create output names for files to be written
-    # appreciated files will be written
-    # depreciated files will be set to '-' in the GAMMA function call and are thus not written
-    n = Namespace(scene.scene, scene.outname_base())
-    n.appreciate(['dem_seg', 'lut_coarse', 'lut_fine', 'pix', 'ccp', 'inc', 'ls_map'])
-    n.depreciate(['sim_map', 'u', 'v', 'psi'])
-    
-    # if sarSimCC:
-    #     n.appreciate(['ls_map'])
-    
-    ovs_lat, ovs_lon = ovs(dem + '.par', targetres)
-    
-    master_par = ISPPar(master + '.par')
-    
-    gc_map_args = {'DEM_par': dem + '.par',
-                   'DEM': dem,
-                   'DEM_seg_par': n.dem_seg + '.par',
-                   'DEM_seg': n.dem_seg,
-                   'lookup_table': n.lut_coarse,
-                   'lat_ovr': ovs_lat,
-                   'lon_ovr': ovs_lon,
-                   'sim_sar': n.sim_map,
-                   'u': n.u,
-                   'v': n.v,
-                   'inc': n.inc,
-                   'psi': n.psi,
-                   'pix': n.pix,
-                   'ls_map': n.ls_map,
-                   'frame': 8,
-                   'ls_mode': func_interp,
-                   'logpath': path_log,
-                   'shellscript': shellscript,
-                   'outdir': scene.scene}
-    
-    print('SAR image simulation from DEM..')
-    if master_par.image_geometry == 'GROUND_RANGE':
-        gc_map_args.update({'GRD_par': master + '.par'})
-        diff.gc_map_grd(**gc_map_args)
-    else:
-        gc_map_args.update({'MLI_par': master + '.par',
-                            'OFF_par': '-'})
-        diff.gc_map(**gc_map_args)
-    
-    for item in ['dem_seg', 'sim_map', 'u', 'v', 'psi', 'pix', 'inc']:
-        if n.isappreciated(item):
-            par2hdr(n.dem_seg + '.par', n.get(item) + '.hdr')
-    
-    sim_width = ISPPar(n.dem_seg + '.par').width
-    
-    if sarSimCC:
-        raise IOError('geocoding with cross correlation offset refinement is still in the making. Please stay tuned...')
-    else:
-        lut_final = n.lut_coarse
-    
-    ######################################################################
-    # normalization and backward geocoding approach 1 ####################
-    ######################################################################
-    print('geocoding and normalization..')
-    if normalization_method == 1:
-        method_suffix = 'geo_norm'
-        for image in images:
-            diff.geocode_back(data_in=image,
-                              width_in=master_par.range_samples,
-                              gc_map=lut_final,
-                              data_out=image + '_geo',
-                              width_out=sim_width,
-                              interp_mode=func_geoback,
-                              logpath=path_log,
-                              outdir=scene.scene,
-                              shellscript=shellscript)
-            lat.product(data_1=image + '_geo',
-                        data_2=n.pix,
-                        product=image + '_geo_pan',
-                        width=sim_width,
-                        bx=1,
-                        by=1,
-                        logpath=path_log,
-                        outdir=scene.scene,
-                        shellscript=shellscript)
-            lat.lin_comb(files=[image + '_geo_pan'],
-                         constant=0,
-                         factors=[math.cos(math.radians(master_par.incidence_angle))],
-                         f_out=image + '_geo_pan_flat',
-                         width=sim_width,
-                         logpath=path_log,
-                         outdir=scene.scene,
-                         shellscript=shellscript)
-            lat.sigma2gamma(pwr1=image + '_geo_pan_flat',
-                            inc=n.inc,
-                            gamma=image + '_{}'.format(method_suffix),
-                            width=sim_width,
-                            logpath=path_log,
-                            outdir=scene.scene,
-                            shellscript=shellscript)
-            par2hdr(n.dem_seg + '.par', image + '_{}.hdr'.format(method_suffix))
-    ######################################################################
-    # normalization and backward geocoding approach 2 ####################
-    ######################################################################
-    elif normalization_method == 2:
-        method_suffix = 'norm_geo'
-        n.appreciate(['pixel_area_fine', 'ellipse_pixel_area', 'ratio_sigma0'])
-        diff.pixel_area(MLI_par=master + '.par',
-                        DEM_par=n.dem_seg + '.par',
-                        DEM=n.dem_seg,
-                        lookup_table=lut_final,
-                        ls_map=n.ls_map,
-                        inc_map=n.inc,
-                        pix_sigma0=n.pixel_area_fine,
-                        logpath=path_log,
-                        outdir=scene.scene,
-                        shellscript=shellscript)
-        isp.radcal_MLI(MLI=master,
-                       MLI_par=master + '.par',
-                       OFF_par='-',
-                       CMLI=master + '_cal',
-                       refarea_flag=1,
-                       pix_area=n.ellipse_pixel_area,
-                       logpath=path_log,
-                       outdir=scene.scene,
-                       shellscript=shellscript)
-        lat.ratio(d1=n.ellipse_pixel_area,
-                  d2=n.pixel_area_fine,
-                  ratio=n.ratio_sigma0,
-                  width=master_par.range_samples,
-                  bx=1,
-                  by=1,
-                  logpath=path_log,
-                  outdir=scene.scene,
-                  shellscript=shellscript)
-        for image in images:
-            lat.product(data_1=image,
-                        data_2=n.ratio_sigma0,
-                        product=image + '_pan',
-                        width=master_par.range_samples,
-                        bx=1,
-                        by=1,
-                        logpath=path_log,
-                        outdir=scene.scene,
-                        shellscript=shellscript)
-            diff.geocode_back(data_in=image + '_pan',
-                              width_in=master_par.range_samples,
-                              gc_map=lut_final,
-                              data_out=image + '_pan_geo',
-                              width_out=sim_width,
-                              interp_mode=func_geoback,
-                              logpath=path_log,
-                              outdir=scene.scene,
-                              shellscript=shellscript)
-            lat.lin_comb(files=[image + '_pan_geo'],
-                         constant=0,
-                         factors=[math.cos(math.radians(master_par.incidence_angle))],
-                         f_out=image + '_pan_geo_flat',
-                         width=sim_width,
-                         logpath=path_log,
-                         outdir=scene.scene,
-                         shellscript=shellscript)
-            lat.sigma2gamma(pwr1=image + '_pan_geo_flat',
-                            inc=n.inc,
-                            gamma=image + '_{}'.format(method_suffix),
-                            width=sim_width,
-                            logpath=path_log,
-                            outdir=scene.scene,
-                            shellscript=shellscript)
-            par2hdr(n.dem_seg + '.par', image + '_{}.hdr'.format(method_suffix))
-    else:
-        raise RuntimeError('unknown option for normalization_method')
-    ######################################################################
-    print('conversion to (dB and) geotiff..')
-    for image in images:
-        for scale in scaling:
-            if scale == 'db':
-                nodata_out = nodata[1]
-                lat.linear_to_dB(data_in=image + '_{}'.format(method_suffix),
-                                 data_out=image + '_{}_db'.format(method_suffix),
-                                 width=sim_width,
-                                 inverse_flag=0,
-                                 null_value=nodata_out,
-                                 logpath=path_log,
-                                 outdir=scene.scene,
-                                 shellscript=shellscript)
-                par2hdr(n.dem_seg + '.par', image + '_{}_db.hdr'.format(method_suffix))
+            scene.scene = os.path.join(tempdir, os.path.basename(scene.file))
+            if not os.path.isdir(scene.scene):
+                os.makedirs(scene.scene)
+        
+        path_log = os.path.join(scene.scene, 'logfiles')
+        if not os.path.isdir(path_log):
+            os.makedirs(path_log)
+        
+        if scene.sensor in ['S1A', 'S1B']:
+            _step(steps, 'border_noise', os.path.join(scene.scene, 'measurement'), scene.removeGRDBorderNoise,
+                  message='removing border noise..')
+        
+        _step(steps, 'convert', scene.scene,
+              partial(convert2gamma, scene, scene.scene, logpath=path_log, outdir=scene.scene, shellscript=shellscript),
+              message='converting scene to GAMMA format..')
+        run.files.consume('convert')
+        
+        if scene.sensor in ['S1A', 'S1B']:
+            if allow_RES_OSV:
+                osvtype = ['POE', 'RES']
             else:
-                nodata_out = nodata[0]
-            suffix = {'linear': '', 'db': '_db'}[scale]
-            infile = image + '_{0}{1}'.format(method_suffix, suffix)
-            outfile = os.path.join(outdir, os.path.basename(image) + '_{0}{1}.tif'.format(method_suffix, suffix))
-            disp.data2geotiff(DEM_par=n.dem_seg + '.par',
-                              data=infile,
-                              type=2,
-                              GeoTIFF=outfile,
-                              nodata=nodata_out,
-                              logpath=path_log,
-                              outdir=scene.scene,
-                              shellscript=shellscript)
-    if scene.sensor in ['S1A', 'S1B']:
-        shutil.copyfile(os.path.join(scene.scene, 'manifest.safe'),
-                        os.path.join(outdir, scene.outname_base() + '_manifest.safe'))
-    if cleanup:
-        print('cleaning up temporary files..')
-        shutil.rmtree(scene.scene)
+                osvtype = 'POE'
+            _step(steps, 'osv', scene.scene,
+                  partial(correctOSV, id=scene, osvdir=osvdir, osvType=osvtype,
+                          logpath=path_log, outdir=scene.scene, shellscript=shellscript),
+                  message='updating orbit state vectors..', parameters=parameters['osv'])
+        
+        _step(steps, 'calibrate', scene.scene,
+              partial(calibrate, scene, scene.scene, logpath=path_log, outdir=scene.scene, shellscript=shellscript))
+        
+        # the images are listed via their parameter files, which are kept if the images have already been deleted
+        images = [x[:-4] for x in finder(scene.scene, [scene.outname_base() + r'.*_(?:grd|slc_cal)\.par$'],
+                                         regex=True, recursive=False)]
+        run.intermediate(images, ['multilook'])
+        
+        _step(steps, 'multilook', scene.scene,
+              partial(_fanout, partial(_multilook, targetres=targetres, path_log=path_log, directory=scene.scene,
+                                       shellscript=shellscript), images, workers),
+              message='multilooking..', parameters=parameters['multilook'])
+        run.files.consume('multilook')
+        
+        images = [x + '_mli' for x in images]
+        
+        master = images[0]
+        
+        # create output names for files to be written
+        # appreciated files will be written
+        # depreciated files will be set to '-' in the GAMMA function call and are thus not written
+        n = Namespace(scene.scene, scene.outname_base())
+        n.appreciate(['dem_seg', 'lut_coarse', 'lut_fine', 'pix', 'ccp', 'inc', 'ls_map'])
+        n.depreciate(['sim_map', 'u', 'v', 'psi'])
+        
+        # if sarSimCC:
+        #     n.appreciate(['ls_map'])
+        
+        ovs_lat, ovs_lon = ovs(dem + '.par', targetres)
+        
+        gc_map_args = {'DEM_par': dem + '.par',
+                       'DEM': dem,
+                       'DEM_seg_par': n.dem_seg + '.par',
+                       'DEM_seg': n.dem_seg,
+                       'lookup_table': n.lut_coarse,
+                       'lat_ovr': ovs_lat,
+                       'lon_ovr': ovs_lon,
+                       'sim_sar': n.sim_map,
+                       'u': n.u,
+                       'v': n.v,
+                       'inc': n.inc,
+                       'psi': n.psi,
+                       'pix': n.pix,
+                       'ls_map': n.ls_map,
+                       'frame': 8,
+                       'ls_mode': func_interp,
+                       'logpath': path_log,
+                       'shellscript': shellscript,
+                       'outdir': scene.scene}
+        
+        # the DEM segment and geometry products shared with other scenes via the cache
+        geometry = _SceneGeometry(cache, scene, dem, master, [parameters['gc_map'], ovs_lat, ovs_lon])
+        
+        _step(steps, 'gc_map', scene.scene, partial(_gc_map, geometry, n, master, gc_map_args, scene.getCorners()),
+              inputs=[dem, dem + '.par'], parameters=parameters['gc_map'])
+        run.files.consume('gc_map')
+        
+        if sarSimCC:
+            raise IOError('geocoding with cross correlation offset refinement is still in the making. Please stay tuned...')
+        else:
+            lut_final = n.lut_coarse
+        
+        ######################################################################
+        # normalization and backward geocoding approach 1 ####################
+        ######################################################################
+        print('geocoding and normalization..')
+        if normalization_method == 1:
+            method_suffix = 'geo_norm'
+        ######################################################################
+        # normalization and backward geocoding approach 2 ####################
+        ######################################################################
+        elif normalization_method == 2:
+            method_suffix = 'norm_geo'
+            n.appreciate(['pixel_area_fine', 'ellipse_pixel_area', 'ratio_sigma0'])
+            _step(steps, 'pixel_area', scene.scene,
+                  partial(_pixel_area, geometry, n, master, lut_final, engine, path_log, scene.scene, shellscript))
+            run.files.consume('pixel_area')
+        else:
+            raise RuntimeError('unknown option for normalization_method')
+        ######################################################################
+        
+        # the image-wise steps, which have not been completed in an earlier run
+        functions = _ImageSteps(n, master, lut_final, method_suffix, func_geoback, nodata, scaling, engine, stream,
+                                run.space, path_log, scene.scene, outdir, shellscript)
+        tasks = OrderedDict()
+        for step in ['geocode_back', 'db', 'geotiff']:
+            if (step != 'db' or 'db' in scaling) and not steps.done(step, parameters=parameters[step]):
+                tasks[step] = (getattr(functions, step), parameters[step])
+        
+        for filenames, consumers in _intermediates(images, n, method_suffix, scaling):
+            run.intermediate(filenames, consumers)
+        
+        print('conversion to (dB and) geotiff..')
+        _image_workflow(tasks, images, steps, run.files, workers, n, method_suffix, scaling, outdir)
+        if scene.sensor in ['S1A', 'S1B']:
+            shutil.copyfile(os.path.join(scene.scene, 'manifest.safe'),
+                            os.path.join(outdir, scene.outname_base() + '_manifest.safe'))
+        if cleanup:
+            print('cleaning up temporary files..')
+            run.files.cleanup(scene.scene)
+            steps.remove()
+    finally:
+        run.close()
 
 
 def ovs(parfile, targetres):
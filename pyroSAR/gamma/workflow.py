@@ -0,0 +1,328 @@
+"""
+A planner and executor for processing chains defined as a directed acyclic graph of nodes, which are connected
+via the files they read and write. The nodes are executed in parallel threads as soon as their inputs are available,
+or only planned in a dry run.
+"""
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .execution import _inherit
+
+# the node of a Workflow executed by the current thread, see Workflow.current
+_node = threading.local()
+
+
+class Workflow(object):
+    """
+    a directed acyclic graph of processing tasks (nodes), which declare the files they read and write.
+    A node depends on all nodes writing one of its inputs, so that the order of execution and the independent
+    branches, which can be executed in parallel, are derived from the file names.
+    
+    Like with `make`, a node is up to date if all of its outputs exist and are newer than its inputs;
+    nodes are executed if they are not up to date or if a node they depend on is executed.
+    For planning, e.g. with :meth:`run` in dry-run mode, the nodes are assigned estimated costs from past timings
+    and the critical path, i.e. the chain of dependent nodes with the highest total cost, is determined.
+    
+    Examples
+    --------
+    >>> flow = Workflow()
+    >>> flow.add('multilook_VV', multilook_vv, inputs=['VV_grd'], outputs=['VV_grd_mli'], label='multilook')
+    >>> flow.add('multilook_VH', multilook_vh, inputs=['VH_grd'], outputs=['VH_grd_mli'], label='multilook')
+    >>> flow.add('gc_map', gc_map, inputs=['VV_grd_mli', 'dem'], outputs=['lut'])
+    >>> flow.run(dryrun=True, costs={'multilook': 40, 'gc_map': 100})
+    >>> flow.run(workers=2)
+    """
+    
+    def __init__(self):
+        self.__nodes = OrderedDict()
+        self.__writers = {}
+    
+    @property
+    def nodes(self):
+        """
+        list of str: the names of the nodes in the order they were added
+        """
+        return list(self.__nodes.keys())
+    
+    def add(self, name, function=None, inputs=None, outputs=None, label=None, after=None, complete=None):
+        """
+        add a node to the workflow
+        
+        Parameters
+        ----------
+        name: str
+            the unique name of the node
+        function: function or None
+            the function to be executed without arguments; None for nodes which are only planned
+        inputs: list of str or None
+            the files read by the node
+        outputs: list of str or None
+            the files written by the node
+        label: str or None
+            the label to group nodes, e.g. the processing step, by which costs are estimated;
+            if None, the name is used
+        after: list of str or None
+            names of further nodes the node depends on, e.g. nodes modifying files in place
+        complete: bool or None
+            is the node known to be up to date? If None, this is checked via the modification times of its files.
+        
+        Returns
+        -------
+        
+        """
+        if name in self.__nodes.keys():
+            raise RuntimeError('node {} already exists'.format(name))
+        outputs = list(outputs or [])
+        for filename in outputs:
+            if filename in self.__writers.keys():
+                raise RuntimeError('file {} is written by nodes {} and {}'
+                                   .format(filename, self.__writers[filename], name))
+        for filename in outputs:
+            self.__writers[filename] = name
+        self.__nodes[name] = {'function': function,
+                              'inputs': list(inputs or []),
+                              'outputs': outputs,
+                              'label': label or name,
+                              'after': list(after or []),
+                              'complete': complete}
+    
+    def dependencies(self, name):
+        """
+        get the nodes a node depends on
+        
+        Parameters
+        ----------
+        name: str
+            the name of the node
+        
+        Returns
+        -------
+        list of str
+            the names of the nodes writing the inputs of the node and those defined via parameter `after`
+        """
+        node = self.__nodes[name]
+        writers = [self.__writers[x] for x in node['inputs'] if x in self.__writers.keys()]
+        for item in node['after']:
+            if item not in self.__nodes.keys():
+                raise RuntimeError('node {} depends on unknown node {}'.format(name, item))
+        return [x for x in self.__nodes.keys() if x != name and (x in writers or x in node['after'])]
+    
+    def order(self):
+        """
+        sort the nodes topologically, i.e. each node is preceded by all nodes it depends on;
+        independent nodes keep the order in which they were added
+        
+        Returns
+        -------
+        list of str
+            the names of the nodes
+        """
+        dependencies = {x: self.dependencies(x) for x in self.__nodes.keys()}
+        ordered = []
+        while len(ordered) < len(self.__nodes):
+            ready = [x for x in self.__nodes.keys() if x not in ordered
+                     and all([y in ordered for y in dependencies[x]])]
+            if len(ready) == 0:
+                cycle = [x for x in self.__nodes.keys() if x not in ordered]
+                raise RuntimeError('the dependencies of nodes {} are cyclic'.format(', '.join(cycle)))
+            ordered.extend(ready)
+        return ordered
+    
+    def outdated(self, name):
+        """
+        check whether a node is not up to date, i.e. not all of its outputs exist or one of its inputs
+        is newer than one of its outputs; nodes without outputs are always outdated unless defined complete
+        
+        Parameters
+        ----------
+        name: str
+            the name of the node
+        
+        Returns
+        -------
+        bool
+        """
+        node = self.__nodes[name]
+        if node['complete'] is not None:
+            return not node['complete']
+        if len(node['outputs']) == 0 or not all([os.path.exists(x) for x in node['outputs']]):
+            return True
+        inputs = [os.path.getmtime(x) for x in node['inputs'] if os.path.exists(x)]
+        return len(inputs) > 0 and max(inputs) > min([os.path.getmtime(x) for x in node['outputs']])
+    
+    def plan(self, costs=None, force=False):
+        """
+        plan the execution of the workflow
+        
+        Parameters
+        ----------
+        costs: dict or None
+            the estimated costs, e.g. wall time in seconds, per node label; the cost of a label is divided evenly
+            between all nodes with this label, e.g. the time of a step between the processed images
+        force: bool
+            execute all nodes even if they are up to date?
+        
+        Returns
+        -------
+        list of collections.OrderedDict
+            one entry per node in topological order containing the node's name, label, whether it is executed,
+            its estimated cost (None if unknown), its earliest start and finish time assuming unlimited
+            parallelism and whether it is part of the critical path
+        """
+        costs = costs or {}
+        labels = [x['label'] for x in self.__nodes.values()]
+        plan = OrderedDict()
+        for name in self.order():
+            node = self.__nodes[name]
+            dependencies = self.dependencies(name)
+            execute = force or self.outdated(name) or any([plan[x]['run'] for x in dependencies])
+            cost = None
+            if not execute:
+                cost = 0
+            elif node['label'] in costs.keys():
+                cost = costs[node['label']] / float(labels.count(node['label']))
+            start = max([plan[x]['finish'] for x in dependencies] + [0])
+            plan[name] = OrderedDict([('name', name),
+                                      ('label', node['label']),
+                                      ('run', execute),
+                                      ('cost', cost),
+                                      ('start', start),
+                                      ('finish', start + (cost or 0)),
+                                      ('critical', False)])
+        # the critical path is traced back from the node finishing last via the dependencies finishing last
+        current = max(plan.values(), key=lambda x: x['finish'])['name'] if len(plan) > 0 else None
+        while current is not None:
+            plan[current]['critical'] = True
+            dependencies = self.dependencies(current)
+            current = max(dependencies, key=lambda x: plan[x]['finish']) if len(dependencies) > 0 else None
+        return list(plan.values())
+    
+    def critical_path(self, costs=None, force=False):
+        """
+        get the critical path of the workflow, i.e. the chain of dependent nodes with the highest total cost,
+        which determines the processing time if all independent nodes are executed in parallel
+        
+        Parameters
+        ----------
+        costs: dict or None
+            the estimated costs per node label, see :meth:`plan`
+        force: bool
+            execute all nodes even if they are up to date?
+        
+        Returns
+        -------
+        list of str
+            the names of the nodes on the critical path in order of execution
+        """
+        return [x['name'] for x in self.plan(costs, force) if x['critical']]
+    
+    def run(self, workers=None, costs=None, force=False, dryrun=False, callback=None):
+        """
+        execute all nodes which are not up to date; nodes are started as soon as all nodes they depend on are
+        finished, so that independent branches of the workflow are executed in parallel threads.
+        If a node fails, no further nodes are started and the error is raised once the running nodes are finished.
+        The GAMMA commands of the nodes are executed by the :class:`~pyroSAR.gamma.execution.Backend` opened by the
+        calling thread, if any.
+        
+        Parameters
+        ----------
+        workers: int or None
+            the maximum number of nodes executed in parallel; if None, the number of CPUs is used
+        costs: dict or None
+            the estimated costs per node label, see :meth:`plan`
+        force: bool
+            execute all nodes even if they are up to date?
+        dryrun: bool
+            only print the plan with the estimated costs and the critical path instead of executing the nodes?
+        callback: function or None
+            a function called with the name of each node once it has been executed successfully
+        
+        Returns
+        -------
+        list of collections.OrderedDict
+            the plan, see :meth:`plan`
+        """
+        plan = self.plan(costs, force)
+        if dryrun:
+            self.__print(plan)
+            return plan
+        pending = [x['name'] for x in plan if x['run']]
+        finished = [x['name'] for x in plan if not x['run']]
+        for name in pending:
+            if self.__nodes[name]['function'] is None:
+                raise RuntimeError('node {} has no function to be executed'.format(name))
+        results = queue.Queue()
+        running = []
+        error = None
+        pool = ThreadPool(workers)
+        try:
+            while len(running) > 0 or (error is None and len(pending) > 0):
+                if error is None:
+                    for name in [x for x in pending if all([y in finished for y in self.dependencies(x)])]:
+                        pending.remove(name)
+                        running.append(name)
+                        pool.apply_async(_inherit(self.__execute), (name, results))
+                name, exception = results.get()
+                running.remove(name)
+                if exception is not None:
+                    error = error or exception
+                else:
+                    finished.append(name)
+                    if callback is not None:
+                        callback(name)
+        finally:
+            pool.close()
+            pool.join()
+        if error is not None:
+            raise error
+        return plan
+    
+    def __execute(self, name, results):
+        node = self.__nodes[name]
+        _node.label = node['label']
+        try:
+            node['function']()
+        except Exception as e:
+            results.put((name, e))
+        else:
+            results.put((name, None))
+        finally:
+            _node.label = None
+    
+    @staticmethod
+    def __print(plan):
+        width = max([len(x['name']) for x in plan] + [20]) + 2
+        line = '{:<' + str(width) + '}{:>6}{:>10}{:>10}'
+        print(line.format('node', 'run', 'cost', 'start'))
+        for entry in plan:
+            values = [entry['name'] + (' *' if entry['critical'] else ''),
+                      'yes' if entry['run'] else 'no',
+                      '-' if entry['cost'] is None else round(entry['cost'], 1),
+                      round(entry['start'], 1)]
+            print(line.format(*values))
+        total = sum([x['cost'] or 0 for x in plan])
+        critical = max([x['finish'] for x in plan] + [0])
+        print('estimated cost: {} sequential, {} with parallel execution (critical path marked with *)'
+              .format(round(total, 1), round(critical, 1)))
+        if any([x['run'] and x['cost'] is None for x in plan]):
+            print('the cost of nodes marked with - is unknown')
+    
+    @staticmethod
+    def current():
+        """
+        get the label of the node executed by the current thread, e.g. for attributing the events
+        of commands executed by a node (see :func:`~pyroSAR.gamma.execution.add_sink`)
+        
+        Returns
+        -------
+        str or None
+            the label or None if the thread does not execute a node
+        """
+        return getattr(_node, 'label', None)
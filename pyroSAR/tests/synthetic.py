@@ -0,0 +1,178 @@
+"""
+Synthetic Sentinel-1 GRD products for testing and benchmarking :func:`pyroSAR.S1.removeGRDBorderNoise`
+without downloading test data. The images have zero-filled and noisy borders of varying width at all four edges
+and come with noise and calibration annotations. The border widths are created with :func:`border_profile`, which
+is also used for testing the line simplification.
+The module is imported by the tests in this directory and by the conftest of the benchmarks.
+
+>>> from synthetic import create_scene
+>>> scene = create_scene('/path/to/directory', 'IW', 2.43, lines=4500, samples=5200)
+"""
+import os
+import numpy as np
+
+from pyroSAR.drivers import findfiles, getFileObj
+
+# the noise scaling constants used by removeGRDBorderNoise for IPF versions <= 2.5
+KNOISE = {'IW': 75088.7, 'EW': 56065.87}
+
+# the calibration DN value written to the synthetic calibration annotation
+ADN = 237.0
+
+# the scaled noise power to be subtracted from the squared image DN values
+NOISE_POWER = 400.
+
+
+def border_profile(n, seed=0):
+    """
+    create a synthetic Sentinel-1 GRD image border profile like it is
+    simplified by :func:`pyroSAR.S1.linesimplify.simplify`, i.e. the
+    position of the first valid pixel for each of n image lines:
+    a slightly slanted line with integer steps, a few ramps and
+    isolated outliers caused by noise
+    """
+    rng = np.random.RandomState(seed)
+    x = np.arange(n, dtype=float)
+    y = 600 + 0.002 * x + 150 * (x > n / 3.) - 100 * np.clip((x - 2 * n / 3.) / 500., 0, 1)
+    y += rng.randint(-2, 3, n)
+    outliers = rng.rand(n) < 0.005
+    y[outliers] += rng.randint(-300, 300, outliers.sum())
+    return np.column_stack((x, np.floor(y)))
+
+
+def scaling_factor(mode, ipf):
+    """
+    the noise scaling factor computed by removeGRDBorderNoise for the synthetic calibration annotation
+    """
+    if ipf <= 2.5:
+        if ipf < 2.34:
+            return KNOISE[mode] * ADN
+        return KNOISE[mode] * ADN * ADN
+    return 1.
+
+
+def write_noise(filename, lines, samples, scale):
+    """
+    write a noise annotation with a noise vector roughly every 1000 lines and a value every 40 samples
+    """
+    vectors = []
+    for i, line in enumerate(list(range(0, lines - 1, 1000)) + [lines - 1]):
+        pixels = list(range(0, samples - 1, 40)) + [samples - 1]
+        # an increase of the noise towards both range edges like the antenna pattern;
+        # every second vector is lower so that the noise also varies in azimuth
+        rel = np.array(pixels, dtype=float) / (samples - 1)
+        lut = NOISE_POWER * (1 + 0.5 * np.cos(np.pi * 6 * rel) ** 2) * (1 - 0.2 * (i % 2)) / scale
+        vectors.append('<noiseVector><azimuthTime>2015-02-22T17:07:50</azimuthTime>'
+                       '<line>{}</line><pixel count="{}">{}</pixel><noiseLut count="{}">{}</noiseLut>'
+                       '</noiseVector>'.format(line, len(pixels), ' '.join(map(str, pixels)),
+                                               len(lut), ' '.join('{:e}'.format(x) for x in lut)))
+    with open(filename, 'w') as xml:
+        xml.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<noise><noiseVectorList count="{}">{}</noiseVectorList></noise>\n'
+                  .format(len(vectors), ''.join(vectors)))
+
+
+def write_calibration(filename, lines, samples):
+    """
+    write a calibration annotation with a constant DN calibration vector
+    """
+    pixels = list(range(0, samples - 1, 40)) + [samples - 1]
+    vector = ('<calibrationVector><line>{}</line><pixel count="{}">{}</pixel>'
+              '<dn count="{}">{}</dn></calibrationVector>')
+    vectors = [vector.format(line, len(pixels), ' '.join(map(str, pixels)),
+                             len(pixels), ' '.join(['{:e}'.format(ADN)] * len(pixels)))
+               for line in [0, lines - 1]]
+    with open(filename, 'w') as xml:
+        xml.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<calibration><calibrationVectorList count="2">{}</calibrationVectorList></calibration>\n'
+                  .format(''.join(vectors)))
+
+
+def write_image(filename, lines, samples, seed=0):
+    """
+    write a uint16 GRD-like image with zero-filled and noisy borders of varying width at all four edges
+    """
+    # GDAL is only imported here so that the border profiles can be created without it
+    from osgeo import gdal
+    rng = np.random.RandomState(seed)
+    # the border widths along the image edges; border_profile creates widths of about 600-750 pixels
+    left = border_profile(lines, seed=seed)[:, 1].astype(int)
+    right = border_profile(lines, seed=seed + 1)[:, 1].astype(int)
+    top = (border_profile(samples, seed=seed + 2)[:, 1] / 4).astype(int)
+    bottom = (border_profile(samples, seed=seed + 3)[:, 1] / 4).astype(int)
+    driver = gdal.GetDriverByName('GTiff')
+    ras = driver.Create(filename, samples, lines, 1, gdal.GDT_UInt16)
+    band = ras.GetRasterBand(1)
+    block = 1000
+    cols = np.arange(samples)
+    for start in range(0, lines, block):
+        stop = min(start + block, lines)
+        rows = np.arange(start, stop)[:, np.newaxis]
+        mat = rng.randint(50, 500, (stop - start, samples)).astype(np.uint16)
+        noisy = (cols < left[start:stop, np.newaxis]) | (cols >= samples - right[start:stop, np.newaxis]) | \
+                (rows < top[np.newaxis, :]) | (rows >= lines - bottom[np.newaxis, :])
+        mat[noisy] = rng.randint(0, 30, noisy.sum())
+        # the outermost pixels are zero like in original products
+        mat[noisy & (rng.rand(*noisy.shape) < 0.5)] = 0
+        band.WriteArray(mat, 0, start)
+    band.FlushCache()
+    band = None
+    ras = None
+
+
+class SyntheticScene(object):
+    """
+    a minimal stand-in for an unpacked :class:`pyroSAR.drivers.SAFE` object providing
+    the attributes and methods used by :func:`pyroSAR.S1.auxil.removeGRDBorderNoise`
+    """
+    def __init__(self, scene, mode, ipf, lines, samples):
+        self.scene = scene
+        self.compression = None
+        self.acquisition_mode = mode
+        self.meta = {'IPF_version': ipf}
+        self.lines = lines
+        self.samples = samples
+
+    def findfiles(self, pattern, include_folders=False):
+        return findfiles(self.scene, pattern, include_folders)
+
+    def getFileObj(self, filename):
+        return getFileObj(self.scene, filename)
+
+
+def create_scene(directory, mode, ipf, lines, samples, polarizations=('vv', 'vh')):
+    """
+    create the directory structure of an unpacked dual-polarization GRD product with synthetic images,
+    noise and calibration annotations
+
+    Parameters
+    ----------
+    directory: str
+        the directory in which to create the product
+    mode: {'IW', 'EW'}
+        the acquisition mode
+    ipf: float
+        the IPF version
+    lines: int
+        the number of image lines; needs to be larger than the 2000 pixel border blocks
+    samples: int
+        the number of image samples; needs to be larger than the 2000 pixel border blocks
+    polarizations: tuple of str
+        the polarizations for which to create an image
+
+    Returns
+    -------
+    SyntheticScene
+    """
+    name = 'S1A_{}_GRDH_1SDV_20150222T170750_20150222T170815_004739_005DD8_3768.SAFE'.format(mode)
+    scene = os.path.join(directory, name)
+    for sub in ['measurement', 'annotation/calibration']:
+        os.makedirs(os.path.join(scene, sub))
+    scale = scaling_factor(mode, ipf)
+    for i, pol in enumerate(polarizations):
+        base = 's1a-{}-grd-{}-20150222t170750-20150222t170815-004739-005dd8-{:03d}'.format(mode.lower(), pol, i + 1)
+        write_image(os.path.join(scene, 'measurement', base + '.tiff'), lines, samples, seed=i)
+        write_noise(os.path.join(scene, 'annotation/calibration', 'noise-' + base + '.xml'), lines, samples, scale)
+        write_calibration(os.path.join(scene, 'annotation/calibration', 'calibration-' + base + '.xml'),
+                          lines, samples)
+    return SyntheticScene(scene, mode, ipf, lines, samples)
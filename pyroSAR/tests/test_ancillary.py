@@ -2,7 +2,7 @@ import os
 import pytest
 import subprocess as sp
 import spatialist.ancillary as anc
-from pyroSAR.ancillary import seconds, groupbyTime, groupby
+from pyroSAR.ancillary import seconds, groupbyTime, groupby, replace_file
 
 
 def test_dissolve_with_lists():
@@ -26,6 +26,18 @@ def test_seconds():
     assert seconds('test_20151212T234411') == 3658952651.0
 
 
+def test_replace_file(tmpdir):
+    src = os.path.join(str(tmpdir), 'new.json')
+    dst = os.path.join(str(tmpdir), 'state.json')
+    for content in ['1', '2']:
+        with open(src, 'w') as f:
+            f.write(content)
+        replace_file(src, dst)
+        assert not os.path.isfile(src)
+        with open(dst, 'r') as f:
+            assert f.read() == content
+
+
 def test_run(tmpdir, testdata):
     log = os.path.join(str(tmpdir), 'test_run.log')
     out, err = anc.run(cmd=['gdalinfo', testdata['tif']],
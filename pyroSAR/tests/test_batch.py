@@ -0,0 +1,84 @@
+import os
+import json
+from time import time, sleep
+import pyroSAR.batch
+from pyroSAR.batch import resources, schedule, process
+
+
+def processor(scene, outdir, fail=(), skip=()):
+    if scene in fail:
+        raise RuntimeError('processing of {} failed'.format(scene))
+    if scene in skip:
+        # the processor returns without writing the outputs of the scene
+        return
+    with open(os.path.join(outdir, scene), 'w') as out:
+        out.write(os.environ['OMP_NUM_THREADS'])
+
+
+def exists(scene, outdir, **kwargs):
+    return os.path.isfile(os.path.join(outdir, scene))
+
+
+def waiting(scene, state, timeout=30):
+    # the slow scene only finishes once the fast scene submitted after it has been recorded
+    start = time()
+    while scene == 'slow':
+        if os.path.isfile(state):
+            with open(state) as records:
+                if 'fast' in json.load(records):
+                    return
+        if time() - start > timeout:
+            raise RuntimeError('the fast scene was not recorded while the slow scene was processed')
+        sleep(0.1)
+
+
+def test_schedule(tmpdir):
+    res = resources(str(tmpdir))
+    assert res['cores'] >= 1
+    workers, threads = schedule(2, memory=1, disk=1, directory=str(tmpdir))
+    assert 1 <= workers <= 2
+    assert workers * threads <= max(res['cores'], workers)
+    assert schedule(10, maxworkers=1, memory=1, disk=1)[0] == 1
+
+
+def test_process(tmpdir):
+    outdir = str(tmpdir)
+    statefile = os.path.join(outdir, 'state.json')
+    scenes = ['scene1', 'scene2', 'scene3']
+    records = process(scenes, processor, statefile=statefile, retries=0, memory=1, disk=1, threads=2,
+                      verbose=False, outdir=outdir, fail=['scene2'])
+    assert [records[x]['status'] for x in scenes] == ['done', 'failed', 'done']
+    with open(os.path.join(outdir, 'scene1')) as out:
+        assert out.read() == '2'
+    with open(statefile) as state:
+        assert json.load(state) == records
+    # only the failed scene is processed again
+    os.remove(os.path.join(outdir, 'scene1'))
+    records = process(scenes, processor, statefile=statefile, retries=0, memory=1, disk=1,
+                      verbose=False, outdir=outdir)
+    assert all(records[x]['status'] == 'done' for x in scenes)
+    assert not os.path.isfile(os.path.join(outdir, 'scene1'))
+
+
+def test_process_check(tmpdir):
+    outdir = str(tmpdir)
+    statefile = os.path.join(outdir, 'state.json')
+    scenes = ['scene1', 'scene2']
+    records = process(scenes, processor, statefile=statefile, retries=0, memory=1, disk=1, verbose=False,
+                      check=exists, outdir=outdir, skip=['scene2'])
+    assert [records[x]['status'] for x in scenes] == ['done', 'failed']
+    assert 'no outputs found for scene scene2' in records['scene2']['error']
+    # the failed scene and the done scene, whose outputs have been deleted, are processed again
+    os.remove(os.path.join(outdir, 'scene1'))
+    records = process(scenes, processor, statefile=statefile, retries=0, memory=1, disk=1, verbose=False,
+                      check=exists, outdir=outdir)
+    assert all(records[x]['status'] == 'done' for x in scenes)
+    assert all(os.path.isfile(os.path.join(outdir, x)) for x in scenes)
+
+
+def test_process_unordered(tmpdir, monkeypatch):
+    # two scenes are processed in parallel regardless of the CPUs of the test machine
+    monkeypatch.setattr(pyroSAR.batch, 'resources', lambda directory=None: {'cores': 2, 'memory': None, 'disk': None})
+    statefile = os.path.join(str(tmpdir), 'state.json')
+    records = process(['slow', 'fast'], waiting, statefile=statefile, retries=0, verbose=False, state=statefile)
+    assert [records[x]['status'] for x in ['slow', 'fast']] == ['done', 'done']
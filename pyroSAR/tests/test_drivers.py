@@ -3,8 +3,10 @@ import pytest
 import platform
 import tarfile as tf
 import os
+import copy
+import numpy as np
 from datetime import datetime
-from spatialist import Vector
+from spatialist import Vector, bbox
 
 
 @pytest.fixture()
@@ -170,6 +172,39 @@ def test_archive(tmpdir, testdata, appveyor):
             db.export2shp(shp)
         assert Vector(shp).nfeatures == 1
         os.remove(dbfile)
+        # a site in the corner of the scene bounding box, which does not overlap with the scene footprint
+        ext = id.getCorners()
+        corner = {'xmin': ext['xmin'], 'xmax': ext['xmin'] + 0.001, 'ymin': ext['ymin'], 'ymax': ext['ymin'] + 0.001}
+        site = bbox(corner, 4326)
+        with pyroSAR.Archive(dbfile) as db:
+            db.insert(testdata['s1'], verbose=False)
+            assert len(db.select(vectorobject=site)) == 1
+        os.remove(dbfile)
+        with pyroSAR.Archive(dbfile, footprint=True) as db:
+            db.insert(testdata['s1'], verbose=False)
+            assert 'footprint' in db.get_colnames()
+            assert len(db.select(vectorobject=id.bbox())) == 1
+            assert len(db.select(vectorobject=site)) == 0
+            # degenerate footprints fall back to the bounding box
+            box = id.bbox().convert2wkt(set3D=False)[0]
+            degenerate = copy.copy(id)
+            degenerate.meta = dict(id.meta, coordinates=id.meta['coordinates'][:2])
+            assert db._Archive__footprint(degenerate) == box
+        os.remove(dbfile)
+        with pytest.raises(ValueError):
+            pyroSAR.Archive(dbfile, footprint=True, footprint_vertices=3)
+        # a footprint with more vertices than footprint_vertices is simplified to exactly this number of vertices
+        # including the closing vertex; the coordinates are (lat, lon) tuples like those of SAFE manifests
+        angles = np.linspace(0, 2 * np.pi, 60, endpoint=False)
+        radius = 0.5 + 0.1 * np.sin(7 * angles) + 0.01 * np.random.RandomState(1).rand(60)
+        detailed = copy.copy(id)
+        detailed.meta = dict(id.meta, coordinates=[(51. + r * np.sin(a), 10. + r * np.cos(a))
+                                                   for a, r in zip(angles, radius)])
+        with pyroSAR.Archive(dbfile, footprint=True, footprint_vertices=10) as db:
+            db.insert(detailed, verbose=False)
+            cursor = db.conn.execute('SELECT NumPoints(ExteriorRing(footprint)) FROM data')
+            assert cursor.fetchone()[0] == 10
+        os.remove(dbfile)
         with pytest.raises(OSError):
             with pyroSAR.Archive(dbfile) as db:
                 db.import_outdated(testdata['archive_old'])
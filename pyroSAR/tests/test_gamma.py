@@ -0,0 +1,901 @@
+import os
+import sys
+import json
+import stat
+import shutil
+import pytest
+import zipfile
+import threading
+import numpy as np
+from glob import glob
+from functools import partial
+from pyroSAR.gamma import ISPPar, Checkpoints, GeometryCache, process, add_sink, remove_sink, JSONLinesSink, \
+    summarize, Backend, Workflow, TempSpace, Intermediates
+from pyroSAR.gamma.util import _fanout, _stream
+from pyroSAR.gamma.execution import _scope, _sinks
+from pyroSAR.gamma import arithmetic, auxil, io, util
+from pyroSAR.drivers import ID
+
+
+def test_checkpoints(tmpdir):
+    manifest = os.path.join(str(tmpdir), 'steps.json')
+    image = os.path.join(str(tmpdir), 'image')
+    par = os.path.join(str(tmpdir), 'image.par')
+    steps = Checkpoints(manifest)
+    assert steps.exists is False
+    assert steps.done('convert') is False
+    start = steps.now()
+    for filename in [image, par]:
+        with open(filename, 'w') as out:
+            out.write('foo')
+    steps.register('convert', steps.changed(str(tmpdir), start), scene='bar')
+    # the parameter file is modified by the following step
+    with open(par, 'a') as out:
+        out.write('bar')
+    steps.register('osv', [par], parameters={'nodata': (0, -99)})
+    
+    steps = Checkpoints(manifest)
+    assert steps.exists is True
+    assert steps.done('convert') is True
+    assert steps.info('convert') == {'scene': 'bar'}
+    assert steps.done('osv', parameters={'nodata': (0, -99)}) is True
+    
+    # a changed parameter invalidates the step and all following steps
+    steps = Checkpoints(manifest)
+    assert steps.done('convert') is True
+    assert steps.done('osv', parameters={'nodata': (0, -100)}) is False
+    assert Checkpoints(manifest).done('osv') is False
+    
+    # a changed output invalidates the step and all following steps
+    steps.register('osv', [par])
+    with open(image, 'a') as out:
+        out.write('foobar')
+    steps = Checkpoints(manifest)
+    assert steps.done('convert') is False
+    assert steps.done('osv') is False
+    steps.remove()
+    assert not os.path.isfile(manifest)
+
+
+def test_sinks(tmpdir):
+    events = []
+    sink = events.append
+    jsonl = JSONLinesSink(os.path.join(str(tmpdir), 'commands.jsonl'))
+    add_sink(sink)
+    add_sink(jsonl)
+    try:
+        process(['echo', 'foo'], outdir=str(tmpdir))
+        process(['echo', 'bar'], outdir=str(tmpdir))
+    finally:
+        remove_sink(sink)
+        remove_sink(jsonl)
+    process(['echo', 'foobar'], outdir=str(tmpdir))
+    assert [x['args'] for x in events] == [['foo'], ['bar']]
+    assert events[0]['command'] == 'echo'
+    assert events[0]['status'] == 'done'
+    assert events[0]['wall'] >= 0
+    with open(jsonl.filename, 'r') as lines:
+        assert [json.loads(x) for x in lines] == events
+    summary = summarize(events)
+    assert len(summary) == 1
+    assert summary[0]['command'] == 'echo'
+    assert summary[0]['calls'] == 2
+
+
+def test_sinks_runs(tmpdir):
+    # the events of runs executed concurrently in separate threads are only passed to the sinks of their run
+    events = {'a': [], 'b': [], 'all': []}
+    started = {x: threading.Event() for x in ['a', 'b']}
+    errors = []
+    
+    def run(name, other):
+        previous = _scope(name)
+        sink = events[name].append
+        add_sink(sink, run=name)
+        try:
+            started[name].set()
+            started[other].wait(10)
+            process(['echo', name], outdir=str(tmpdir))
+            flow = Workflow()
+            flow.add('node', partial(process, ['echo', name + '_node'], outdir=str(tmpdir)))
+            flow.run(workers=2, force=True)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            remove_sink(sink)
+            _scope(previous)
+    
+    sink = events['all'].append
+    add_sink(sink)
+    try:
+        threads = [threading.Thread(target=run, args=x) for x in [('a', 'b'), ('b', 'a')]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        process(['echo', 'main'], outdir=str(tmpdir))
+    finally:
+        remove_sink(sink)
+    assert errors == []
+    for name in ['a', 'b']:
+        assert [x['args'] for x in events[name]] == [[name], [name + '_node']]
+        assert all([x['run'] == name for x in events[name]])
+    assert len(events['all']) == 5
+    assert events['all'][-1]['run'] is None
+    assert _sinks == []
+
+
+def test_geometrycache(tmpdir):
+    cache = GeometryCache(os.path.join(str(tmpdir), 'cache'), maxsize=1)
+    lut = os.path.join(str(tmpdir), 'lut')
+    with open(lut, 'wb') as out:
+        out.write(b'0' * 400000)
+    key1 = cache.key('gc_map', '/path/to/dem', {'targetres': 20})
+    assert key1 == cache.key('gc_map', '/path/to/dem', {'targetres': 20})
+    assert key1 != cache.key('gc_map', '/path/to/dem', {'targetres': 10})
+    target = os.path.join(str(tmpdir), 'lut_copy')
+    assert cache.get(key1, {'lut': target}) is False
+    cache.put(key1, {'lut': lut}, track=1)
+    assert cache.get(key1, {'lut': target}) is True
+    assert os.path.getsize(target) == 400000
+    assert [x['key'] for x in cache.entries(track=1)] == [key1]
+    assert cache.entries(track=2) == []
+    # adding further entries evicts the least recently used ones once the cache exceeds 1 MB
+    key2 = cache.key('gc_map', '/path/to/dem', {'targetres': 10})
+    key3 = cache.key('gc_map', '/path/to/dem', {'targetres': 30})
+    cache.put(key2, {'lut': lut})
+    os.utime(os.path.join(cache.directory, key2, 'entry.json'), (0, 0))
+    cache.put(key3, {'lut': lut})
+    assert sorted([x['key'] for x in cache.entries()]) == sorted([key1, key3])
+
+
+def test_fanout():
+    images = ['vv', 'vh', 'hh', 'hv']
+    for workers in [None, 1, 2]:
+        assert _fanout(lambda x: x.upper(), images, workers) == ['VV', 'VH', 'HH', 'HV']
+    
+    def fail(image):
+        if image == 'vh':
+            raise RuntimeError(image)
+    
+    with pytest.raises(RuntimeError):
+        _fanout(fail, images)
+
+
+def test_arithmetic(tmpdir):
+    rs = np.random.RandomState(1)
+    lines, width = 100, 30
+    files = {}
+    for name in ['data', 'pix', 'inc']:
+        files[name] = os.path.join(str(tmpdir), name)
+        rs.rand(lines, width).astype('>f4').tofile(files[name])
+    data, pix, inc = [np.fromfile(files[x], dtype='>f4').reshape(lines, width) for x in ['data', 'pix', 'inc']]
+    data[0, :5] = 0
+    data.tofile(files['data'])
+    pix[1, :5] = 0
+    pix.tofile(files['pix'])
+    out = os.path.join(str(tmpdir), 'out')
+    
+    def read():
+        return np.fromfile(out, dtype='>f4').reshape(lines, width)
+    
+    # a block size of less than one line is used to test the blockwise processing
+    arithmetic.product(files['data'], files['pix'], out, width, blocksize=0.01)
+    assert np.allclose(read(), data * pix)
+    arithmetic.ratio(files['data'], files['pix'], out, width)
+    ref = np.where(pix != 0, data / np.where(pix != 0, pix, 1), 0)
+    assert np.allclose(read(), ref)
+    arithmetic.normalize(files['data'], out, width, factor=0.5, inc=files['inc'], pix=files['pix'], blocksize=0.01)
+    assert np.allclose(read(), data * pix * 0.5 / np.cos(inc))
+    arithmetic.linear_to_dB(files['data'], out, width, null_value=-99)
+    ref = np.where(data > 0, 10 * np.log10(np.where(data > 0, data, 1)), -99)
+    assert np.allclose(read(), ref)
+    with pytest.raises(RuntimeError):
+        arithmetic.product(files['data'], files['pix'], out, 31)
+
+
+def test_io(tmpdir):
+    image = os.path.join(str(tmpdir), 'image')
+    with open(image + '.par', 'w') as par:
+        par.write('Gamma Interferometric SAR Processor (ISP) - Image Parameter File\n\n'
+                  'image_format:                  FCOMPLEX\n'
+                  'range_samples:                       30\n'
+                  'azimuth_lines:                      100\n')
+    array = (np.arange(3000) + 1j * np.arange(3000)).reshape(100, 30).astype(np.complex64)
+    io.write(image, array, blocksize=0.001)
+    assert os.path.getsize(image) == 3000 * 8
+    assert np.array_equal(np.fromfile(image, dtype='>c8').reshape(100, 30), array)
+    assert io.describe(image + '.par') == (100, 30, 'FCOMPLEX')
+    assert io.nbytes(image + '.par') == 3000 * 8
+    assert io.nbytes(image + '.par', data_format='FLOAT') == 3000 * 4
+    mmap = io.read(image)
+    assert mmap.dtype == np.dtype('>c8')
+    assert np.array_equal(mmap, array)
+    blocks = list(io.blocks(mmap, lines=40))
+    assert [x[0] for x in blocks] == [slice(0, 40), slice(40, 80), slice(80, 100)]
+    assert all([np.shares_memory(view, mmap) for block, view in blocks])
+    with pytest.raises(RuntimeError):
+        io.memmap(image, 30, 'FCOMPLEX', lines=99)
+    with pytest.raises(TypeError):
+        io.write(image, np.zeros((2, 2)))
+
+
+def test_isppar(tmpdir, monkeypatch):
+    parfile = os.path.join(str(tmpdir), 'image.par')
+    with open(parfile, 'w') as par:
+        par.write('Gamma Interferometric SAR Processor (ISP) - Image Parameter File\n\n'
+                  'title:     S1A-IW-IW-VV-3296 (software: Sentinel-1 IPF 002.43)\n'
+                  'date:      2018 8 29 17 6 56.6235\n'
+                  'range_samples:                 25314\n'
+                  'azimuth_line_time:     1.0095178e-02   s\n'
+                  'doppler_polynomial:      0.00000e+00  1.5e-03  Hz     Hz/m\n'
+                  'incidence_angle:        20.0970 dB\n'
+                  'image_format:               FLOAT\n'
+                  'malformed line\n'
+                  'empty:\n')
+    par = ISPPar(parfile)
+    assert par.keys == ['title', 'date', 'range_samples', 'azimuth_line_time', 'doppler_polynomial',
+                        'incidence_angle', 'image_format']
+    assert par.title == 'S1A-IW-IW-VV-3296 (software: Sentinel-1 IPF 002.43)'
+    assert par.date == '2018-08-29T17:06:56.623500'
+    assert par.range_samples == 25314 and isinstance(par.range_samples, int)
+    assert par.azimuth_line_time == 1.0095178e-02
+    assert par.doppler_polynomial == [0., 1.5e-03]
+    assert par.incidence_angle == 20.097
+    assert par.image_format == 'FLOAT'
+    
+    # the parsed file is cached; modifying an object must not change the objects returned later
+    par.doppler_polynomial.append(1)
+    assert ISPPar(parfile).doppler_polynomial == [0., 1.5e-03]
+    # a modified file is parsed again
+    with open(parfile, 'a') as out:
+        out.write('range_looks:                       5\n')
+    assert ISPPar(parfile).range_looks == 5
+    
+    # a file rewritten in place with the same size and modification time is parsed again
+    stat = os.stat(parfile)
+    with open(parfile, 'r') as infile:
+        content = infile.read()
+    with open(parfile, 'w') as out:
+        out.write(content.replace('range_looks:                       5', 'range_looks:                       6'))
+    os.utime(parfile, (stat.st_atime, stat.st_mtime))
+    assert ISPPar(parfile).range_looks == 6
+    
+    # on file systems with a coarse time resolution the file cannot be told apart from the parsed one;
+    # it is parsed again since it was passed to a command, which might have rewritten it
+    monkeypatch.setattr(auxil, '_signature', lambda filename: None)
+    assert ISPPar(parfile).range_looks == 6
+    script = 'import sys; par = open(sys.argv[1]).read(); open(sys.argv[1], "w").write(par.replace(" 6", " 7"))'
+    process([sys.executable, '-c', script, os.path.basename(parfile)], outdir=str(tmpdir))
+    assert ISPPar(parfile).range_looks == 7
+
+
+def test_api(monkeypatch):
+    from pyroSAR.gamma import api
+    
+    def autoparse():
+        raise RuntimeError('no Gamma installation')
+    
+    # the modules are placeholders, which are only parsed and imported on first use
+    monkeypatch.setattr(api, 'autoparse', autoparse)
+    monkeypatch.setattr(api, '_modules', {})
+    assert 'lazily imported' in repr(api.isp)
+    # without a Gamma installation the commands are missing like attributes of a module
+    with pytest.raises(AttributeError, match='GAMMA_HOME'):
+        api.isp.multi_look
+    assert not hasattr(api.isp, 'multi_look')
+    assert getattr(api.isp, 'multi_look', None) is None
+    assert dir(api.isp) == []
+
+
+def test_parse_module(tmpdir):
+    from pyroSAR.gamma.parser import parse_module
+    
+    usage = '''#!/bin/sh
+echo "*** {0} ***"
+echo "usage: {0} <data_in> <data_out> [width]"
+echo ""
+echo "input parameters:"
+echo "  data_in   (input) data file"
+echo "  data_out  (output) data file"
+echo "  width     number of samples per line"
+echo "{0}" >> {1}
+'''
+    bindir = str(tmpdir.mkdir('bin'))
+    calls = os.path.join(str(tmpdir), 'calls.txt')
+    
+    def command(name, comment=''):
+        filename = os.path.join(bindir, name)
+        with open(filename, 'w') as out:
+            out.write(usage.format(name, calls) + comment)
+        os.chmod(filename, 0o755)
+    
+    for name in ['zeta', 'alpha', 'Beta', 'gamma_doc']:
+        command(name)
+    outfile = os.path.join(str(tmpdir), 'module.py')
+    cache = os.path.join(str(tmpdir), 'cache.json')
+    parse_module(bindir, outfile, workers=4, cache=cache)
+    with open(outfile, 'r') as infile:
+        text = infile.read()
+    # the functions are written in alphabetical order independent of the order of parsing
+    names = [x for x in text.split() if x.endswith('(data_in,')]
+    assert names == ['alpha(data_in,', 'Beta(data_in,', 'zeta(data_in,']
+    with open(calls, 'r') as infile:
+        assert sorted(infile.read().split()) == ['Beta', 'alpha', 'zeta']
+    
+    # only the changed command is executed again
+    os.remove(calls)
+    command('zeta', comment='# changed\n')
+    os.remove(outfile)
+    parse_module(bindir, outfile, cache=cache)
+    with open(calls, 'r') as infile:
+        assert infile.read().split() == ['zeta']
+    with open(outfile, 'r') as infile:
+        assert infile.read() == text
+    
+    # the functions of another installation with identical commands call the new executables
+    os.remove(calls)
+    os.rename(bindir, bindir + '2')
+    os.remove(outfile)
+    parse_module(bindir + '2', outfile, cache=cache)
+    assert not os.path.isfile(calls)
+    with open(outfile, 'r') as infile:
+        assert infile.read() == text.replace(bindir, bindir + '2')
+
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason='the resource usage of single processes is not available')
+def test_sinks_usage(tmpdir):
+    # the peak memory and CPU times of each command are its own and not those of all commands terminated so far,
+    # also if commands are executed in parallel threads
+    events = []
+    sink = events.append
+    small = [sys.executable, '-c', 'pass']
+    add_sink(sink)
+    try:
+        # a command might be charged with the memory of the test process it was forked from,
+        # so the large command allocates 200 MB more than the small command uses
+        process(small, outdir=str(tmpdir))
+        base = events[0]['maxrss']
+        large = [sys.executable, '-c', 'x = b"x" * {} * 1024 ** 2'.format(int(base) + 200)]
+        process(large, outdir=str(tmpdir))
+        with Backend(workers=2) as backend:
+            future = backend.submit(large, outdir=str(tmpdir))
+            process(small, outdir=str(tmpdir))
+            future.get()
+        process(small, outdir=str(tmpdir))
+        out, err = process(['cat'], outdir=str(tmpdir), inlist=['foo', 'bar'], void=False)
+        # a command terminating without reading inputs larger than the pipe buffer
+        process(small, outdir=str(tmpdir), inlist=['x' * 1000] * 1000)
+    finally:
+        remove_sink(sink)
+    assert out == 'foo\nbar\n'
+    for event in events:
+        assert event['user'] >= 0 and event['sys'] >= 0
+    assert [x['maxrss'] > base + 200 for x in events if x['args'] == large[1:]] == [True, True]
+    assert [x['maxrss'] < base + 100 for x in events if x['args'] == small[1:]] == [True, True, True, True]
+
+
+def test_backend(tmpdir):
+    script = os.path.join(str(tmpdir), 'commands.sh')
+    logpath = str(tmpdir.mkdir('logs'))
+    with Backend(workers=2, bufsize=10 ** 6) as backend:
+        process(['echo', 'first'], logpath=logpath, outdir=str(tmpdir), shellscript=script)
+        futures = [backend.submit(['echo', x], logpath=logpath, shellscript=script) for x in ['2', '3', '4']]
+        assert [x.get() for x in futures] == [None] * 3
+        # the log output is buffered until the backend is closed
+        assert os.path.getsize(os.path.join(logpath, 'echo.log')) == 0
+        with pytest.raises(RuntimeError):
+            backend.submit(['sh', '-c', 'echo ERROR: non-zero exit status >&2']).get()
+    with open(os.path.join(logpath, 'echo.log'), 'r') as log:
+        lines = [x for x in log.read().split('\n') if x and not x.startswith('#')]
+    assert sorted(lines) == ['2', '3', '4', 'first']
+    with open(script, 'r') as sh:
+        text = sh.read()
+    assert text.count('export base=') == 1
+    assert text.count('echo ') == 4
+    # commands are executed without backend once it is closed
+    process(['echo', 'last'], logpath=logpath)
+    with open(os.path.join(logpath, 'echo.log'), 'r') as log:
+        assert 'last' in log.read()
+
+
+def test_backend_threads(tmpdir):
+    # scenes processed concurrently in separate threads each use the backend opened by their thread
+    class Recorder(Backend):
+        def __init__(self):
+            super(Recorder, self).__init__(workers=2)
+            self.args = []
+        
+        def run(self, cmd, **kwargs):
+            self.args.append(cmd[1])
+            return super(Recorder, self).run(cmd, **kwargs)
+    
+    backends = {'a': Recorder(), 'b': Recorder()}
+    opened = {x: threading.Event() for x in backends.keys()}
+    errors = []
+    
+    def scene(name, other):
+        try:
+            with backends[name]:
+                opened[name].set()
+                opened[other].wait(10)
+                process(['echo', name], outdir=str(tmpdir))
+                backends[name].submit(['echo', name + '_submitted']).get()
+                flow = Workflow()
+                flow.add('node', partial(process, ['echo', name + '_node'], outdir=str(tmpdir)))
+                flow.run(workers=2, force=True)
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=scene, args=x) for x in [('a', 'b'), ('b', 'a')]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    for name, backend in backends.items():
+        assert backend.args == [name, name + '_submitted', name + '_node']
+    # the backends are not active in the main thread
+    process(['echo', 'main'], outdir=str(tmpdir))
+    assert all(['main' not in x.args for x in backends.values()])
+
+
+def test_workflow(tmpdir, capsys):
+    names = {x: os.path.join(str(tmpdir), x) for x in ['raw', 'mli1', 'mli2', 'lut', 'geo1', 'geo2']}
+    executed = []
+    
+    def write(*outputs):
+        def function():
+            executed.append(Workflow.current())
+            for x in outputs:
+                with open(names[x], 'w') as out:
+                    out.write(x)
+        return function
+    
+    with open(names['raw'], 'w') as out:
+        out.write('raw')
+    flow = Workflow()
+    flow.add('geo1', write('geo1'), inputs=[names['mli1'], names['lut']], outputs=[names['geo1']], label='geo')
+    flow.add('geo2', write('geo2'), inputs=[names['mli2'], names['lut']], outputs=[names['geo2']], label='geo')
+    flow.add('ml1', write('mli1'), inputs=[names['raw']], outputs=[names['mli1']], label='ml')
+    flow.add('ml2', write('mli2'), inputs=[names['raw']], outputs=[names['mli2']], label='ml')
+    flow.add('lut', write('lut'), inputs=[names['mli1']], outputs=[names['lut']])
+    assert flow.order() == ['ml1', 'ml2', 'lut', 'geo1', 'geo2']
+    assert flow.dependencies('geo2') == ['ml2', 'lut']
+    costs = {'ml': 20, 'lut': 100, 'geo': 10}
+    assert flow.critical_path(costs) == ['ml1', 'lut', 'geo1']
+    
+    # a dry run only prints the plan
+    plan = flow.run(dryrun=True, costs=costs)
+    assert [x['cost'] for x in plan] == [10, 10, 100, 5, 5]
+    assert plan[-1]['finish'] == 115
+    assert 'critical path' in capsys.readouterr()[0]
+    assert not os.path.isfile(names['geo1'])
+    
+    flow.run(workers=2)
+    assert sorted(executed) == ['geo', 'geo', 'lut', 'ml', 'ml']
+    
+    # nodes are only executed again if their inputs are newer than their outputs
+    del executed[:]
+    assert [x['run'] for x in flow.plan()] == [False] * 5
+    mtime = os.path.getmtime(names['lut']) + 10
+    os.utime(names['mli2'], (mtime, mtime))
+    flow.run()
+    assert executed == ['geo']
+    
+    def fail():
+        raise RuntimeError('failed')
+    
+    flow = Workflow()
+    flow.add('fail', fail, outputs=[names['lut']])
+    flow.add('next', write('geo1'), inputs=[names['lut']], outputs=[names['geo1']])
+    del executed[:]
+    with pytest.raises(RuntimeError):
+        flow.run(force=True)
+    assert executed == []
+    # a file can only be written by one node
+    with pytest.raises(RuntimeError):
+        flow.add('other', outputs=[names['lut']])
+    cyclic = Workflow()
+    cyclic.add('a', inputs=[names['raw']], outputs=[names['lut']])
+    cyclic.add('b', inputs=[names['lut']], outputs=[names['raw']])
+    with pytest.raises(RuntimeError):
+        cyclic.order()
+
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='named pipes are not supported')
+def test_stream(tmpdir):
+    names = [os.path.join(str(tmpdir), x) for x in ['a', 'b', 'c']]
+    
+    def copy(source, target, factor):
+        # pipes are read and written sequentially like by GAMMA commands
+        def function():
+            data = np.arange(1000, dtype='>f4')
+            if source:
+                with open(source, 'rb') as infile:
+                    data = np.frombuffer(infile.read(), dtype='>f4')
+            with open(target, 'wb') as outfile:
+                outfile.write((data * factor).astype('>f4').tobytes())
+        return function
+    
+    functions = [copy(None, names[0], 1), copy(names[0], names[1], 2), copy(names[1], names[2], 3)]
+    _stream(functions, fifos=names[:2])
+    assert np.array_equal(np.fromfile(names[2], dtype='>f4'), np.arange(1000) * 6)
+    # the pipes are removed after execution
+    assert not any([os.path.exists(x) for x in names[:2]])
+    
+    def fail():
+        raise RuntimeError('failed')
+    
+    # a function waiting for a failed function is released
+    with pytest.raises(RuntimeError):
+        _stream([fail, copy(names[0], names[1], 2), copy(names[1], names[2], 3)], fifos=names[:2])
+    assert not any([os.path.exists(x) for x in names[:2]])
+
+
+def test_tempspace(tmpdir):
+    fast = tmpdir.mkdir('fast')
+    space = TempSpace(str(fast), budget=100)
+    a = space.path('/data/scene/image_pan', 60)
+    assert os.path.dirname(os.path.dirname(a)) == str(fast)
+    assert os.path.basename(a) == 'image_pan'
+    # files exceeding the budget keep their original location
+    assert space.path('/data/scene/image_pan_geo', 60) == '/data/scene/image_pan_geo'
+    assert space.used == 60
+    for name in [a, a + '.hdr']:
+        with open(name, 'w') as out:
+            out.write('x')
+    space.release(a)
+    assert not os.path.exists(a) and not os.path.exists(a + '.hdr')
+    assert space.used == 0
+    # unknown files are not deleted
+    space.release('/data/scene/image_pan_geo')
+    b = space.path('/data/scene/image_pan_geo', 60)
+    assert os.path.dirname(b) == os.path.dirname(a)
+    space.cleanup()
+    assert fast.listdir() == [] and space.used == 0
+    with pytest.raises(OSError):
+        TempSpace(os.path.join(str(tmpdir), 'missing'))
+
+
+def test_intermediates(tmpdir):
+    manifest = os.path.join(str(tmpdir), 'steps.json')
+    grd, mli, geo = [os.path.join(str(tmpdir), x) for x in ['VV_grd', 'VV_grd_mli', 'VV_grd_mli_geo']]
+    steps = Checkpoints(manifest)
+    files = Intermediates(keep=['*_mli'], callback=steps.consume)
+    files.add([grd], ['multilook', 'geocode'])
+    files.add([mli], ['geocode'])
+    for step, outputs in [('convert', [grd]), ('multilook', [mli]), ('geocode', [geo])]:
+        assert steps.done(step) is False
+        for filename in outputs:
+            with open(filename, 'w') as out:
+                out.write('foo')
+        steps.register(step, outputs)
+        if step == 'multilook':
+            # the file is still read by step geocode
+            files.consume(step)
+            assert os.path.isfile(grd)
+    files.consume('geocode')
+    assert not os.path.isfile(grd) and files.pending == []
+    # files to be kept are not registered
+    assert os.path.isfile(mli)
+    # deleted files do not invalidate the step having written them
+    steps = Checkpoints(manifest)
+    assert all([steps.done(x) for x in ['convert', 'multilook', 'geocode']])
+    # unchanged declared steps are still complete
+    with open(manifest, 'r') as infile:
+        record = infile.read()
+    steps = Checkpoints(manifest)
+    for step in ['convert', 'multilook', 'geocode']:
+        steps.expect(step)
+    assert all([steps.done(x) for x in ['convert', 'multilook', 'geocode']])
+    # a step reading deleted files, which needs to be processed again, is processed again together with the step
+    # writing them if the steps are declared in advance
+    chain = [('convert', None), ('multilook', {'targetres': 20}), ('geocode', None)]
+    steps = Checkpoints(manifest)
+    for step, parameters in chain:
+        steps.expect(step, parameters=parameters)
+    assert [steps.done(x, parameters=y) for x, y in chain] == [False, False, False]
+    # without declaration the deleted files are only found to be missing once the reading step is checked
+    with open(manifest, 'w') as outfile:
+        outfile.write(record)
+    steps = Checkpoints(manifest)
+    assert steps.done('convert') is True
+    with pytest.raises(RuntimeError):
+        steps.done('multilook', parameters={'targetres': 20})
+    steps = Checkpoints(manifest)
+    assert steps.done('convert') is False
+    files.cleanup(str(tmpdir))
+    assert os.listdir(str(tmpdir)) == ['VV_grd_mli']
+
+
+class FakeScene(ID):
+    """
+    a zipped Sentinel-1 GRD scene, which is unpacked to a directory with a manifest and a TIFF per polarization
+    """
+    
+    def __init__(self, archive):
+        super(FakeScene, self).__init__({'sensor': 'S1A', 'projection': None, 'orbit': 'A',
+                                         'polarizations': ['VV', 'VH'], 'acquisition_mode': 'IW',
+                                         'start': '20150222T170750', 'stop': '20150222T170815', 'product': 'GRD',
+                                         'spacing': (10., 10.), 'samples': 4, 'lines': 3, 'orbitNumber_abs': 4739,
+                                         'orbitNumber_rel': 117, 'cycleNumber': 1, 'frameNumber': 1})
+        self.scene = self.file = archive
+    
+    def unpack(self, directory, overwrite=False):
+        outdir = os.path.join(directory, os.path.basename(self.file).replace('.zip', '.SAFE'))
+        if os.path.isdir(outdir):
+            if not overwrite:
+                raise RuntimeError('target scene directory already exists: {}'.format(outdir))
+            shutil.rmtree(outdir)
+        os.makedirs(os.path.join(outdir, 'measurement'))
+        for name in ['manifest.safe'] + [os.path.join('measurement', x.lower() + '.tiff') for x in self.polarizations]:
+            with open(os.path.join(outdir, name), 'w') as out:
+                out.write('foo')
+        self.scene = outdir
+    
+    def getCorners(self):
+        return {'xmin': 10.1, 'xmax': 10.2, 'ymin': 9.8, 'ymax': 9.9}
+    
+    def removeGRDBorderNoise(self):
+        for pol in self.polarizations:
+            with open(os.path.join(self.scene, 'measurement', pol.lower() + '.tiff'), 'a') as out:
+                out.write('bar')
+
+
+class FakeGamma(object):
+    """
+    a fake GAMMA installation for running geocode: the commands of the API modules are executed via process and
+    the backend opened by geocode, whose execution is replaced by writing images of ones to the outputs.
+    Named pipes are read and written like files, and a command fails if one of its inputs is missing or if an
+    input, whose number of lines is derived from its size, is not a complete file.
+    """
+    width, lines = 4, 3
+    
+    # the output arguments of the commands
+    outputs = {'par_S1_GRD': ['GRD_par', 'GRD'],
+               'S1_OPOD_vec': ['SLC_par'],
+               'multi_look_MLI': ['MLI_out', 'MLI_out_par'],
+               'gc_map_grd': ['DEM_seg_par', 'DEM_seg', 'lookup_table', 'inc', 'pix', 'ls_map'],
+               'pixel_area': ['pix_sigma0'],
+               'radcal_MLI': ['CMLI', 'pix_area'],
+               'ratio': ['ratio'],
+               'product': ['product'],
+               'lin_comb': ['f_out'],
+               'sigma2gamma': ['gamma'],
+               'geocode_back': ['data_out'],
+               'linear_to_dB': ['data_out'],
+               'data2geotiff': ['GeoTIFF']}
+    
+    # the inputs whose number of lines is derived from their file size
+    sized = {'product': 'data_1', 'sigma2gamma': 'pwr1', 'linear_to_dB': 'data_in'}
+    
+    def __init__(self, tmpdir, monkeypatch):
+        self.tmpdir = str(tmpdir)
+        self.executed = []
+        self.fail = set()
+        self.fifos = []
+        self.dem = os.path.join(self.tmpdir, 'dem')
+        for filename in [self.dem, self.dem + '.par']:
+            with open(filename, 'w') as out:
+                out.write('dem')
+        archive = os.path.join(self.tmpdir, 'S1A_IW_GRDH_1SDV_20150222T170750_20150222T170815_004739_005DD8_3768.zip')
+        with zipfile.ZipFile(archive, 'w') as zip:
+            zip.writestr('manifest.safe', 'foo')
+        self.archive = archive
+        for name in ['diff', 'disp', 'isp', 'lat']:
+            monkeypatch.setattr(util, name, self.Module())
+        monkeypatch.setattr(util, 'convert2gamma', self.convert2gamma)
+        monkeypatch.setattr(util, 'correctOSV', self.correctOSV)
+        monkeypatch.setattr(util, 'calibrate', lambda *args, **kwargs: None)
+        monkeypatch.setattr(util, 'ovs', lambda parfile, targetres: (2, 2))
+        monkeypatch.setattr(util, 'par2hdr', self.par2hdr)
+        monkeypatch.setattr(Backend, 'run', lambda backend, cmd, **kwargs: self.execute(cmd) + (None,))
+    
+    class Module(object):
+        def __getattr__(self, command):
+            def function(logpath=None, outdir=None, shellscript=None, **kwargs):
+                process([command, json.dumps(kwargs)], logpath=logpath, outdir=outdir, shellscript=shellscript)
+            
+            return function
+    
+    def scene(self):
+        return FakeScene(self.archive)
+    
+    def convert2gamma(self, id, directory, logpath=None, outdir=None, shellscript=None):
+        for pol in id.polarizations:
+            image = os.path.join(directory, '{}_{}_grd'.format(id.outname_base(), pol))
+            util.isp.par_S1_GRD(GeoTIFF=os.path.join(id.scene, 'measurement', pol.lower() + '.tiff'),
+                                GRD_par=image + '.par', GRD=image, logpath=logpath, outdir=outdir,
+                                shellscript=shellscript)
+    
+    def correctOSV(self, id, osvdir=None, osvType='POE', logpath=None, outdir=None, shellscript=None):
+        for par in sorted(glob(os.path.join(id.scene, '*_grd.par'))):
+            util.isp.S1_OPOD_vec(SLC_par=par, OPOD='-', logpath=logpath, outdir=outdir, shellscript=shellscript)
+    
+    @staticmethod
+    def par2hdr(parfile, hdrfile, nodata=None):
+        with open(hdrfile, 'w') as out:
+            out.write('ENVI')
+    
+    def execute(self, cmd):
+        command, kwargs = cmd[0], json.loads(cmd[1])
+        self.executed.append(command)
+        outputs = self.outputs.get(command, [])
+        inputs = [y for x, y in kwargs.items() if x not in outputs for y in (y if isinstance(y, list) else [y])]
+        for filename in [x for x in inputs if isinstance(x, str) and x.startswith(self.tmpdir)]:
+            if not os.path.exists(filename):
+                return '', 'ERROR: cannot open file {}'.format(filename)
+            if stat.S_ISFIFO(os.stat(filename).st_mode):
+                self.fifos.append((command, filename))
+                if kwargs.get(self.sized.get(command)) == filename:
+                    return '', 'ERROR: the number of lines of {} cannot be derived'.format(filename)
+                with open(filename, 'rb') as pipe:
+                    pipe.read()
+        if command in self.sized.keys() and os.path.getsize(kwargs[self.sized[command]]) != self.width * self.lines * 4:
+            return '', 'ERROR: incomplete input {}'.format(kwargs[self.sized[command]])
+        if command in self.fail:
+            return '', 'ERROR: non-zero exit status'
+        for key in [x for x in outputs if kwargs.get(x, '-') != '-']:
+            with open(kwargs[key], 'w' if key.endswith('par') else 'wb') as out:
+                if key == 'DEM_seg_par':
+                    out.write('Gamma DIFF&GEO DEM/MAP parameter file\nDEM_projection: EQA\ndata_format: REAL*4\n'
+                              'width: {}\nnlines: {}\ncorner_lat: 10.0\ncorner_lon: 10.0\npost_lat: -0.1\n'
+                              'post_lon: 0.1\n'.format(self.width, self.lines))
+                elif key.endswith('par'):
+                    out.write('Gamma Interferometric SAR Processor (ISP) - Image Parameter File\n'
+                              'image_format: FLOAT\nimage_geometry: GROUND_RANGE\nrange_samples: {}\n'
+                              'azimuth_lines: {}\nrange_pixel_spacing: 10.0 m\nazimuth_pixel_spacing: 10.0 m\n'
+                              'incidence_angle: 30.0 degrees\n'.format(self.width, self.lines))
+                else:
+                    out.write(np.ones((self.lines, self.width), dtype='>f4').tobytes())
+        return '', ''
+
+
+def test_geocode_resume(tmpdir, monkeypatch):
+    gamma = FakeGamma(tmpdir, monkeypatch)
+    tempdir, outdir = [str(tmpdir.mkdir(x)) for x in ['temp', 'out']]
+    manifest = os.path.join(tempdir, 'S1A__IW___A_20150222T170750_steps.json')
+    scene = gamma.scene()
+    # a run failing during geocoding keeps the manifest and deletes the consumed intermediate files
+    gamma.fail = {'lin_comb'}
+    with pytest.raises(RuntimeError):
+        util.geocode(scene, gamma.dem, tempdir, outdir, 20, scaling=['linear', 'db'])
+    # the profile sink of the run is removed also if processing fails
+    assert _sinks == []
+    with open(manifest, 'r') as infile:
+        assert list(json.load(infile).keys()) == ['unpack', 'border_noise', 'convert', 'osv', 'calibrate',
+                                                  'multilook', 'gc_map', 'pixel_area']
+    assert glob(os.path.join(scene.scene, 'measurement', '*.tiff')) == []
+    assert glob(os.path.join(scene.scene, '*_grd')) == []
+    assert len(glob(os.path.join(scene.scene, '*_grd_mli'))) == 2
+    # the next run resumes at geocode_back
+    gamma.fail = set()
+    gamma.executed = []
+    util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20, scaling=['linear', 'db'])
+    assert not any([x in gamma.executed for x in ['par_S1_GRD', 'S1_OPOD_vec', 'multi_look_MLI', 'gc_map_grd',
+                                                   'pixel_area']])
+    assert gamma.executed.count('geocode_back') == 2
+    assert gamma.executed.count('data2geotiff') == 4
+    assert len(glob(os.path.join(outdir, '*.tif'))) == 4
+    assert _sinks == []
+    # the intermediate files and the manifest are deleted after processing
+    assert os.listdir(tempdir) == []
+
+
+def test_geocode_incomplete(tmpdir, monkeypatch):
+    gamma = FakeGamma(tmpdir, monkeypatch)
+    tempdir, outdir = [str(tmpdir.mkdir(x)) for x in ['temp', 'out']]
+    # a scene directory without manifest might currently be processed by another process
+    gamma.scene().unpack(tempdir)
+    with pytest.raises(RuntimeError, match='attempted to be processed before'):
+        util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20)
+    shutil.rmtree(os.path.join(tempdir, os.listdir(tempdir)[0]))
+    
+    def correctOSV(*args, **kwargs):
+        raise RuntimeError('no Orbit State Vector file found')
+    
+    monkeypatch.setattr(util, 'correctOSV', correctOSV)
+    with pytest.raises(RuntimeError, match='no Orbit State Vector file found'):
+        util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20)
+    assert glob(os.path.join(outdir, '*.tif')) == []
+    # the shell script written to the output directory does not mark the scene as processed
+    assert len(glob(os.path.join(outdir, '*_commands.sh'))) == 1
+    shutil.rmtree(tempdir)
+    monkeypatch.setattr(util, 'correctOSV', gamma.correctOSV)
+    gamma.executed = []
+    util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20)
+    assert gamma.executed.count('data2geotiff') == 2
+    # a scene, whose GeoTIFFs exist, is skipped
+    gamma.executed = []
+    util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20)
+    assert gamma.executed == []
+
+
+def test_geocode_restart(tmpdir, monkeypatch):
+    gamma = FakeGamma(tmpdir, monkeypatch)
+    tempdir, outdir = [str(tmpdir.mkdir(x)) for x in ['temp', 'out']]
+    gamma.fail = {'data2geotiff'}
+    with pytest.raises(RuntimeError):
+        util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20)
+    # the deleted images are needed for multilooking with another resolution; the scene is unpacked and
+    # converted again within the same run
+    gamma.fail = set()
+    gamma.executed = []
+    util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 30)
+    assert gamma.executed.count('par_S1_GRD') == 2
+    assert gamma.executed.count('multi_look_MLI') == 2
+    assert len(glob(os.path.join(outdir, '*.tif'))) == 2
+
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='named pipes are not supported')
+@pytest.mark.parametrize('method', [1, 2])
+def test_geocode_stream(tmpdir, monkeypatch, method):
+    gamma = FakeGamma(tmpdir, monkeypatch)
+    tempdir, outdir = [str(tmpdir.mkdir(x)) for x in ['temp', 'out']]
+    util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20, normalization_method=method, stream=True)
+    # only the image between the commands with an explicit number of lines is streamed
+    suffix = {1: '_geo_pan', 2: '_pan_geo'}[method]
+    assert sorted([x[0] for x in gamma.fifos]) == ['lin_comb', 'lin_comb']
+    assert all([x[1].endswith(suffix) for x in gamma.fifos])
+    assert gamma.executed.count('sigma2gamma') == 2
+    assert len(glob(os.path.join(outdir, '*.tif'))) == 2
+
+
+def test_geocode_cache(tmpdir, monkeypatch):
+    gamma = FakeGamma(tmpdir, monkeypatch)
+    cache = str(tmpdir.mkdir('cache'))
+    util.geocode(gamma.scene(), gamma.dem, str(tmpdir.mkdir('temp1')), str(tmpdir.mkdir('out1')), 20, cache=cache)
+    assert gamma.executed.count('gc_map_grd') == 1
+    # the geometry products of the same scene are copied from the cache
+    gamma.executed = []
+    util.geocode(gamma.scene(), gamma.dem, str(tmpdir.mkdir('temp2')), str(tmpdir.mkdir('out2')), 20,
+                 scaling='db', cache=cache)
+    assert 'gc_map_grd' not in gamma.executed and 'pixel_area' not in gamma.executed
+    assert len(glob(os.path.join(str(tmpdir), 'out2', '*_db.tif'))) == 2
+
+
+@pytest.mark.parametrize('engine', ['gamma', 'numpy'])
+def test_geocode_tempspace(tmpdir, monkeypatch, engine):
+    gamma = FakeGamma(tmpdir, monkeypatch)
+    tempdir, outdir = [str(tmpdir.mkdir(x)) for x in ['temp', 'out']]
+    placed = []
+    
+    class Space(TempSpace):
+        def path(self, filename, size):
+            placed.append(os.path.basename(filename))
+            return super(Space, self).path(filename, size)
+    
+    # a temp space passed by the caller is released also if processing fails
+    space = Space(str(tmpdir.mkdir('fast')), budget=10 ** 6)
+    gamma.fail = {'geocode_back'}
+    with pytest.raises(RuntimeError):
+        util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20, tempspace=space, engine=engine)
+    assert space.used == 0
+    gamma.fail = set()
+    del placed[:]
+    util.geocode(gamma.scene(), gamma.dem, tempdir, outdir, 20, tempspace=space, engine=engine)
+    assert space.used == 0
+    # only the images written by the engine are placed
+    suffixes = {'gamma': ['_pan', '_pan_geo', '_pan_geo_flat'], 'numpy': ['_pan', '_pan_geo']}[engine]
+    assert sorted(placed) == sorted([x + y for x in ['S1A__IW___A_20150222T170750_VV_grd_mli',
+                                                     'S1A__IW___A_20150222T170750_VH_grd_mli'] for y in suffixes])
+    space.cleanup()
+    assert os.listdir(space.directory) == []
+
+
+def test_geocode_keep(tmpdir, monkeypatch):
+    gamma = FakeGamma(tmpdir, monkeypatch)
+    tempdir, outdir = [str(tmpdir.mkdir(x)) for x in ['temp', 'out']]
+    scene = gamma.scene()
+    util.geocode(scene, gamma.dem, tempdir, outdir, 20, keep=['*_mli', '*_inc'])
+    kept = sorted(os.listdir(scene.scene))
+    assert 'S1A__IW___A_20150222T170750_VV_grd_mli' in kept and 'S1A__IW___A_20150222T170750_inc' in kept
+    assert not any([x.endswith('_grd') or x.endswith('_norm_geo') or x.endswith('_lut') for x in kept])
+    # without cleanup all intermediate files are kept
+    gamma = FakeGamma(tmpdir.mkdir('nocleanup'), monkeypatch)
+    tempdir, outdir = [os.path.join(gamma.tmpdir, x) for x in ['temp', 'out']]
+    scene = gamma.scene()
+    util.geocode(scene, gamma.dem, tempdir, outdir, 20, cleanup=False)
+    assert len(glob(os.path.join(scene.scene, '*_grd'))) == 2
+    assert len(glob(os.path.join(scene.scene, 'measurement', '*.tiff'))) == 2
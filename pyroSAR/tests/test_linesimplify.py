@@ -0,0 +1,47 @@
+import numpy as np
+from osgeo import ogr
+from pyroSAR.S1.linesimplify import createPoly, below, distance, reduce, residuals
+from pyroSAR.S1.polysimplify import VWSimplifier
+
+from synthetic import border_profile
+
+
+def test_below_distance():
+    seq = border_profile(500)[:, 1]
+    # the vertices cross the profile so that points are found on, above and below the line
+    xn = [0., 120., 121., 200., 300., 499.]
+    yn = [seq[0], 600., 650., 760., 745., seq[-1]]
+    poly = createPoly(xn, yn, len(seq), max(seq))
+    line = ogr.Geometry(ogr.wkbLineString)
+    for xi, yi in zip(xn, yn):
+        line.AddPoint(xi, yi)
+    px = np.arange(len(seq), dtype=float)
+    points = []
+    for xi, yi in zip(px, seq):
+        point = ogr.Geometry(ogr.wkbPoint)
+        point.AddPoint(xi, yi)
+        points.append(point)
+    contain = np.array([point.Within(poly) for point in points])
+    assert 0 < contain.sum() < len(contain)
+    assert np.array_equal(below(px, seq, xn, yn), contain)
+    dists = np.array([line.Distance(point) for point in points])
+    assert np.allclose(distance(px, seq, xn, yn), dists)
+
+
+def test_reduce():
+    seq = border_profile(2000)[:, 1].astype(int)
+    simple = reduce(seq)
+    assert len(simple) == len(seq)
+    assert np.all(simple <= seq)
+    assert reduce([5] * 10).tolist() == [5] * 10
+
+
+def test_residuals():
+    pts = border_profile(3000)
+    x, y = pts[:, 0], pts[:, 1]
+    simplifier = VWSimplifier(pts)
+    sqd = []
+    for i in range(2, 41):
+        xn, yn = zip(*simplifier.from_number(i))
+        sqd.append(np.sum((y - np.interp(x, xn, yn)) ** 2))
+    assert np.allclose(residuals(x, y, simplifier, 40), sqd)
@@ -0,0 +1,102 @@
+import numpy as np
+from numpy import argmin
+from pyroSAR.S1.polysimplify import VWSimplifier, triangle_area, triangle_areas_from_array, remove
+
+from synthetic import border_profile
+
+
+def build_thresholds_reference(pts):
+    """
+    the original O(n^2) implementation of VWSimplifier.build_thresholds, which searches
+    the minimum area over all remaining points for each elimination
+    """
+    nmax = len(pts)
+    real_areas = triangle_areas_from_array(pts)
+    real_indices = list(range(nmax))
+
+    # destructable copies
+    # ARG! areas=real_areas[:] doesn't make a copy!
+    areas = np.copy(real_areas)
+    i = real_indices[:]
+
+    # pick first point and set up for loop
+    min_vert = argmin(areas)
+    this_area = areas[min_vert]
+    #  areas and i are modified for each point finished
+    remove(areas, min_vert)  # faster
+    # areas = np.delete(areas,min_vert) #slower
+    real_idx = i.pop(min_vert)
+
+    while this_area < np.inf:
+        '''min_vert was removed from areas and i.  Now,
+        adjust the adjacent areas and remove the new
+        min_vert.
+        Now that min_vert was filtered out, min_vert points
+        to the point after the deleted point.'''
+
+        skip = False  # modified area may be the next minvert
+
+        try:
+            right_area = triangle_area(pts[i[min_vert - 1]],
+                                       pts[i[min_vert]], pts[i[min_vert + 1]])
+        except IndexError:
+            # trying to update area of endpoint. Don't do it
+            pass
+        else:
+            right_idx = i[min_vert]
+            if right_area <= this_area:
+                # even if the point now has a smaller area,
+                # it ultimately is not more significant than
+                # the last point, which needs to be removed
+                # first to justify removing this point.
+                # Though this point is the next most significant
+                right_area = this_area
+
+                # min_vert refers to the point to the right of
+                # the previous min_vert, so we can leave it
+                # unchanged if it is still the min_vert
+                skip = min_vert
+
+            # update both collections of areas
+            real_areas[right_idx] = right_area
+            areas[min_vert] = right_area
+
+        if min_vert > 1:
+            # cant try/except because 0-1=-1 is a valid index
+            left_area = triangle_area(pts[i[min_vert - 2]],
+                                      pts[i[min_vert - 1]], pts[i[min_vert]])
+            if left_area <= this_area:
+                # same justification as above
+                left_area = this_area
+                skip = min_vert - 1
+            real_areas[i[min_vert - 1]] = left_area
+            areas[min_vert - 1] = left_area
+
+        # only argmin if we have too.
+        min_vert = skip or argmin(areas)
+        real_idx = i.pop(min_vert)
+        this_area = areas[min_vert]
+        # areas = np.delete(areas,min_vert) #slower
+        remove(areas, min_vert)  # faster
+    return real_areas
+
+
+
+def test_thresholds_reference():
+    # border profiles contain many identical areas, which need to be eliminated in the same order
+    for n in [2, 3, 100, 5000]:
+        simplifier = VWSimplifier(border_profile(n))
+        assert np.array_equal(simplifier.thresholds, build_thresholds_reference(simplifier.pts))
+    pts = np.random.RandomState(1).rand(1000, 2)
+    simplifier = VWSimplifier(pts)
+    assert np.array_equal(simplifier.thresholds, build_thresholds_reference(simplifier.pts))
+    assert list(simplifier.ordered_thresholds) == sorted(simplifier.thresholds, reverse=True)
+
+
+def test_from_number():
+    pts = np.column_stack((np.arange(1000), np.random.RandomState(1).rand(1000)))
+    simplifier = VWSimplifier(pts)
+    simple = simplifier.from_number(10)
+    assert 2 < len(simple) <= 10
+    assert np.array_equal(simple[0], pts[0])
+    assert np.array_equal(simple[-1], pts[-1])
@@ -0,0 +1,148 @@
+import xml.etree.ElementTree as ET
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip('osgeo.gdal')
+
+from pyroSAR.S1 import linesimplify as ls
+from pyroSAR.S1.auxil import removeGRDBorderNoise, removeGRDBorderNoise_many
+
+from synthetic import create_scene, scaling_factor, write_noise
+
+# the width of the image border subsets searched by removeGRDBorderNoise
+BLOCKSIZE = 2000
+
+
+def read(filename):
+    ras = gdal.Open(filename)
+    mat = ras.GetRasterBand(1).ReadAsArray()
+    ras = None
+    return mat
+
+
+def reference_noise(noisefile, lines, samples, rows, cols, inside=False):
+    """
+    interpolate the noise vectors of an annotation to an image subset one vector and column at a time;
+    the vectors are interpolated along range at absolute image pixels.
+    With `inside=True`, only the vectors inside the rows of the subset are interpolated in azimuth like in the
+    original implementation, so that the rows outside these vectors get the values of the first/last of them.
+    """
+    tree = ET.parse(noisefile)
+    yi = []
+    vectors = []
+    for vector in tree.findall('.//noiseVector'):
+        yi.append(int(vector.find('line').text))
+        xi = [int(x) for x in vector.find('pixel').text.split()]
+        lut = [float(x) for x in vector.find('noiseLut').text.split()]
+        vectors.append(np.interp(np.arange(samples), xi, lut))
+    yi = np.array(yi)
+    vectors = np.array(vectors)
+    if inside:
+        select = (rows[0] <= yi) & (yi <= rows[-1] + 1)
+        yi, vectors = yi[select], vectors[select]
+    noise = np.empty((len(rows), len(cols)))
+    for j, col in enumerate(cols):
+        noise[:, j] = np.interp(rows, yi, vectors[:, col])
+    return noise
+
+
+def reference_border(mat, noise, scale, edge):
+    """
+    compute the simplified border of an image edge subset line by line (left and right edge)
+    or sample by sample (top and bottom edge): the position of the first valid pixel seen from the image
+    edge (left and top edge) or the position after the last valid pixel (right and bottom edge);
+    lines/samples without any valid pixel, e.g. those of the top and bottom border in the left subset,
+    are not masked
+    """
+    valid = (mat.astype(float) ** 2 - noise * scale >= 0.5) & (mat >= 30)
+    if edge in ['top', 'bottom']:
+        valid = valid.T
+    border = []
+    for line in valid:
+        index = np.flatnonzero(line)
+        if edge in ['left', 'top']:
+            border.append(BLOCKSIZE - (index[0] if len(index) > 0 else 0))
+        else:
+            border.append(index[-1] + 1 if len(index) > 0 else BLOCKSIZE)
+    border = np.array(ls.reduce(border))
+    return BLOCKSIZE - border if edge in ['left', 'top'] else border
+
+
+def reference_mask(border, edge, shape, subset):
+    """
+    the pixels of the image to be masked seen from the respective image edge
+    """
+    xmin, ymin, xmax, ymax = subset
+    masked = np.zeros(shape, dtype=bool)
+    for i, position in enumerate(border):
+        if edge == 'left':
+            masked[i, :position] = True
+        elif edge == 'top':
+            masked[:position, i] = True
+        elif edge == 'right':
+            masked[i, xmin + position:] = True
+        else:
+            masked[ymin + position:, i] = True
+    return masked
+
+
+def test_removeGRDBorderNoise(tmpdir):
+    ipf = 2.5
+    scene = create_scene(str(tmpdir), 'IW', ipf, lines=4500, samples=5200)
+    lines, samples = scene.lines, scene.samples
+    scale = scaling_factor('IW', ipf)
+    # a noise power of up to 60000, which invalidates the pixels with values of up to about 245 in the
+    # image interior, so that the detected border depends on the denoising and not only on the DN threshold
+    noisefile = scene.findfiles('noise-.*-vv-')[0]
+    write_noise(noisefile, lines, samples, scale / 100.)
+
+    images = sorted(scene.findfiles(r's1.*\.tiff$'))
+    master = [x for x in images if '-vv-' in x][0]
+    originals = [read(x) for x in images]
+    mat = originals[images.index(master)].copy()
+
+    # the subsets in the order in which they are masked
+    subsets = [('left', (0, 0, BLOCKSIZE, lines)),
+               ('top', (0, 0, samples, BLOCKSIZE)),
+               ('right', (samples - BLOCKSIZE, 0, samples, lines)),
+               ('bottom', (0, lines - BLOCKSIZE, samples, lines))]
+
+    # the original algorithm: the border of each edge is computed from the image already masked by the
+    # previous edges, so that the borders depend on each other in the image corners
+    masked = np.zeros((lines, samples), dtype=bool)
+    independent = False
+    for edge, (xmin, ymin, xmax, ymax) in subsets:
+        rows = np.arange(ymin, ymax)
+        cols = np.arange(xmin, xmax)
+        noise = reference_noise(noisefile, lines, samples, rows, cols)
+        # the noise vectors are interpolated in azimuth across the subset edges; originally, the first 500 lines of
+        # the bottom subset before its first noise vector at line 3000 were set to the values of this vector
+        original = reference_noise(noisefile, lines, samples, rows, cols, inside=True)
+        differs = np.flatnonzero((noise != original).any(axis=1))
+        assert differs.tolist() == (list(range(3000 - ymin)) if edge == 'bottom' else []), edge
+        expected = reference_border(mat[ymin:ymax, xmin:xmax], noise, scale, edge)
+        # the synthetic borders are about 600-900 pixels wide at the left and right edge
+        # and 150-225 pixels at the top and bottom edge
+        depth = expected if edge in ['left', 'top'] else BLOCKSIZE - expected
+        assert 100 < np.median(depth) < 1000, edge
+        # the border computed from the unmasked image differs for the synthetic scene
+        unmasked = originals[images.index(master)][ymin:ymax, xmin:xmax]
+        if not np.array_equal(reference_border(unmasked, noise, scale, edge), expected):
+            independent = True
+        edge_mask = reference_mask(expected, edge, (lines, samples), (xmin, ymin, xmax, ymax))
+        mat[edge_mask] = 0
+        masked |= edge_mask
+    assert independent
+
+    # all polarizations are masked with the border of the master image; all other pixels are left unchanged;
+    # the small memory limit splits the edges into several tiles of unequal length
+    removeGRDBorderNoise(scene, maxmemory=16)
+    for filename, original in zip(images, originals):
+        result = read(filename)
+        assert not result[masked].any()
+        assert np.array_equal(result[~masked], original[~masked])
+
+
+def test_removeGRDBorderNoise_many():
+    # no process pool is started for an empty list of scenes
+    assert removeGRDBorderNoise_many([]) is None